@@ -1,9 +1,13 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import argparse
+import hashlib
+import json
 import os
+import time
 import pandas as pd
-from azure.identity import get_bearer_token_provider
+from azure.core.exceptions import ResourceNotFoundError
 from azure.search.documents import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
@@ -25,11 +29,15 @@ from azure.search.documents.indexes.models import (
     ExhaustiveKnnParameters,
     VectorSearchProfile,
 )
-from typing import List, Dict
-from openai import AzureOpenAI
+from typing import Dict, Iterator, List, Tuple
 
 from azure_config import AzureConfig 
 from azure.identity import DefaultAzureCredential
+from batch_embeddings import embed_texts
+from clients import get_embedding_client
+from index_version import DEFAULT_VERSION_PATH, publish_index_version
+from rate_limiter import get_limiter, set_priority
+from search_uploader import SearchUploader
 
 # Initialize AzureConfig
 azure_config = AzureConfig()
@@ -109,40 +117,134 @@ def create_index_definition(name: str) -> SearchIndex:
 
     return index
 
-def gen_documents(path: str) -> List[Dict[str, any]]:
-    aoai_api_version = azure_config.aoai_api_version
-    openai_service_endoint = azure_config.aoai_endpoint
+def index_exists(search_index_client: SearchIndexClient, search_index: str) -> bool:
+    try:
+        search_index_client.get_index(search_index)
+        return True
+    except ResourceNotFoundError:
+        return False
+
+def index_definition_hash(index: SearchIndex) -> str:
+    definition = json.dumps(index.serialize(), sort_keys=True, default=str)
+    return hashlib.sha256(definition.encode("utf-8")).hexdigest()
+
+def document_hash(document: Dict[str, any]) -> str:
+    """Hash the source fields of a document, which decide whether it must be re-embedded."""
+    fields = {field: str(document[field]) for field in ["id", "name", "content", "url"]}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+def load_manifest(path: str) -> Dict[str, any]:
+    """
+    Load the manifest of the last indexing run: the hash of the index definition
+    and the content hash of every document id that was uploaded.
+    """
+    if path and os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"index_definition": None, "documents": {}}
+
+def save_manifest(path: str, manifest: Dict[str, any]):
+    # Written to a temporary file first, so a crash never leaves a partial manifest
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def prepare_index(
+    search_index_client: SearchIndexClient,
+    index: SearchIndex,
+    manifest_path: str,
+    incremental: bool
+) -> Tuple[Dict[str, any], bool]:
+    """
+    Return the manifest to index against and whether the index was recreated. The
+    index is only recreated when its definition changed or it doesn't exist yet, or
+    without `incremental`. The emptied manifest is saved right away, so a run that
+    fails before its end doesn't leave the old one behind for the next incremental
+    run to skip documents the new index never received.
+    """
+    definition_hash = index_definition_hash(index)
+    manifest = load_manifest(manifest_path if incremental else None)
+    if (incremental
+            and manifest["index_definition"] == definition_hash
+            and index_exists(search_index_client, index.name)):
+        return manifest, False
+
+    delete_index(search_index_client, index.name)
+    print(f"creating index {index.name}")
+    search_index_client.create_or_update_index(index)
+    print(f"index {index.name} created")
+    manifest = {"index_definition": definition_hash, "documents": {}}
+    save_manifest(manifest_path, manifest)
+    return manifest, True
+
+def read_documents(path: str, chunk_size: int = 1000) -> Iterator[List[Dict[str, any]]]:
+    """Read the source CSV in chunks of `chunk_size` rows, so memory doesn't grow with the corpus."""
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        yield chunk.to_dict("records")
+
+def gen_documents(path: str, batch_size: int = 16, concurrency: int = 4, chunk_size: int = 1000) -> Iterator[Dict[str, any]]:
+    for documents in read_documents(path, chunk_size):
+        yield from embed_documents(documents, batch_size, concurrency)
+
+def embed_documents(documents: List[Dict[str, any]], batch_size: int = 16, concurrency: int = 4) -> List[Dict[str, any]]:
     openai_deployment = "text-embedding-ada-002"
+    client = get_embedding_client(azure_config.aoai_endpoint, azure_config.aoai_api_version)
 
-    token_provider = get_bearer_token_provider(DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default")
-    client = AzureOpenAI(
-        api_version=aoai_api_version,
-        azure_endpoint=openai_service_endoint,
-        azure_deployment=openai_deployment,
-        azure_ad_token_provider=token_provider
+    start = time.perf_counter()
+    embeddings = embed_texts(
+        client,
+        [document["content"] for document in documents],
+        model=openai_deployment,
+        batch_size=batch_size,
+        max_workers=concurrency,
+        limiter=get_limiter(azure_config.aoai_endpoint, openai_deployment),
     )
+    elapsed = time.perf_counter() - start
+    print(f"embedded {len(documents)} documents in {elapsed:.1f}s")
 
-    documents = pd.read_csv(path)
     items = []
-    for document in documents.to_dict("records"):
+    for document, embedding in zip(documents, embeddings):
         content = document["content"]
         id = str(document["id"])
         title = document["name"]
         url = document["url"]
-        emb = client.embeddings.create(input=content, model=openai_deployment)
         rec = {
             "id": id,
             "content": content,
             "filepath": f"{title.lower().replace(' ', '-')}",
             "title": title,
             "url": url,
-            "contentVector": emb.data[0].embedding,
+            "contentVector": embedding,
         }
         items.append(rec)
 
     return items
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the search index and upload the sample documents.")
+    parser.add_argument("--batch-size", type=int, default=16, help="Documents per embeddings request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embeddings requests in flight at once")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Source rows read and embedded at a time")
+    parser.add_argument("--upload-batch-size", type=int, default=500, help="Maximum documents per upload request")
+    parser.add_argument("--upload-concurrency", type=int, default=4, help="Upload requests in flight at once")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Only embed and upload new or changed documents, and delete removed ones"
+    )
+    parser.add_argument(
+        "--manifest", type=str, default="data/rag-index.manifest.json",
+        help="Manifest of the last indexing run, used by --incremental"
+    )
+    parser.add_argument(
+        "--version-file", type=str, default=DEFAULT_VERSION_PATH,
+        help="Where to publish the new index version, which invalidates the retrieval and answer caches"
+    )
+    args = parser.parse_args()
+
+    # Leave part of the shared Azure OpenAI budget to the serving app while reindexing
+    set_priority("background")
+
     rag_search = azure_config.search_endpoint
     index_name = "rag-index"
 
@@ -150,18 +252,62 @@ if __name__ == "__main__":
         rag_search, DefaultAzureCredential()
     )
 
-    delete_index(search_index_client, index_name)
     index = create_index_definition(index_name)
-    print(f"creating index {index_name}")
-    search_index_client.create_or_update_index(index)
-    print(f"index {index_name} created")
+    manifest, recreated = prepare_index(search_index_client, index, args.manifest, args.incremental)
+
+    previous = manifest["documents"]
+    source = "data/sample-documents.csv"
+
+    # First pass: only document ids and content hashes are kept in memory
+    hashes = {}
+    for documents in read_documents(source, args.chunk_size):
+        for document in documents:
+            hashes[str(document["id"])] = document_hash(document)
+    changed_count = sum(1 for id, hash in hashes.items() if previous.get(id) != hash)
+    removed = [id for id in previous if id not in hashes]
+    print(f"{changed_count} new or changed documents, {len(removed)} removed documents, "
+          f"{len(hashes) - changed_count} unchanged documents")
 
-    print(f"indexing documents")
-    docs = gen_documents("data/sample-documents.csv")
     search_client = SearchClient(
         endpoint=rag_search,
         index_name=index_name,
         credential=DefaultAzureCredential(),
     )
-    print(f"uploading {len(docs)} documents to index {index_name}")
-    ds = search_client.upload_documents(docs)
\ No newline at end of file
+
+    # Second pass: embed and upload the new and changed documents chunk by chunk
+    print(f"indexing documents")
+    with SearchUploader(
+        search_client,
+        max_batch_documents=args.upload_batch_size,
+        max_workers=args.upload_concurrency
+    ) as uploader:
+        for documents in read_documents(source, args.chunk_size):
+            changed = [
+                document for document in documents
+                if previous.get(str(document["id"])) != hashes[str(document["id"])]
+            ]
+            if changed:
+                for doc in embed_documents(changed, args.batch_size, args.concurrency):
+                    uploader.add(doc)
+    print(f"uploaded {uploader.succeeded} documents to index {index_name}")
+
+    with SearchUploader(search_client, action="delete") as deleter:
+        for id in removed:
+            deleter.add({"id": id})
+    if removed:
+        print(f"deleted {deleter.succeeded} documents from index {index_name}")
+
+    failed = uploader.failed | deleter.failed
+    if failed:
+        print(f"{len(failed)} documents failed and will be retried on the next run: {sorted(failed)}")
+
+    # Record what the index now holds. Failed uploads are left out and failed
+    # deletions are kept, so both are retried on the next run.
+    manifest["documents"] = {id: hash for id, hash in hashes.items() if id not in failed}
+    manifest["documents"].update({id: previous[id] for id in removed if id in failed})
+    save_manifest(args.manifest, manifest)
+
+    # Only a changed index invalidates the caches of the running app
+    if recreated or uploader.succeeded or deleter.succeeded:
+        version = publish_index_version(args.version_file)
+        print(f"published index version {version} to {args.version_file}")
@@ -0,0 +1,212 @@
+import hashlib
+import inspect
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from promptflow.evals.evaluate import evaluate
+
+from rate_limiter import estimate_tokens
+
+
+class JudgeCache:
+    """
+    Judge results on disk, in a SQLite file shared by every run on the machine.
+
+    Keys cover the evaluator, its prompt version, the judge model and the evaluator's
+    inputs, so a re-run only pays for rows whose inputs changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS judgements (key TEXT PRIMARY KEY, result TEXT NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._connection().execute("SELECT result FROM judgements WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO judgements (key, result) VALUES (?, ?)", (key, json.dumps(result)))
+
+
+# Tokens a judge answer is assumed to take, counted against the TPM budget
+JUDGE_COMPLETION_TOKENS = 200
+
+
+class RateLimiter:
+    """
+    Caps judge calls at `max_concurrency` in flight and `requests_per_minute` started,
+    and, given the judge deployment's rate_limiter.RateLimiter as `budget`, within the
+    RPM and TPM budget it shares with the other processes on the host.
+    """
+
+    def __init__(self, max_concurrency: int = 8, requests_per_minute: float = 0, budget=None):
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+        self.budget = budget
+
+    @contextmanager
+    def limit(self, tokens: int = 0):
+        """Hold a slot for a judge call of about `tokens` tokens."""
+        with self._semaphore:
+            if self._interval:
+                with self._lock:
+                    now = time.monotonic()
+                    start = max(now, self._next_start)
+                    self._next_start = start + self._interval
+                time.sleep(max(0.0, start - now))
+            if self.budget is not None:
+                self.budget.acquire(tokens)
+            yield self
+
+
+def prompt_version(evaluator) -> str:
+    """Hash the evaluator class and the prompty files shipped next to it."""
+    cls = type(evaluator)
+    digest = hashlib.sha256(f"{cls.__module__}.{cls.__qualname__}".encode("utf-8"))
+    try:
+        directory = os.path.dirname(inspect.getfile(cls))
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".prompty"):
+                with open(os.path.join(directory, name), "rb") as f:
+                    digest.update(f.read())
+    except (TypeError, OSError):
+        pass
+    return digest.hexdigest()[:16]
+
+
+def prompt_tokens(evaluator) -> int:
+    """Tokens of the largest prompty file shipped next to the evaluator, as an estimate of its prompt."""
+    try:
+        directory = os.path.dirname(inspect.getfile(type(evaluator)))
+        sizes = []
+        for name in os.listdir(directory):
+            if name.endswith(".prompty"):
+                with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                    sizes.append(estimate_tokens(f.read()))
+        return max(sizes, default=0)
+    except (TypeError, OSError):
+        return 0
+
+
+class CachedEvaluator:
+    """
+    Wraps an evaluator so each row is judged at most once per prompt version and model.
+
+    The wrapper has the signature of the wrapped evaluator, so evaluate() maps the same
+    columns to it. Results holding NaN scores, i.e. judge outputs that couldn't be
+    parsed, are not cached.
+    """
+
+    def __init__(self, name: str, evaluator, cache: JudgeCache, limiter: RateLimiter, model: str):
+        self.name = name
+        self.evaluator = evaluator
+        self.cache = cache
+        self.limiter = limiter
+        self.model = model
+        self.version = prompt_version(evaluator)
+        self.prompt_tokens = prompt_tokens(evaluator)
+        self.__signature__ = inspect.signature(evaluator)
+
+    def key(self, inputs: dict) -> str:
+        raw = json.dumps([self.name, self.version, self.model, inputs], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def __call__(self, **kwargs):
+        key = self.key(kwargs)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+
+        tokens = self.prompt_tokens + estimate_tokens(kwargs, max_tokens=JUDGE_COMPLETION_TOKENS)
+        with self.limiter.limit(tokens):
+            result = self.evaluator(**kwargs)
+        if not any(isinstance(value, float) and math.isnan(value) for value in result.values()):
+            self.cache.put(key, result)
+        return result
+
+
+# evaluate() runs the evaluators in this process, on threads, only with the private
+# _use_pf_client=False; otherwise pf runs them in separate processes, each with its own
+# cache and limiter. promptflow-evals is pinned in requirements.txt for this argument.
+IN_PROCESS = {"_use_pf_client": False}
+
+
+def evaluate_cached(
+    evaluation_name: str,
+    data: str,
+    evaluators: dict,
+    model: str,
+    cache_path: str = ".eval-cache/judge.sqlite",
+    max_concurrency: int = 8,
+    requests_per_minute: float = 0,
+    azure_ai_project: dict = None,
+    output_path: str = None,
+    budget=None,
+):
+    """
+    Run evaluate() with every evaluator wrapped in a CachedEvaluator.
+
+    Rows and evaluators are judged concurrently in this process, under one shared
+    RateLimiter, which also keeps to the judge deployment's `budget` if given (see
+    rate_limiter.get_limiter). If reporting to the Azure AI project fails, the
+    evaluation is run again without it; that run is served from the cache.
+    """
+    cache = JudgeCache(cache_path)
+    limiter = RateLimiter(max_concurrency, requests_per_minute, budget)
+    cached_evaluators = {
+        name: CachedEvaluator(name, evaluator, cache, limiter, model)
+        for name, evaluator in evaluators.items()
+    }
+
+    try:
+        result = evaluate(
+            evaluation_name=evaluation_name,
+            data=data,
+            evaluators=cached_evaluators,
+            azure_ai_project=azure_ai_project,
+            output_path=output_path,
+            **IN_PROCESS,
+        )
+    except Exception as e:
+        if azure_ai_project is None:
+            raise
+        print(f"An error occurred during evaluation: {e}. Retrying without reporting results to Azure AI Project.")
+        result = evaluate(
+            evaluation_name=evaluation_name,
+            data=data,
+            evaluators=cached_evaluators,
+            output_path=output_path,
+            **IN_PROCESS,
+        )
+
+    print(f"judge cache: {cache.hits} hits, {cache.misses} misses")
+    return result
@@ -1,7 +1,45 @@
 from promptflow.client import PFClient
-from promptflow.core import AzureOpenAIModelConfiguration
+from promptflow.core import AzureOpenAIModelConfiguration, Prompty
 from azure_config import AzureConfig 
+from rate_limiter import estimate_tokens, get_limiter, set_priority
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
 import os
+import threading
+import pandas as pd
+import yaml
+
+def resolve_env(value):
+    # Prompty front matter may reference environment variables as ${env:NAME}
+    if isinstance(value, str) and value.startswith("${env:") and value.endswith("}"):
+        return os.getenv(value[len("${env:"):-1])
+    return value
+
+def read_prompty(path):
+    """Return the text of a prompty file with the model configuration and parameters of its front matter."""
+    with open(path, 'r') as f:
+        text = f.read()
+    _, front_matter, _ = text.split('---', 2)
+    model = yaml.safe_load(front_matter).get("model") or {}
+    configuration = {key: resolve_env(value) for key, value in (model.get("configuration") or {}).items()}
+    return text, configuration, model.get("parameters") or {}
+
+def within_budget(prompty, path, endpoint):
+    """
+    Wrap a loaded prompty so each call first waits for the shared budget of the
+    deployment it calls, counting the template, the inputs and its max_tokens, as
+    read from the front matter of the prompty file at `path`.
+    """
+    template, configuration, parameters = read_prompty(path)
+    limiter = get_limiter(endpoint, configuration.get("azure_deployment"))
+    max_tokens = parameters.get("max_tokens") or 0
+
+    def call(**inputs):
+        limiter.acquire(estimate_tokens(template, *inputs.values(), max_tokens=max_tokens))
+        return prompty(**inputs)
+    return call
+
 
 def main():
 
@@ -47,10 +85,94 @@ def main():
 
     print(details.head(10))
 
-    details = pf.get_details(eval_run)
+    details.to_excel("prompty-answer-score-eval.xlsx", index=False)
+
+
+def main_pipelined(answer_concurrency=4, score_concurrency=4, output="prompty-answer-score-eval.jsonl"):
+    """
+    Like main(), but each answer is scored as soon as it is produced instead of after
+    the whole base run, so the two stages overlap. Scored rows are appended to
+    `output` as they complete, and the Excel report is written from it at the end.
+    """
+    azure_config = AzureConfig()
+    os.environ['AZURE_OPENAI_ENDPOINT'] = azure_config.aoai_endpoint
+    os.environ['AZURE_OPENAI_API_KEY'] = azure_config.aoai_api_key
+
+    chat_path = "./src/chat.prompty"
+    eval_path = "./evaluations/prompty-answer-score-eval.prompty"
+    chat_prompty = within_budget(Prompty.load(source=chat_path), chat_path, azure_config.aoai_endpoint)
+    eval_prompty = within_budget(Prompty.load(source=eval_path), eval_path, azure_config.aoai_endpoint)
+    data = "./evaluations/test-dataset.jsonl"
+
+    answer_pool = ThreadPoolExecutor(max_workers=answer_concurrency)
+    score_pool = ThreadPoolExecutor(max_workers=score_concurrency)
+    # Rows waiting for either stage, so answers can't pile up ahead of a slower scorer
+    in_flight = threading.BoundedSemaphore(answer_concurrency + score_concurrency)
+    write_lock = threading.Lock()
+    score_futures = []
+
+    with open(output, 'w') as out:
+
+        def write(record):
+            with write_lock:
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+            in_flight.release()
+
+        def score(line_number, row, answer):
+            record = {
+                "line_number": line_number,
+                "inputs.question": row["question"],
+                "inputs.answer": answer,
+                "inputs.ground_truth": row["ground_truth"],
+            }
+            try:
+                result = eval_prompty(question=row["question"], answer=answer, ground_truth=row["ground_truth"])
+                if isinstance(result, str):
+                    result = json.loads(result)
+                record.update({f"outputs.{key}": value for key, value in result.items()})
+            except Exception as e:
+                record["error"] = f"scoring failed: {e}"
+            write(record)
+
+        def answer(line_number, row):
+            try:
+                result = chat_prompty(question=row["question"], documents=row["documents"])
+            except Exception as e:
+                write({"line_number": line_number, "inputs.question": row["question"], "error": f"answering failed: {e}"})
+                return
+            with write_lock:
+                score_futures.append(score_pool.submit(score, line_number, row, result))
+
+        with open(data, 'r') as f:
+            answer_futures = []
+            for line_number, line in enumerate(f):
+                if not line.strip():
+                    continue
+                in_flight.acquire()
+                answer_futures.append(answer_pool.submit(answer, line_number, json.loads(line)))
+            for future in answer_futures:
+                future.result()
+        answer_pool.shutdown(wait=True)
+        for future in list(score_futures):
+            future.result()
+        score_pool.shutdown(wait=True)
+
+    details = pd.read_json(output, lines=True).sort_values("line_number")
+    print(details.head(10))
     details.to_excel("prompty-answer-score-eval.xlsx", index=False)
 
 
 if __name__ == '__main__':
     import promptflow as pf
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Score chat.prompty answers against the ground truth.')
+    parser.add_argument('--pipelined', action='store_true', help='Score each answer as soon as it is produced')
+    parser.add_argument('--answer-concurrency', type=int, default=4, help='Answers generated at once in pipelined mode')
+    parser.add_argument('--score-concurrency', type=int, default=4, help='Answers scored at once in pipelined mode')
+    args = parser.parse_args()
+    # Leave part of the shared Azure OpenAI budgets to the serving app
+    set_priority("background")
+    if args.pipelined:
+        main_pipelined(args.answer_concurrency, args.score_concurrency)
+    else:
+        main()
\ No newline at end of file
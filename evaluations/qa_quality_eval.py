@@ -4,10 +4,11 @@ from datetime import datetime
 
 from promptflow.client import PFClient
 from promptflow.core import AzureOpenAIModelConfiguration
-from promptflow.evals.evaluate import evaluate
 from promptflow.evals.evaluators import RelevanceEvaluator, FluencyEvaluator, GroundednessEvaluator, CoherenceEvaluator
 
 from azure_config import AzureConfig 
+from eval_runner import evaluate_cached
+from rate_limiter import get_limiter, set_priority
 
 def main():
 
@@ -18,6 +19,9 @@ def main():
     os.environ['AZURE_OPENAI_ENDPOINT'] = azure_config.aoai_endpoint
     os.environ['AZURE_OPENAI_API_KEY'] = azure_config.aoai_api_key    
 
+    # Leave part of the shared Azure OpenAI budgets to the serving app, also in the base run
+    set_priority("background")
+
     ##################################
     ## Base Run
     ##################################
@@ -80,32 +84,24 @@ def main():
 
     print(f"Executing evaluation: {evaluation_name}.") 
 
-    try:
-        result = evaluate(
-            evaluation_name=evaluation_name,
-            data=data,
-            evaluators={
-                "Fluency": fluency_evaluator,
-                "Groundedness": groundedness_evaluator,
-                "Relevance": relevance_evaluator,
-                "Coherence": coherence_evaluator
-            },
-            azure_ai_project=azure_ai_project,
-            output_path="./qa_flow_quality_eval.json"
-        )
-    except Exception as e:
-        print(f"An error occurred during evaluation: {e}. Retrying without reporting results to Azure AI Project.")
-        result = evaluate(
-            evaluation_name=evaluation_name,
-            data=data,
-            evaluators={
-                "Fluency": fluency_evaluator,
-                "Groundedness": groundedness_evaluator,
-                "Relevance": relevance_evaluator,
-                "Coherence": coherence_evaluator
-            },
-            output_path="./qa_flow_quality_eval.json"
-        )
+    # Judge results are cached on disk, so only new or changed rows are re-scored
+    result = evaluate_cached(
+        evaluation_name=evaluation_name,
+        data=data,
+        evaluators={
+            "Fluency": fluency_evaluator,
+            "Groundedness": groundedness_evaluator,
+            "Relevance": relevance_evaluator,
+            "Coherence": coherence_evaluator
+        },
+        model=f"{model_config.azure_deployment}:{model_config.api_version}",
+        cache_path=os.getenv("EVAL_CACHE_PATH", ".eval-cache/judge.sqlite"),
+        max_concurrency=int(os.getenv("EVAL_MAX_CONCURRENCY", "8")),
+        requests_per_minute=float(os.getenv("EVAL_REQUESTS_PER_MINUTE", "0")),
+        azure_ai_project=azure_ai_project,
+        output_path="./qa_flow_quality_eval.json",
+        budget=get_limiter(model_config.azure_endpoint, model_config.azure_deployment)
+    )
 
     print(f"Check QA evaluation result {evaluation_name} in the 'Evaluation' section of your project: {azure_config.workspace_name}.")
           
@@ -1,6 +1,7 @@
 import asyncio
 import json
 import os
+import time
 from datetime import datetime
 from typing import List, Dict, Any
 
@@ -10,12 +11,30 @@ from promptflow.evals.synthetic import AdversarialScenario, AdversarialSimulator
 
 from azure.identity import DefaultAzureCredential
 
-from chat_request import get_response
+from chat_request import get_response_async
+from clients import close_async_clients
 from azure_config import AzureConfig
+from rate_limiter import set_priority
 
 # Initialize AzureConfig
 azure_config = AzureConfig()
 
+# Conversations answered at once; the simulator is allowed as many concurrent tasks
+callback_concurrency = int(os.getenv("SAFETY_EVAL_CONCURRENCY", "8"))
+callback_semaphore = asyncio.Semaphore(callback_concurrency)
+
+# Seconds each conversation took to answer, reported after every simulation
+callback_latencies = []
+
+def report_latencies(label: str):
+    latencies = sorted(callback_latencies)
+    callback_latencies.clear()
+    if not latencies:
+        return
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label}: {len(latencies)} conversations, p50 {p50:.2f}s, p95 {p95:.2f}s, max {latencies[-1]:.2f}s")
+
 async def callback(
     messages: List[Dict],
     stream: bool = False,
@@ -28,7 +47,11 @@ async def callback(
     if 'file_content' in messages["template_parameters"]:
         query += messages["template_parameters"]['file_content']
 
-    response = get_response(query, [])['answer']
+    # The async flow keeps the event loop free, so conversations run concurrently
+    async with callback_semaphore:
+        start = time.perf_counter()
+        response = (await get_response_async(query, []))['answer']
+        callback_latencies.append(time.perf_counter() - start)
     
     # Format responses in OpenAI message protocol
     formatted_response = {
@@ -46,6 +69,15 @@ async def callback(
 
 
 async def main():
+    try:
+        await run_safety_evaluation()
+    finally:
+        # The conversations were answered with async clients of this event loop;
+        # close them before asyncio.run() closes the loop
+        await close_async_clients()
+
+
+async def run_safety_evaluation():
 
     # Read configuration
     azure_config = AzureConfig()
@@ -90,8 +122,10 @@ async def main():
             target=callback, 
             max_conversation_turns=1,
             max_simulation_results=10, 
+            concurrent_async_task=callback_concurrency,
             jailbreak=False
         )
+        report_latencies("Adversarial conversations")
         adversarial_conversation_result = outputs.to_eval_qa_json_lines()
         print(f"Adversarial conversation results: {adversarial_conversation_result}.")
 
@@ -130,8 +164,10 @@ async def main():
             scenario=scenario, 
             target=callback,
             max_simulation_results=10, 
+            concurrent_async_task=callback_concurrency,
             jailbreak=True
         )
+        report_latencies("Adversarial conversations w/ jailbreak")
         adversarial_conversation_result_w_jailbreak = jb_outputs.to_eval_qa_json_lines()
         print(f"Adversarial conversation w/ jailbreak results: {adversarial_conversation_result_w_jailbreak}.")
 
@@ -166,4 +202,7 @@ async def main():
 
 if __name__ == '__main__':
     import promptflow as pf
+    # The conversations are answered through chat_request, within the budgets it
+    # shares with the serving app; leave part of them to serving
+    set_priority("background")
     asyncio.run(main())
\ No newline at end of file
@@ -1,7 +1,8 @@
 # ai_search.py
 
-from typing import List
-from azure.search.documents import SearchClient
+import os
+import time
+from typing import List, Optional
 from azure.search.documents.models import (
     VectorizedQuery,
     QueryType,
@@ -9,45 +10,242 @@ from azure.search.documents.models import (
     QueryAnswerType,
 )
 from azure_config import AzureConfig 
-from azure.identity import DefaultAzureCredential
+from clients import get_async_search_client, get_search_client
+from index_version import DEFAULT_VERSION_PATH, IndexVersion
+from local_search import LocalSearchBackend
+from resilience import CircuitBreaker, DeadlineExceeded, Hedger, stage_timeout
+from retrieval import RetrievalBackend, degraded_modes, retrieval_mode
+from retrieval_cache import RetrievalCache
+from telemetry import logger, record_cache, record_retrieval_mode
 
 # Initialize AzureConfig
 azure_config = AzureConfig()
 
+# Version of the search index, published by data/sample-documents-indexing.py
+index_version = IndexVersion(os.getenv("SEARCH_INDEX_VERSION_PATH", DEFAULT_VERSION_PATH))
+
+# Opt-in cache of repeated queries' results, dropped when a new index version is
+# published; enable it only where the version file or SEARCH_INDEX_VERSION is kept current
+retrieval_cache = None
+if os.getenv("RETRIEVAL_CACHE_ENABLED", "false").lower() == "true":
+    retrieval_cache = RetrievalCache(
+        max_entries=int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024")),
+        ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", "300"))
+    )
+
+# Searches slower than the HEDGE_PERCENTILE of recent ones get a second attempt
+search_hedger = Hedger(
+    "search",
+    percentile=float(os.getenv("HEDGE_PERCENTILE", "95")),
+    min_samples=int(os.getenv("HEDGE_MIN_SAMPLES", "20")),
+    enabled=os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+)
+
+# One circuit per retrieval dependency; while one is open, retrieval falls back to
+# the next query in retrieval.degraded_modes, then to stale or last-known-good results
+retrieval_breakers = {
+    dependency: CircuitBreaker(
+        dependency,
+        failure_threshold=int(os.getenv("RETRIEVAL_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("RETRIEVAL_BREAKER_RESET_SECONDS", "30")),
+        slow_call_seconds=float(os.getenv("RETRIEVAL_BREAKER_SLOW_SECONDS", "2"))
+    )
+    for dependency in ["semantic", "vector", "keyword"]
+}
+
+# The latest live results of recent queries, served when every query mode fails.
+# Unlike the retrieval cache this is always on, keeps entries until they are
+# evicted and isn't dropped by a new index version: in an outage, results from
+# before a reindex are better than none
+last_known_good = RetrievalCache(
+    max_entries=int(os.getenv("LAST_KNOWN_GOOD_SIZE", "256")),
+    ttl=0
+)
+
+def build_search_query(question: str, embedding: List[float], top: int = 3, semantic: bool = True) -> dict:
+    """
+    Build the keyword arguments of a search. With both a question and an embedding
+    this is a hybrid search with semantic ranking; either one may be None to run a
+    vector-only or keyword-only search, and semantic=False leaves out the ranking.
+    """
+    query = {"top": top}
+    if question is not None:
+        query["search_text"] = question
+    if question is not None and semantic:
+        query.update(
+            query_type=QueryType.SEMANTIC,
+            semantic_configuration_name="default",
+            query_caption=QueryCaptionType.EXTRACTIVE,
+            query_answer=QueryAnswerType.EXTRACTIVE,
+        )
+    if embedding is not None:
+        query["vector_queries"] = [
+            VectorizedQuery(vector=embedding, k_nearest_neighbors=top, fields="contentVector")
+        ]
+    return query
+
+def to_document(doc) -> dict:
+    # The semantic reranker score when semantic ranking ran, the search score otherwise
+    score = doc.get("@search.reranker_score")
+    return {
+        "id": doc["id"],
+        "title": doc["title"],
+        "content": doc["content"],
+        "url": doc["url"],
+        "score": score if score is not None else doc.get("@search.score"),
+    }
+
+def request_timeout(timeout: Optional[float]) -> dict:
+    # Bound the search request itself, so an attempt that lost a hedge or ran past the
+    # deadline doesn't hold its thread and connection: `timeout` caps the request with
+    # its retries and `read_timeout` a response that stops arriving
+    return {} if timeout is None else {"timeout": timeout, "read_timeout": timeout}
+
+class AzureSearchBackend(RetrievalBackend):
+    """Retrieval backend over an Azure AI Search index, using the shared clients."""
+
+    def __init__(self, endpoint: str, index_name: str):
+        self.endpoint = endpoint
+        self.index_name = index_name
+
+    def retrieve(self, question: str, embedding: List[float], top: int = 3, semantic: bool = True, timeout: Optional[float] = None) -> List[dict]:
+        search_client = get_search_client(self.endpoint, self.index_name)
+        results = search_client.search(**build_search_query(question, embedding, top, semantic), **request_timeout(timeout))
+        return [to_document(doc) for doc in results]
+
+    async def retrieve_async(self, question: str, embedding: List[float], top: int = 3, semantic: bool = True, timeout: Optional[float] = None) -> List[dict]:
+        search_client = get_async_search_client(self.endpoint, self.index_name)
+        results = await search_client.search(**build_search_query(question, embedding, top, semantic), **request_timeout(timeout))
+        return [to_document(doc) async for doc in results]
+
+_backends = {}
+
+def get_retrieval_backend(index_name: str) -> RetrievalBackend:
+    """
+    Return the retrieval backend for `index_name`. RETRIEVAL_BACKEND selects "azure"
+    (default) or "local", an in-process index read from LOCAL_INDEX_DIR.
+    """
+    backend = _backends.get(index_name)
+    if backend is None:
+        if os.getenv("RETRIEVAL_BACKEND", "azure").lower() == "local":
+            backend = LocalSearchBackend(os.getenv("LOCAL_INDEX_DIR", "data/local-index"))
+        else:
+            backend = AzureSearchBackend(azure_config.search_endpoint, index_name)
+        _backends[index_name] = backend
+    return backend
+
+def retrieval_cache_key(question: str, index_name: str, embedding: List[float], top: int = 3) -> str:
+    backend = get_retrieval_backend(index_name)
+    mode = f"{type(backend).__name__}:{retrieval_mode(question, embedding)}"
+    return RetrievalCache.key(question, embedding, top, mode, index_name)
+
+def serve_fallback(key: str, version: str, error: Exception) -> List[dict]:
+    """
+    Results for when no query mode could be run: the query's stale cached ones, else
+    its last good ones. Both are kept per query, so a question is never answered
+    from another question's documents.
+    """
+    docs = retrieval_cache.get_stale(key, version) if retrieval_cache is not None else None
+    if docs is not None:
+        record_retrieval_mode("stale_cache")
+        return docs
+    docs = last_known_good.get_stale(key, None)
+    if docs is not None:
+        record_retrieval_mode("last_known_good")
+        return docs
+    raise error or RuntimeError("every retrieval circuit is open")
+
+def store_results(mode: str, primary: bool, docs: List[dict], key: str, version: str):
+    record_retrieval_mode(mode)
+    last_known_good.put(key, docs, None)
+    # Degraded results aren't cached in place of the full query's
+    if retrieval_cache is not None and primary:
+        retrieval_cache.put(key, docs, version)
+
 def retrieve_documentation(
     question: str,
     index_name: str,
     embedding: List[float],
     search_endpoint: str
-) -> str:
-    search_client = SearchClient(
-        endpoint=azure_config.search_endpoint,
-        index_name=index_name,
-        credential=DefaultAzureCredential()
-    )
+) -> List[dict]:
+    """
+    Retrieve the documents for a question and its embedding, see RetrievalBackend for
+    the query modes. While the circuit of a dependency is open, or when a query fails,
+    a degraded query is run instead, and when none can be, the query's stale cached or
+    last good results (see serve_fallback). The mode that served the documents is
+    recorded through telemetry.record_retrieval_mode.
+    """
+    key = retrieval_cache_key(question, index_name, embedding)
+    version = None
+    if retrieval_cache is not None:
+        version = index_version.get()
+        docs = retrieval_cache.get(key, version)
+        record_cache("retrieval", docs is not None)
+        if docs is not None:
+            record_retrieval_mode(retrieval_mode(question, embedding))
+            return docs
 
-    vector_query = VectorizedQuery(
-        vector=embedding, k_nearest_neighbors=3, fields="contentVector"
-    )
+    backend = get_retrieval_backend(index_name)
+    error = None
+    for i, (mode, dependency, mode_question, mode_embedding, semantic) in enumerate(degraded_modes(question, embedding)):
+        try:
+            timeout = stage_timeout("search")
+        except DeadlineExceeded as e:
+            error = e
+            break
+        breaker = retrieval_breakers[dependency]
+        if not breaker.allow():
+            continue
+        start = time.perf_counter()
+        try:
+            docs = search_hedger.call(timeout, backend.retrieve, mode_question, mode_embedding, semantic=semantic, timeout=timeout)
+        except Exception as e:
+            breaker.record_failure()
+            logger.warning("%s retrieval failed: %s", mode, e)
+            error = e
+            continue
+        breaker.record_success(time.perf_counter() - start)
+        store_results(mode, i == 0, docs, key, version)
+        return docs
+    return serve_fallback(key, version, error)
 
-    results = search_client.search(
-        search_text=question,
-        vector_queries=[vector_query],
-        query_type=QueryType.SEMANTIC,
-        semantic_configuration_name="default",
-        query_caption=QueryCaptionType.EXTRACTIVE,
-        query_answer=QueryAnswerType.EXTRACTIVE,
-        top=3,
-    )
+async def retrieve_documentation_async(
+    question: str,
+    index_name: str,
+    embedding: List[float],
+    search_endpoint: str
+) -> List[dict]:
+    """Async variant of retrieve_documentation."""
+    key = retrieval_cache_key(question, index_name, embedding)
+    version = None
+    if retrieval_cache is not None:
+        version = index_version.get()
+        docs = retrieval_cache.get(key, version)
+        record_cache("retrieval", docs is not None)
+        if docs is not None:
+            record_retrieval_mode(retrieval_mode(question, embedding))
+            return docs
 
-    docs = [
-        {
-            "id": doc["id"],
-            "title": doc["title"],
-            "content": doc["content"],
-            "url": doc["url"],
-        }
-        for doc in results
-    ]
-
-    return docs
+    backend = get_retrieval_backend(index_name)
+    error = None
+    for i, (mode, dependency, mode_question, mode_embedding, semantic) in enumerate(degraded_modes(question, embedding)):
+        try:
+            timeout = stage_timeout("search")
+        except DeadlineExceeded as e:
+            error = e
+            break
+        breaker = retrieval_breakers[dependency]
+        if not breaker.allow():
+            continue
+        start = time.perf_counter()
+        try:
+            docs = await search_hedger.call_async(timeout, backend.retrieve_async, mode_question, mode_embedding, semantic=semantic, timeout=timeout)
+        except Exception as e:
+            breaker.record_failure()
+            logger.warning("%s retrieval failed: %s", mode, e)
+            error = e
+            continue
+        breaker.record_success(time.perf_counter() - start)
+        store_results(mode, i == 0, docs, key, version)
+        return docs
+    return serve_fallback(key, version, error)
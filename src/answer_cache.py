@@ -0,0 +1,118 @@
+# answer_cache.py
+
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+
+class AnswerCache:
+    """
+    A semantic cache of answers keyed on question-embedding similarity.
+
+    Cached question embeddings are kept L2-normalized in one preallocated matrix, so a
+    lookup is a single matrix-vector product. The matrix is float32 by default;
+    `dtype="float16"` halves its memory at a cost of about 1e-3 in similarity. A lookup hits when the
+    best cosine similarity reaches `threshold`. Entries expire after `ttl` seconds,
+    and the least recently used entry is replaced once `max_entries` is reached.
+
+    Every lookup and store carries a version string (see chat_request.py). When the
+    version changes, e.g. because the prompt or the search index changed, the whole
+    cache is dropped.
+    """
+
+    def __init__(self, threshold: float = 0.97, max_entries: int = 512, ttl: float = 3600, dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported answer cache dtype: {dtype}")
+        self.threshold = threshold
+        self.dtype = dtype
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._version = None
+        self._vectors = None
+        self._created_at = np.zeros(max_entries)
+        self._last_used = np.zeros(max_entries)
+        self._values = [None] * max_entries
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, version: str):
+        if version != self._version:
+            if self._size:
+                self.invalidations += 1
+            self._clear()
+            self._version = version
+
+    def _clear(self):
+        self._vectors = None
+        self._values = [None] * self.max_entries
+        self._size = 0
+
+    def lookup(self, embedding: List[float], version: str) -> Optional[dict]:
+        """Return a copy of the cached response closest to `embedding`, or None."""
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            if self._size and self._vectors.shape[1] == query.shape[0]:
+                scores = (self._vectors[:self._size] @ query).astype(np.float32)
+                scores[now - self._created_at[:self._size] > self.ttl] = -1.0
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._last_used[best] = now
+                    self.hits += 1
+                    return dict(self._values[best])
+            self.misses += 1
+            return None
+
+    def store(self, embedding: List[float], response: dict, version: str):
+        """Cache `response` for the question whose embedding is `embedding`."""
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._clear()
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=self.dtype)
+
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                # Reuse an expired slot if there is one, otherwise the least recently used
+                expired = np.flatnonzero(now - self._created_at > self.ttl)
+                slot = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            self._vectors[slot] = vector
+            self._created_at[slot] = now
+            self._last_used[slot] = now
+            self._values[slot] = dict(response)
+
+    def invalidate(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Return hit, miss, eviction and invalidation counters."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": self._size,
+            }
@@ -1,5 +1,9 @@
+import json
 import os
 import re
+import tempfile
+import threading
+import time
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -27,6 +31,8 @@ class AzureConfig:
             - AZURE_OPENAI_ENDPOINT: (Optional) The endpoint for Azure OpenAI.
             - AZURE_OPENAI_API_VERSION: (Optional) API version for Azure OpenAI.
             - AZURE_SEARCH_ENDPOINT: (Optional) Endpoint for Azure AI Search.
+            - AZURE_CONFIG_SNAPSHOT: (Optional) Path of a local snapshot of resolved values.
+            - AZURE_CONFIG_SNAPSHOT_TTL: (Optional) Seconds before the snapshot is refreshed.
 
         - Initialization Logic:
             1. Load essential environment variables for subscription, resource group, and workspace.
@@ -35,12 +41,34 @@ class AzureConfig:
             4. Obtain connections for Azure OpenAI and Azure AI Search via MLClient.
             5. Extract Azure OpenAI API key and endpoint via CognitiveServicesManagementClient.
             6. Extract endpoint names for Azure OpenAI and AI Search.
+
+        - Snapshot Mode:
+            If AZURE_CONFIG_SNAPSHOT is set, steps 2-6 are skipped when the snapshot file
+            holds values for the same subscription, resource group and project. The
+            snapshot never contains the API key; it is fetched on first access instead.
     """
 
+    # Resolved, non-secret values that can be persisted in a config snapshot
+    SNAPSHOT_FIELDS = [
+        "location",
+        "aoai_endpoint",
+        "aoai_api_version",
+        "search_endpoint",
+        "aoai_account_name",
+        "search_account_name",
+    ]
+
     def __init__(self):
         """
         Initializes the AzureConfig object by loading environment variables and setting up
         the necessary Azure clients, including MLClient and CognitiveServicesManagementClient.
+
+        When AZURE_CONFIG_SNAPSHOT points to a file, resolved endpoints are read from that
+        snapshot instead of ARM. A snapshot older than AZURE_CONFIG_SNAPSHOT_TTL seconds
+        (default 3600), or without a resolved_at time, is still used, and refreshed in a
+        background thread. The age is only checked here, so the TTL bounds how stale the
+        values are when a process starts; a long-running process keeps them until it
+        restarts.
         """
         # Load essential environment variables, ensuring necessary configurations are set
         self.subscription_id = self.get_env_var("AZURE_SUBSCRIPTION_ID")
@@ -48,53 +76,136 @@ class AzureConfig:
         self.workspace_name = self.get_env_var("AZUREAI_PROJECT_NAME")
         self.check_missing_vars()
 
+        self.snapshot_path = os.getenv("AZURE_CONFIG_SNAPSHOT")
+        self.snapshot_ttl = float(os.getenv("AZURE_CONFIG_SNAPSHOT_TTL", "3600"))
+        self._aoai_api_key = None
+        self._refresh_thread = None
+
         # If essential variables are provided, initialize Azure clients
         if self.subscription_id and self.resource_group and self.workspace_name:
-            # Import necessary Azure libraries only when needed to avoid unnecessary dependencies
-            from azure.ai.ml import MLClient
+            snapshot = self.load_snapshot() if self.snapshot_path else None
+            if snapshot is None:
+                self.resolve()
+                if self.snapshot_path:
+                    self.save_snapshot()
+            elif time.time() - snapshot.get("resolved_at", 0) > self.snapshot_ttl:
+                # Serve the stale values and refresh them without blocking startup
+                self._refresh_thread = threading.Thread(target=self.refresh_snapshot, daemon=True)
+                self._refresh_thread.start()
+
+    def resolve(self):
+        """Resolve endpoints, API version, location and the API key through ARM."""
+        # Import necessary Azure libraries only when needed to avoid unnecessary dependencies
+        from azure.ai.ml import MLClient
+        from azure.identity import DefaultAzureCredential
+        from azure.mgmt.cognitiveservices import CognitiveServicesManagementClient
+
+        # Initialize the MLClient using DefaultAzureCredential and configuration
+        self.ml_client = MLClient(
+            DefaultAzureCredential(),
+            self.subscription_id,
+            self.resource_group,
+            self.workspace_name
+        )
+
+        # Retrieve workspace details and update location if available
+        self.workspace = self.ml_client.workspaces.get(
+            name=self.workspace_name,
+            resource_group_name=self.resource_group
+        )
+        self.location = self.workspace.location  # Use workspace location if available
+
+        # Retrieve service connections for Azure OpenAI and AI Search
+        self.aoai_connection = self.ml_client.connections.get('aoai-connection')
+        self.search_connection = self.ml_client.connections.get('rag-search')
+
+        # Extract Azure OpenAI endpoint and API version from the connection metadata
+        self.aoai_endpoint = self.aoai_connection.target
+        self.aoai_api_version = self.aoai_connection.metadata.get('ApiVersion', '')
+
+        # Initialize the CognitiveServicesManagementClient to retrieve API keys
+        self.cognitive_client = CognitiveServicesManagementClient(
+            DefaultAzureCredential(), self.subscription_id
+        )
+        self._aoai_api_key = self.fetch_api_key()
+
+        # Extract the Azure AI Search endpoint from the search connection
+        self.search_endpoint = self.search_connection.target
+
+        # Extract domain prefixes for OpenAI and Search services for easier identification
+        self.aoai_account_name = self.get_domain_prefix(self.aoai_endpoint)
+        self.search_account_name = self.get_domain_prefix(self.search_endpoint)
+
+    @property
+    def aoai_api_key(self):
+        """Azure OpenAI API key. It is kept in memory only and fetched on first use."""
+        if self._aoai_api_key is None:
+            self._aoai_api_key = self.fetch_api_key()
+        return self._aoai_api_key
+
+    def fetch_api_key(self):
+        """Retrieve the Azure OpenAI API key through the Cognitive Services management API."""
+        if getattr(self, "cognitive_client", None) is None:
             from azure.identity import DefaultAzureCredential
             from azure.mgmt.cognitiveservices import CognitiveServicesManagementClient
-
-            # Initialize the MLClient using DefaultAzureCredential and configuration
-            self.ml_client = MLClient(
-                DefaultAzureCredential(),
-                self.subscription_id,
-                self.resource_group,
-                self.workspace_name
-            )
-
-            # Retrieve workspace details and update location if available
-            self.workspace = self.ml_client.workspaces.get(
-                name=self.workspace_name,
-                resource_group_name=self.resource_group
-            )
-            self.location = self.workspace.location  # Use workspace location if available
-
-            # Retrieve service connections for Azure OpenAI and AI Search
-            self.aoai_connection = self.ml_client.connections.get('aoai-connection')
-            self.search_connection = self.ml_client.connections.get('rag-search')
-
-            # Extract Azure OpenAI endpoint and API version from the connection metadata
-            self.aoai_endpoint = self.aoai_connection.target
-            self.aoai_api_version = self.aoai_connection.metadata.get('ApiVersion', '')
-
-            # Extract the account name from the OpenAI endpoint for Cognitive Services API keys
-            hostname = self.aoai_endpoint.split("://")[1].split("/")[0]
-            account_name = hostname.split('.')[0]
-
-            # Initialize the CognitiveServicesManagementClient to retrieve API keys
             self.cognitive_client = CognitiveServicesManagementClient(
                 DefaultAzureCredential(), self.subscription_id
             )
-            keys = self.cognitive_client.accounts.list_keys(self.resource_group, account_name)
-            self.aoai_api_key = keys.key1  # Use the first key for authentication
 
-            # Extract the Azure AI Search endpoint from the search connection
-            self.search_endpoint = self.search_connection.target
+        # Extract the account name from the OpenAI endpoint for Cognitive Services API keys
+        hostname = self.aoai_endpoint.split("://")[1].split("/")[0]
+        account_name = hostname.split('.')[0]
 
-            # Extract domain prefixes for OpenAI and Search services for easier identification
-            self.aoai_account_name = self.get_domain_prefix(self.aoai_endpoint)
-            self.search_account_name = self.get_domain_prefix(self.search_endpoint)
+        keys = self.cognitive_client.accounts.list_keys(self.resource_group, account_name)
+        return keys.key1  # Use the first key for authentication
+
+    def load_snapshot(self):
+        """
+        Load resolved values from the snapshot file.
+
+        Returns the snapshot dict, or None when the file is missing, unreadable or was
+        written for a different subscription, resource group or project.
+        """
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable config snapshot '{self.snapshot_path}': {e}")
+            return None
+
+        scope = [self.subscription_id, self.resource_group, self.workspace_name]
+        if snapshot.get("scope") != scope or any(field not in snapshot for field in self.SNAPSHOT_FIELDS):
+            return None
+
+        for field in self.SNAPSHOT_FIELDS:
+            setattr(self, field, snapshot[field])
+        return snapshot
+
+    def save_snapshot(self):
+        """Atomically write the resolved, non-secret values to the snapshot file."""
+        snapshot = {field: getattr(self, field) for field in self.SNAPSHOT_FIELDS}
+        snapshot["scope"] = [self.subscription_id, self.resource_group, self.workspace_name]
+        snapshot["resolved_at"] = time.time()
+
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"Could not write config snapshot '{self.snapshot_path}': {e}")
+
+    def refresh_snapshot(self):
+        """Re-resolve the configuration through ARM and rewrite the snapshot."""
+        try:
+            self.resolve()
+            self.save_snapshot()
+        except Exception as e:
+            print(f"An error occurred while refreshing config snapshot: {e}")
 
     def get_env_var(self, var_name):
         """Retrieve environment variable and log if it's not set."""
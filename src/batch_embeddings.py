@@ -0,0 +1,130 @@
+# batch_embeddings.py
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import List
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+# Azure OpenAI accepts at most 2048 inputs per embeddings request, and older API
+# versions only 16; 8191 tokens is the per-input limit of text-embedding-ada-002.
+MAX_INPUT_TOKENS = 8191
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    """Return the tokenizer used by the OpenAI embedding models, or None without tiktoken."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def make_batches(texts: List[str], batch_size: int = 16, max_batch_tokens: int = 100000) -> List[List[int]]:
+    """Group text indexes into batches bounded by input count and total tokens."""
+    batches = []
+    batch, batch_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = min(count_tokens(text), MAX_INPUT_TOKENS)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def retry_after_seconds(error: RateLimitError, attempt: int) -> float:
+    """How long to wait after a 429: the service's hint if any, else exponential backoff."""
+    headers = getattr(error.response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                pass
+    return min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+def create_embeddings(client, inputs: List[str], model: str, max_attempts: int = 8, limiter=None) -> List[List[float]]:
+    """
+    Embed one batch, retrying throttled and transient failures with backoff. With a
+    rate_limiter.RateLimiter, each attempt first waits for the batch to fit in the
+    deployment's budget, and a 429 makes every caller sharing the budget back off.
+    """
+    tokens = sum(min(count_tokens(text), MAX_INPUT_TOKENS) for text in inputs) if limiter is not None else 0
+    # This loop is the only retry layer, so a 429 isn't also retried by the client
+    client = client.with_options(max_retries=0)
+    for attempt in range(max_attempts):
+        try:
+            if limiter is not None:
+                limiter.acquire(tokens)
+            response = client.embeddings.create(input=inputs, model=model)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except RateLimitError as e:
+            if attempt == max_attempts - 1:
+                raise
+            wait = retry_after_seconds(e, attempt)
+            print(f"Embeddings request throttled, retrying in {wait:.1f}s")
+            if limiter is not None:
+                limiter.backoff(wait)
+            time.sleep(wait)
+        except (APIConnectionError, InternalServerError) as e:
+            if attempt == max_attempts - 1:
+                raise
+            wait = min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+            print(f"Embeddings request failed ({e}), retrying in {wait:.1f}s")
+            time.sleep(wait)
+
+
+def embed_texts(
+    client,
+    texts: List[str],
+    model: str,
+    batch_size: int = 16,
+    max_batch_tokens: int = 100000,
+    max_workers: int = 4,
+    limiter=None,
+) -> List[List[float]]:
+    """
+    Embed `texts` in batches, running up to `max_workers` batches at a time, within
+    the budget of `limiter` if given (see create_embeddings()).
+    Returns the embeddings in the order of `texts` and prints progress as batches complete.
+    """
+    embeddings = [None] * len(texts)
+    batches = make_batches(texts, batch_size, max_batch_tokens)
+    start = time.perf_counter()
+    done = 0
+    lock = threading.Lock()
+
+    def run(batch):
+        nonlocal done
+        vectors = create_embeddings(client, [texts[i] for i in batch], model, limiter=limiter)
+        for i, vector in zip(batch, vectors):
+            embeddings[i] = vector
+        with lock:
+            done += len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"embedded {done}/{len(texts)} documents ({done / elapsed:.1f} docs/s)")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run, batch) for batch in batches]
+        for future in as_completed(futures):
+            future.result()
+
+    return embeddings
@@ -1,68 +1,547 @@
+import asyncio
+import functools
 import os
 import pathlib
-from ai_search import retrieve_documentation
-from promptflow.tools.common import init_azure_openai_client
-from promptflow.connections import AzureOpenAIConnection
-from promptflow.core import (AzureOpenAIModelConfiguration, Prompty)
+import time
+from ai_search import index_version, retrieve_documentation, retrieve_documentation_async
+from answer_cache import AnswerCache
+from batch_embeddings import count_tokens
+from clients import get_async_openai_client, get_chat_connection, get_embedding_client
+from context_packing import pack_documents
+from deployment_router import DeploymentRouter, load_pool
+from embedding_cache import EmbeddingCache
+from prompty_cache import PromptyCache
+from rate_limiter import get_limiter
+from promptflow.core import AsyncPrompty
 from promptflow.tracing import trace
 from azure_config import AzureConfig 
+from resilience import Deadline, Hedger, await_with_timeout, call_with_timeout, stage_timeout
+from retrieval import is_degraded, reciprocal_rank_fusion, retrieval_mode
+from telemetry import RequestTelemetry, current_retrieval_mode, log_payload, logger, record_cache
+from traffic_recorder import TrafficRecorder, redact_fields
 
 # Initialize AzureConfig
 azure_config = AzureConfig()
 
+INDEX_NAME = "rag-index"
+PROMPTY_PATH = os.path.join(pathlib.Path(__file__).parent.resolve(), "./chat.prompty")
+
+# Parsed chat.prompty objects, reloaded when the file changes
+prompty_cache = PromptyCache()
+
+# Question embeddings; set EMBEDDING_CACHE_PATH to share them across worker processes
+embedding_cache = EmbeddingCache(
+    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")),
+    path=os.getenv("EMBEDDING_CACHE_PATH"),
+    dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+)
+
+# Opt-in semantic cache of answers to questions asked without chat history
+answer_cache = None
+if os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true":
+    answer_cache = AnswerCache(
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97")),
+        max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+        ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+        dtype=os.getenv("ANSWER_CACHE_DTYPE", "float32")
+    )
+
+# In get_response_async, run a keyword-only search while the question is embedded
+# and fuse it with a vector-only search, instead of one hybrid search afterwards
+overlap_keyword_search = os.getenv("ASYNC_OVERLAP_KEYWORD_SEARCH", "false").lower() == "true"
+
+# Prompt-token budget for the retrieved documents, see context_packing.pack_documents
+context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+context_min_score_ratio = float(os.getenv("CONTEXT_MIN_SCORE_RATIO", "0"))
+context_dedup_threshold = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+# Opt-in recording of a sample of requests, for util/replay_traffic.py. Recordings
+# hold users' questions, chat history and answers in plain text; list the fields to
+# leave out in TRAFFIC_RECORDING_REDACT, e.g. "chat_history,answer"
+traffic_recorder = None
+if os.getenv("TRAFFIC_RECORDING_PATH"):
+    traffic_recorder = TrafficRecorder(
+        path=os.environ["TRAFFIC_RECORDING_PATH"],
+        sample_rate=float(os.getenv("TRAFFIC_RECORDING_SAMPLE_RATE", "0.1")),
+        max_bytes=int(float(os.getenv("TRAFFIC_RECORDING_MAX_MB", "64")) * 2**20),
+        max_files=int(os.getenv("TRAFFIC_RECORDING_FILES", "4")),
+        redact=redact_fields(os.getenv("TRAFFIC_RECORDING_REDACT", "").split(","))
+    )
+
+# Time budget of a request, of which the embedding and the search may each use a
+# share; the completion gets the rest. Off by default: set REQUEST_DEADLINE_SECONDS,
+# e.g. to 30, to fail requests with DeadlineExceeded once their budget runs out
+request_deadline = float(os.getenv("REQUEST_DEADLINE_SECONDS", "0")) or None
+deadline_shares = {
+    "embedding": float(os.getenv("EMBEDDING_DEADLINE_SHARE", "0.15")),
+    "search": float(os.getenv("SEARCH_DEADLINE_SHARE", "0.25")),
+}
+
+# Embedding calls slower than the HEDGE_PERCENTILE of recent ones get a second attempt
+embedding_hedger = Hedger(
+    "embedding",
+    percentile=float(os.getenv("HEDGE_PERCENTILE", "95")),
+    min_samples=int(os.getenv("HEDGE_MIN_SAMPLES", "20")),
+    enabled=os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+)
+
+# Longest answer, in tokens
+CHAT_MAX_TOKENS = 512
+
+# Ask for a final usage chunk when streaming; needs API version 2024-09-01-preview or later
+stream_include_usage = os.getenv("CHAT_STREAM_INCLUDE_USAGE", "true").lower() == "true"
+
+# Pools of deployments to spread calls over, as JSON lists in AZURE_OPENAI_CHAT_POOL
+# and AZURE_OPENAI_EMBEDDING_POOL (see deployment_router.load_pool); by default the
+# configured endpoint and deployment
+_routers = {}
+
+def get_router(kind: str) -> DeploymentRouter:
+    router = _routers.get(kind)
+    if router is None:
+        deployment = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT" if kind == "chat" else "AZURE_OPENAI_EMBEDDING_MODEL"]
+        members = load_pool(
+            os.getenv(f"AZURE_OPENAI_{kind.upper()}_POOL"),
+            azure_config.aoai_endpoint,
+            azure_config.aoai_api_version,
+            deployment
+        )
+        router = _routers.setdefault(kind, DeploymentRouter(kind, members))
+    return router
+
+def request_timeout(timeout):
+    # Also bound the client call itself, so an attempt that lost a hedge or ran past
+    # the deadline doesn't hold its connection for the client's default timeout
+    return {} if timeout is None else {"timeout": timeout}
+
+def prepaid_budget(member):
+    """Return a check that is true once, for a call to `member`, whose budget was taken ahead."""
+    prepaid = {member}
+
+    def use(call_member):
+        try:
+            # set.remove is atomic, so of two concurrent attempts only one gets the budget
+            prepaid.remove(call_member)
+            return True
+        except KeyError:
+            return False
+    return use
+
+def remaining_timeout(timeout, waited):
+    return None if timeout is None else max(0.0, timeout - waited)
+
+def new_deadline():
+    return Deadline(request_deadline, deadline_shares)
+
 def get_embedding(question: str):
     embedding_model = os.environ["AZURE_OPENAI_EMBEDDING_MODEL"]
 
-    connection = AzureOpenAIConnection(
-        azure_deployment=embedding_model,
-        api_version=azure_config.aoai_api_version,
-        api_base=azure_config.aoai_endpoint
-    )
-    client = init_azure_openai_client(connection)
+    cache_key = EmbeddingCache.key(question, embedding_model, azure_config.aoai_endpoint)
+    embedding = embedding_cache.get(cache_key)
+    record_cache("embedding", embedding is not None)
+    if embedding is not None:
+        return embedding
 
-    return client.embeddings.create(
-        input=question,
-        model=embedding_model,
-    ).data[0].embedding
+    router = get_router("embedding")
+
+    def create(member):
+        client = get_embedding_client(member.endpoint, member.api_version)
+        options = router.client_options()
+        if options:
+            client = client.with_options(**options)
+        # The budget taken before hedging covers one call to its member; every other
+        # call sent, a hedge, a retry or a failover, takes its own
+        if not use_prepaid(member):
+            get_limiter(member.endpoint, member.deployment).acquire(tokens, timeout)
+        response = client.embeddings.with_raw_response.create(
+            input=question,
+            model=member.deployment,
+            **request_timeout(timeout)
+        )
+        return response.parse(), response.headers
+
+    timeout = stage_timeout("embedding")
+    tokens = count_tokens(question)
+    # Wait for the budget once, before hedging: a wait inside an attempt would look like
+    # a slow call, and its hedge would take the budget a second time
+    budgeted = router.preferred(tokens)
+    waited = get_limiter(budgeted.endpoint, budgeted.deployment).acquire(tokens, timeout)
+    use_prepaid = prepaid_budget(budgeted)
+    timeout = remaining_timeout(timeout, waited)
+    embedding = embedding_hedger.call(timeout, router.call, tokens, create).data[0].embedding
+    embedding_cache.put(cache_key, embedding)
+    return embedding
+
+async def get_embedding_async(question: str):
+    embedding_model = os.environ["AZURE_OPENAI_EMBEDDING_MODEL"]
+
+    cache_key = EmbeddingCache.key(question, embedding_model, azure_config.aoai_endpoint)
+    embedding = embedding_cache.get(cache_key)
+    record_cache("embedding", embedding is not None)
+    if embedding is not None:
+        return embedding
+
+    router = get_router("embedding")
+
+    async def create(member):
+        client = get_async_openai_client(member.endpoint, member.api_version)
+        options = router.client_options()
+        if options:
+            client = client.with_options(**options)
+        # The budget taken before hedging covers one call to its member; every other
+        # call sent, a hedge, a retry or a failover, takes its own
+        if not use_prepaid(member):
+            await get_limiter(member.endpoint, member.deployment).acquire_async(tokens, timeout)
+        response = await client.embeddings.with_raw_response.create(
+            input=question,
+            model=member.deployment,
+            **request_timeout(timeout)
+        )
+        return response.parse(), response.headers
+
+    timeout = stage_timeout("embedding")
+    tokens = count_tokens(question)
+    budgeted = router.preferred(tokens)
+    waited = await get_limiter(budgeted.endpoint, budgeted.deployment).acquire_async(tokens, timeout)
+    use_prepaid = prepaid_budget(budgeted)
+    timeout = remaining_timeout(timeout, waited)
+    response = await embedding_hedger.call_async(timeout, router.call_async, tokens, create)
+    embedding = response.data[0].embedding
+    embedding_cache.put(cache_key, embedding)
+    return embedding
 
 def get_context(question, embedding):
     return retrieve_documentation(
         question=question,
-        index_name="rag-index",
+        index_name=INDEX_NAME,
         embedding=embedding,
         search_endpoint=azure_config.search_endpoint
     )
 
-@trace
-def get_response(question, chat_history):
-    print("inputs:", question)
-    embedding = get_embedding(question)
-    context = get_context(question, embedding)
-    print("context:", context)
-    print("getting result...")
-
-    deployment_name = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
-
-    configuration = AzureOpenAIModelConfiguration(
-        azure_deployment=deployment_name,
-        api_version=azure_config.aoai_api_version,
-        azure_endpoint=azure_config.aoai_endpoint
+async def get_context_async(question, embedding):
+    return await retrieve_documentation_async(
+        question=question,
+        index_name=INDEX_NAME,
+        embedding=embedding,
+        search_endpoint=azure_config.search_endpoint
+    )
+
+def pack_context(context, token_budget=None):
+    """Fit the retrieved documents into the prompt-token budget and report the savings."""
+    packed, stats = pack_documents(
+        context,
+        token_budget=token_budget or context_token_budget,
+        min_score_ratio=context_min_score_ratio,
+        dedup_threshold=context_dedup_threshold
+    )
+    logger.debug(
+        "context packing: %s tokens in %s of %s documents, %s tokens saved",
+        stats["tokens_out"], len(packed), stats["documents"], stats["tokens_saved"]
     )
+    return packed, stats
+
+def chat_tokens(question):
+    """
+    Tokens of a full-size prompt for a question: the prompt template, the question,
+    the documents' token budget and the answer's max_tokens.
+    """
+    return template_tokens() + count_tokens(question or "") + context_token_budget + CHAT_MAX_TOKENS
+
+def choose_chat_deployment(question):
+    """Pick the chat deployment for a question, counting a full-size prompt against its quota."""
+    return get_router("chat").choose(chat_tokens(question))
+
+def wait_for_budget(request, member, question, timeout):
+    # Wait for the deployment's shared budget (see rate_limiter.RateLimiter), but not past the deadline
+    waited = get_limiter(member.endpoint, member.deployment).acquire(chat_tokens(question), timeout)
+    record_budget_wait(request, waited)
+
+async def wait_for_budget_async(request, member, question, timeout):
+    waited = await get_limiter(member.endpoint, member.deployment).acquire_async(chat_tokens(question), timeout)
+    record_budget_wait(request, waited)
+
+def record_budget_wait(request, waited):
+    if waited > 0:
+        request.record(rate_limit_wait_ms=round(waited * 1000, 1))
+
+@functools.lru_cache(maxsize=1)
+def template_tokens():
+    with open(PROMPTY_PATH, "r") as f:
+        return count_tokens(f.read())
+
+def context_budget(member):
+    # A deployment with less quota left than a full-size prompt gets fewer documents
+    remaining_tokens, _ = get_router("chat").remaining(member)
+    if remaining_tokens is None or remaining_tokens >= 0:
+        return context_token_budget
+    return max(context_token_budget // 4, context_token_budget + remaining_tokens)
+
+def get_model_override(stream=False, raw_response=False, member=None):
+    if member is None:
+        member = get_router("chat").members[0]
+
+    configuration = {
+        "type": "azure_openai",
+        "azure_deployment": member.deployment,
+        "connection": get_chat_connection(member.endpoint, member.api_version)
+    }
+    parameters = {"max_tokens": CHAT_MAX_TOKENS}
+    if stream:
+        parameters["stream"] = True
+        if raw_response and stream_include_usage:
+            parameters["stream_options"] = {"include_usage": True}
+
     override_model = {
         "configuration": configuration,
-        "parameters": {"max_tokens": 512}
+        "parameters": parameters
     }
+    if raw_response:
+        # Return the OpenAI response itself instead of the first choice's content
+        override_model["response"] = "all"
+    return override_model
+
+def get_answer_cache_version():
+    """Identify the prompt and index that cached answers were produced with."""
+    prompty_mtime = os.stat(PROMPTY_PATH).st_mtime_ns
+    return f"{INDEX_NAME}:{index_version.get()}:{prompty_mtime}"
+
+def has_chat_history(chat_history):
+    # Batch runs pass the history as the string "[]"
+    return bool(chat_history) and chat_history != "[]"
+
+@trace
+def get_response(question, chat_history, stream=False, include_retrieval_mode=False):
+    """
+    Answer the question from the retrieved documents. With stream=True the answer is
+    a generator of text chunks, which promptflow serving streams to the client. With
+    include_retrieval_mode=True the response also names the retrieval mode that
+    served the documents under "retrieval_mode", so callers can tell answers from
+    degraded retrieval apart.
+
+    Stage timings, cache results, document and token counts are recorded through
+    telemetry.RequestTelemetry, as is the retrieval mode that served the documents,
+    which is degraded (see ai_search.retrieve_documentation) while search
+    dependencies fail. The stages share the REQUEST_DEADLINE_SECONDS budget
+    (see resilience.Deadline) and raise DeadlineExceeded once it runs out. Embedding
+    and chat calls go to the deployment of their pool with the most quota left (see
+    deployment_router.DeploymentRouter), once it fits in the deployment's budget
+    shared with the other processes on the host (see rate_limiter.RateLimiter).
+    """
+    with RequestTelemetry() as request, new_deadline() as deadline:
+        log_payload("inputs: %s", question)
+        with request.stage("embedding"):
+            embedding = get_embedding(question)
+
+        use_answer_cache = answer_cache is not None and not has_chat_history(chat_history)
+        if use_answer_cache:
+            cache_version = get_answer_cache_version()
+            cached = answer_cache.lookup(embedding, cache_version)
+            record_cache("answer", cached is not None)
+            if cached is not None:
+                logger.debug("answer served from cache")
+                finish_request(request, question, chat_history, cached["context"], cached["answer"])
+                # Only answers from the full query are cached
+                return with_retrieval_mode(cached, retrieval_mode(question, embedding), include_retrieval_mode)
+
+        with request.stage("search"):
+            retrieved = get_context(question, embedding)
+        mode = served_retrieval_mode(question, embedding)
+
+        member = choose_chat_deployment(question)
+        request.record(deployment=member.name)
+        with get_router("chat").track(member):
+            with request.stage("packing"):
+                context, packing = pack_context(retrieved, context_budget(member))
+            record_retrieval(request, retrieved, context, packing)
+            log_payload("context: %s", context)
+
+            with request.stage("config"):
+                prompty_obj = prompty_cache.load(PROMPTY_PATH, model=get_model_override(stream=stream, member=member))
+
+            # Prompty renders the prompt and calls the model in one go; its own trace has
+            # a separate span for the render
+            with request.stage("completion"):
+                wait_for_budget(request, member, question, deadline.timeout("completion"))
+                result = call_with_timeout(deadline.timeout("completion"), prompty_obj, question=question, documents=context)
+
+        if stream:
+            finish_request(request, question, chat_history, context)
+            return with_retrieval_mode({"answer": result, "context": context}, mode, include_retrieval_mode)
+
+        log_payload("result: %s", result)
+        record_completion(request, result)
+        finish_request(request, question, chat_history, context, result)
+
+        response = {"answer": result, "context": context}
+        # Answers from degraded retrieval aren't cached in place of full-quality ones
+        if use_answer_cache and not is_degraded(mode):
+            answer_cache.store(embedding, response, cache_version)
+        return with_retrieval_mode(response, mode, include_retrieval_mode)
+
+def record_retrieval(request, retrieved, context, packing):
+    request.record(documents=len(retrieved), documents_kept=len(context))
+    request.record_tokens(context=packing["tokens_out"], context_saved=packing["tokens_saved"])
+
+def served_retrieval_mode(question, embedding):
+    # The mode retrieval recorded on the request; the full query's when nothing was recorded
+    return current_retrieval_mode() or retrieval_mode(question, embedding)
+
+def with_retrieval_mode(response, mode, include):
+    return dict(response, retrieval_mode=mode) if include else response
+
+def finish_request(request, question, chat_history, context, answer=None):
+    timings = request.finish()
+    if traffic_recorder is not None:
+        traffic_recorder.record(question, chat_history, request.started_at, timings, context, answer)
+    return timings
+
+def record_completion(request, result):
+    # Prompty returns only the text, so completion tokens are counted locally
+    if isinstance(result, str):
+        request.record_tokens(completion_estimated=count_tokens(result))
+
+def stream_response(question, chat_history):
+    """
+    Answer the question as a stream of events, for clients that render tokens as
+    they arrive. Yields, in order:
+
+        {"event": "context", "context": [...]}
+        {"event": "token", "content": "..."}        (once per answer chunk)
+        {"event": "done", "usage": {...}, "timings": {...}}
+
+    Usage comes from the service when CHAT_STREAM_INCLUDE_USAGE is enabled;
+    otherwise completion_tokens is estimated from the number of chunks. It also
+    reports the prompt tokens saved by context packing.
+    Timings are in milliseconds from the start of the request.
+    """
+    # The request and its deadline are only entered around sections without a yield:
+    # a generator can't hold context variables across its yields
+    request = RequestTelemetry()
+    deadline = new_deadline()
+    start = request.start
+
+    def elapsed_ms():
+        return round((time.perf_counter() - start) * 1000, 1)
+
+    with request, deadline, request.stage("embedding"):
+        embedding = get_embedding(question)
+    with request, deadline, request.stage("search"):
+        retrieved = get_context(question, embedding)
+
+    member = choose_chat_deployment(question)
+    request.record(deployment=member.name)
+    with get_router("chat").track(member) as call:
+        with request.stage("packing"):
+            context, packing = pack_context(retrieved, context_budget(member))
+        record_retrieval(request, retrieved, context, packing)
+        timings = {"retrieval_ms": elapsed_ms()}
+        yield {"event": "context", "context": context}
+
+        prompty_obj = prompty_cache.load(
+            PROMPTY_PATH, model=get_model_override(stream=True, raw_response=True, member=member)
+        )
+        # The deadline bounds the time to the first chunk, not the whole stream
+        wait_for_budget(request, member, question, deadline.timeout("completion"))
+        chunks = call_with_timeout(deadline.timeout("completion"), prompty_obj, question=question, documents=context)
+        # The raw stream carries the response headers, with the deployment's remaining quota
+        call["headers"] = getattr(getattr(chunks, "response", None), "headers", None)
+
+    usage = None
+    token_count = 0
+    answer = []
+    for chunk in chunks:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage.model_dump()
+        if chunk.choices and chunk.choices[0].delta.content:
+            if token_count == 0:
+                timings["first_token_ms"] = elapsed_ms()
+            token_count += 1
+            answer.append(chunk.choices[0].delta.content)
+            yield {"event": "token", "content": chunk.choices[0].delta.content}
+
+    if usage is None:
+        usage = {"completion_tokens": token_count, "estimated": True}
+    else:
+        request.record_tokens(prompt=usage.get("prompt_tokens"), completion=usage.get("completion_tokens"))
+    usage["context_tokens_saved"] = packing["tokens_saved"]
+    request.record(first_token_ms=timings.get("first_token_ms", 0.0))
+    timings["total_ms"] = finish_request(request, question, chat_history, context, "".join(answer))["total_ms"]
+    yield {"event": "done", "usage": usage, "timings": timings}
+
+@trace
+async def get_response_async(question, chat_history, include_retrieval_mode=False):
+    """
+    Async variant of get_response, for serving many in-flight requests per worker.
+
+    With ASYNC_OVERLAP_KEYWORD_SEARCH=true, a keyword-only search runs while the
+    question is embedded.
+    """
+    with RequestTelemetry() as request, new_deadline() as deadline:
+        log_payload("inputs: %s", question)
+
+        async def timed(name, awaitable):
+            with request.stage(name):
+                return await awaitable
+
+        keyword_task = None
+        if overlap_keyword_search:
+            keyword_task = asyncio.create_task(timed("keyword_search", get_context_async(question, None)))
+
+        embedding = await timed("embedding", get_embedding_async(question))
+
+        use_answer_cache = answer_cache is not None and not has_chat_history(chat_history)
+        if use_answer_cache:
+            cache_version = get_answer_cache_version()
+            cached = answer_cache.lookup(embedding, cache_version)
+            record_cache("answer", cached is not None)
+            if cached is not None:
+                if keyword_task is not None:
+                    keyword_task.cancel()
+                logger.debug("answer served from cache")
+                finish_request(request, question, chat_history, cached["context"], cached["answer"])
+                # Only answers from the full query are cached
+                return with_retrieval_mode(cached, retrieval_mode(question, embedding), include_retrieval_mode)
+
+        with request.stage("search"):
+            if keyword_task is not None:
+                vector_docs, keyword_docs = await asyncio.gather(
+                    get_context_async(None, embedding), keyword_task
+                )
+                retrieved = reciprocal_rank_fusion([keyword_docs, vector_docs])
+            else:
+                retrieved = await get_context_async(question, embedding)
+        mode = served_retrieval_mode(question, embedding)
 
-    data_path = os.path.join(pathlib.Path(__file__).parent.resolve(), "./chat.prompty")
-    prompty_obj = Prompty.load(data_path, model=override_model)
+        member = choose_chat_deployment(question)
+        request.record(deployment=member.name)
+        with get_router("chat").track(member):
+            with request.stage("packing"):
+                context, packing = pack_context(retrieved, context_budget(member))
+            record_retrieval(request, retrieved, context, packing)
+            log_payload("context: %s", context)
 
-    result = prompty_obj(question=question, documents=context)
+            with request.stage("config"):
+                prompty_obj = await asyncio.to_thread(
+                    prompty_cache.load, PROMPTY_PATH, get_model_override(member=member), AsyncPrompty
+                )
 
-    print("result: ", result)
+            with request.stage("completion"):
+                await wait_for_budget_async(request, member, question, deadline.timeout("completion"))
+                result = await await_with_timeout(
+                    deadline.timeout("completion"), prompty_obj(question=question, documents=context), "completion"
+                )
 
-    return {"answer": result, "context": context}
+        log_payload("result: %s", result)
+        record_completion(request, result)
+        finish_request(request, question, chat_history, context, result)
 
+        response = {"answer": result, "context": context}
+        if use_answer_cache and not is_degraded(mode):
+            answer_cache.store(embedding, response, cache_version)
+        return with_retrieval_mode(response, mode, include_retrieval_mode)
 
 
 if __name__ == "__main__":
+    import logging
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     get_response("How can I access my medical records?", [])
\ No newline at end of file
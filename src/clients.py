@@ -0,0 +1,232 @@
+# clients.py
+
+import asyncio
+import os
+import threading
+import weakref
+
+from azure.core.credentials import AzureKeyCredential
+from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+from azure.identity.aio import get_bearer_token_provider as get_async_bearer_token_provider
+from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
+from openai import AsyncAzureOpenAI, AzureOpenAI
+from promptflow.connections import AzureOpenAIConnection
+from promptflow.constants import ConnectionAuthMode
+
+from telemetry import logger
+
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+# API keys used instead of Entra ID tokens when set, e.g. against local stand-in
+# services in util/benchmark.py
+OPENAI_API_KEY_VAR = "AZURE_OPENAI_CLIENT_KEY"
+SEARCH_API_KEY_VAR = "AZURE_SEARCH_CLIENT_KEY"
+
+_lock = threading.Lock()
+_credential = None
+_token_provider = None
+_openai_clients = {}
+_chat_connections = {}
+_search_clients = {}
+# Async clients are bound to the event loop that created them
+_async_clients = weakref.WeakKeyDictionary()
+
+
+class _SharedTokenConnection(AzureOpenAIConnection):
+    """
+    An Entra ID (meid_token) connection whose tokens come from the shared bearer
+    token provider, instead of a credential of its own.
+    """
+
+    def __init__(self, api_base: str, api_version: str):
+        super().__init__(api_base=api_base, api_version=api_version, auth_mode=ConnectionAuthMode.MEID_TOKEN)
+
+    def get_token(self):
+        return get_token_provider()()
+
+
+def get_credential() -> DefaultAzureCredential:
+    """Return the process-wide DefaultAzureCredential."""
+    global _credential
+    if _credential is None:
+        with _lock:
+            if _credential is None:
+                _credential = DefaultAzureCredential()
+    return _credential
+
+
+def get_token_provider():
+    """
+    Return the process-wide bearer token provider for Azure OpenAI.
+
+    The provider caches the AAD token and only goes back to the credential
+    when the token is about to expire, so requests never wait on a token
+    fetch while a valid one is available.
+    """
+    global _token_provider
+    if _token_provider is None:
+        credential = get_credential()
+        with _lock:
+            if _token_provider is None:
+                _token_provider = get_bearer_token_provider(credential, COGNITIVE_SERVICES_SCOPE)
+    return _token_provider
+
+
+def _openai_auth() -> dict:
+    api_key = os.getenv(OPENAI_API_KEY_VAR)
+    if api_key:
+        return {"api_key": api_key}
+    return {"azure_ad_token_provider": get_token_provider()}
+
+
+def _search_credential():
+    api_key = os.getenv(SEARCH_API_KEY_VAR)
+    return AzureKeyCredential(api_key) if api_key else get_credential()
+
+
+def _get_openai_client(kind: str, endpoint: str, api_version: str) -> AzureOpenAI:
+    key = (kind, endpoint, api_version)
+    client = _openai_clients.get(key)
+    if client is None:
+        auth = _openai_auth()
+        with _lock:
+            client = _openai_clients.get(key)
+            if client is None:
+                # The deployment is passed per call as `model`, and the client
+                # keeps its httpx connection pool alive between requests.
+                client = AzureOpenAI(
+                    api_version=api_version,
+                    azure_endpoint=endpoint,
+                    **auth,
+                )
+                _openai_clients[key] = client
+    return client
+
+
+def get_embedding_client(endpoint: str, api_version: str) -> AzureOpenAI:
+    """Return the shared Azure OpenAI client used for embeddings."""
+    return _get_openai_client("embedding", endpoint, api_version)
+
+
+def get_chat_client(endpoint: str, api_version: str) -> AzureOpenAI:
+    """Return the shared Azure OpenAI client used for chat completions."""
+    return _get_openai_client("chat", endpoint, api_version)
+
+
+def get_chat_connection(endpoint: str, api_version: str) -> AzureOpenAIConnection:
+    """
+    Return the shared AzureOpenAIConnection used by Prompty for chat completions.
+
+    Prompty builds its own OpenAI client from the connection on every call, so
+    sharing the connection is what lets those calls reuse the cached AAD token.
+    """
+    key = (endpoint, api_version)
+    connection = _chat_connections.get(key)
+    if connection is None:
+        with _lock:
+            connection = _chat_connections.get(key)
+            if connection is None:
+                api_key = os.getenv(OPENAI_API_KEY_VAR)
+                if api_key:
+                    connection = AzureOpenAIConnection(api_base=endpoint, api_version=api_version, api_key=api_key)
+                else:
+                    connection = _SharedTokenConnection(api_base=endpoint, api_version=api_version)
+                _chat_connections[key] = connection
+    return connection
+
+
+def get_search_client(endpoint: str, index_name: str) -> SearchClient:
+    """Return the shared SearchClient for the given index."""
+    key = (endpoint, index_name)
+    client = _search_clients.get(key)
+    if client is None:
+        credential = _search_credential()
+        with _lock:
+            client = _search_clients.get(key)
+            if client is None:
+                client = SearchClient(
+                    endpoint=endpoint,
+                    index_name=index_name,
+                    credential=credential
+                )
+                _search_clients[key] = client
+    return client
+
+
+def reset_clients():
+    """Close and drop every shared client, e.g. after a configuration change."""
+    global _credential, _token_provider
+    with _lock:
+        for client in list(_openai_clients.values()) + list(_search_clients.values()):
+            try:
+                client.close()
+            except Exception as e:
+                logger.info("error closing client: %s", e)
+        _openai_clients.clear()
+        _chat_connections.clear()
+        _search_clients.clear()
+        _credential = None
+        _token_provider = None
+
+
+def _get_loop_clients() -> dict:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.get(loop)
+        if clients is None:
+            clients = _async_clients[loop] = {}
+    return clients
+
+
+def _get_async_credential(clients: dict) -> AsyncDefaultAzureCredential:
+    if "credential" not in clients:
+        clients["credential"] = AsyncDefaultAzureCredential()
+    return clients["credential"]
+
+
+def get_async_openai_client(endpoint: str, api_version: str) -> AsyncAzureOpenAI:
+    """Return the AsyncAzureOpenAI client shared by the running event loop."""
+    clients = _get_loop_clients()
+    key = ("openai", endpoint, api_version)
+    if key not in clients:
+        api_key = os.getenv(OPENAI_API_KEY_VAR)
+        if api_key:
+            auth = {"api_key": api_key}
+        else:
+            auth = {"azure_ad_token_provider": get_async_bearer_token_provider(
+                _get_async_credential(clients), COGNITIVE_SERVICES_SCOPE
+            )}
+        clients[key] = AsyncAzureOpenAI(
+            api_version=api_version,
+            azure_endpoint=endpoint,
+            **auth,
+        )
+    return clients[key]
+
+
+def get_async_search_client(endpoint: str, index_name: str) -> AsyncSearchClient:
+    """Return the async SearchClient for the given index, shared by the running event loop."""
+    clients = _get_loop_clients()
+    key = ("search", endpoint, index_name)
+    if key not in clients:
+        api_key = os.getenv(SEARCH_API_KEY_VAR)
+        clients[key] = AsyncSearchClient(
+            endpoint=endpoint,
+            index_name=index_name,
+            credential=AzureKeyCredential(api_key) if api_key else _get_async_credential(clients)
+        )
+    return clients[key]
+
+
+async def close_async_clients():
+    """Close the async clients of the running event loop, e.g. before the loop shuts down."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, {})
+    for client in clients.values():
+        try:
+            await client.close()
+        except Exception as e:
+            logger.info("error closing client: %s", e)
@@ -0,0 +1,136 @@
+# compact_embeddings.py
+
+import os
+from typing import List
+
+import numpy as np
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# Rows widened to float32 at a time when scoring a compact matrix
+BLOCK_ROWS = 16384
+
+
+class CompactEmbeddings:
+    """
+    A packed matrix of embeddings, one row per vector, stored as float32, float16
+    or int8.
+
+    int8 uses symmetric scalar quantization with one float32 scale per row
+    (row = q * scale). That is about 4x smaller than float32, and float16 is 2x
+    smaller. Scores from quantized rows are approximate; see rescore() and recall_at_k().
+    """
+
+    def __init__(self, data: np.ndarray, scales: np.ndarray = None):
+        self.data = data
+        self.scales = scales
+
+    @property
+    def dtype(self) -> str:
+        return np.dtype(self.data.dtype).name
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @classmethod
+    def encode(cls, vectors, dtype: str = "float32") -> "CompactEmbeddings":
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[np.newaxis, :]
+        if dtype == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            data = np.round(matrix / scales[:, np.newaxis]).astype(np.int8)
+            return cls(data, scales.astype(np.float32))
+        return cls(matrix.astype(DTYPES[dtype]))
+
+    def decode(self, rows=None) -> np.ndarray:
+        """Return the rows (all by default) as a float32 matrix."""
+        data = self.data if rows is None else self.data[rows]
+        matrix = data.astype(np.float32)
+        if self.scales is not None:
+            scales = self.scales if rows is None else self.scales[rows]
+            matrix *= scales[:, np.newaxis]
+        return matrix
+
+    def dot(self, query) -> np.ndarray:
+        """Dot product of every row with a float32 query vector."""
+        query = np.asarray(query, dtype=np.float32)
+        if self.data.dtype == np.float32:
+            return self.data @ query
+        # Widen a block at a time: float32 products use BLAS, and the copy stays small
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), BLOCK_ROWS):
+            block = self.data[start:start + BLOCK_ROWS].astype(np.float32)
+            scores[start:start + BLOCK_ROWS] = block @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def save(self, path: str):
+        """Write the rows to `path` and, for int8, the scales to `path`.scales."""
+        self.data.tofile(path)
+        if self.scales is not None:
+            self.scales.tofile(path + ".scales")
+
+    @classmethod
+    def load(cls, path: str, dtype: str, dimensions: int) -> "CompactEmbeddings":
+        """Memory-map rows written by save()."""
+        data = np.memmap(path, dtype=DTYPES[dtype], mode="r").reshape(-1, dimensions)
+        scales = None
+        if os.path.exists(path + ".scales"):
+            scales = np.fromfile(path + ".scales", dtype=np.float32)
+        return cls(data, scales)
+
+
+def pack(vector, dtype: str = "float32") -> bytes:
+    """Serialize one vector; int8 blobs start with their float32 scale."""
+    compact = CompactEmbeddings.encode(vector, dtype)
+    prefix = compact.scales.tobytes() if compact.scales is not None else b""
+    return prefix + compact.data.tobytes()
+
+
+def unpack(blob: bytes, dtype: str = "float32") -> np.ndarray:
+    """Inverse of pack(), returning a float32 vector."""
+    if dtype == "int8":
+        scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+        return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+    return np.frombuffer(blob, dtype=DTYPES[dtype]).astype(np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row indexes of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.zeros(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def rescore(query, candidates: np.ndarray, full_precision: np.ndarray, k: int) -> np.ndarray:
+    """Re-rank candidate rows found on compact vectors by their full-precision scores."""
+    scores = np.asarray(full_precision[candidates], dtype=np.float32) @ np.asarray(query, dtype=np.float32)
+    return candidates[top_k(scores, k)]
+
+
+def recall_at_k(full_precision: np.ndarray, compact: CompactEmbeddings, queries: List[List[float]], k: int = 3, rescore_factor: int = 0) -> float:
+    """
+    Fraction of the exact top-k rows that a compact search also returns, averaged
+    over `queries`. With rescore_factor > 0, k * rescore_factor candidates are taken
+    from the compact vectors and re-ranked at full precision, as LocalSearchBackend does.
+    """
+    hits = 0
+    for query in queries:
+        query = np.asarray(query, dtype=np.float32)
+        exact = set(top_k(full_precision @ query, k).tolist())
+        if rescore_factor:
+            candidates = top_k(compact.dot(query), k * rescore_factor)
+            found = rescore(query, candidates, full_precision, k)
+        else:
+            found = top_k(compact.dot(query), k)
+        hits += len(exact & set(found.tolist()))
+    return hits / (k * len(queries)) if len(queries) else 1.0
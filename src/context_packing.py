@@ -0,0 +1,108 @@
+# context_packing.py
+
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+from batch_embeddings import count_tokens, get_encoding
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=4096)
+def text_tokens(text: str) -> int:
+    """count_tokens, memoized since the same documents are retrieved again and again."""
+    return count_tokens(text)
+
+
+def _title(document) -> str:
+    return document.get("title") or "" if isinstance(document, dict) else ""
+
+
+def _content(document) -> str:
+    return document.get("content") or "" if isinstance(document, dict) else str(document)
+
+
+def _score(document):
+    return document.get("score") if isinstance(document, dict) else None
+
+
+def document_tokens(document) -> int:
+    return text_tokens(_title(document)) + text_tokens(_content(document))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def shingles(text: str, size: int = 5) -> set:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def pack_documents(
+    documents: List,
+    token_budget: int = 2000,
+    min_score_ratio: float = 0.0,
+    dedup_threshold: float = 0.8,
+    min_document_tokens: int = 50,
+) -> Tuple[List, dict]:
+    """
+    Fit ranked documents, as dicts with title, content and an optional score or as
+    plain text passages, into a prompt-token budget. Documents are considered in
+    rank order and:
+
+    - dropped if their "score" is below `min_score_ratio` times the best score
+      (documents without a score are never dropped this way);
+    - dropped if at least `dedup_threshold` of their word 5-grams already appear in
+      a better-ranked document, as with overlapping chunks of one source;
+    - truncated to the remaining budget, or dropped when less than
+      `min_document_tokens` would be left of them.
+
+    A token_budget of 0 disables the budget. Returns the packed documents and a dict
+    of token counts and drop reasons for reporting.
+    """
+    scores = [_score(doc) for doc in documents if _score(doc) is not None]
+    min_score = max(scores) * min_score_ratio if scores and min_score_ratio else None
+
+    packed = []
+    kept_shingles = []
+    stats = {"documents": len(documents), "low_score": 0, "duplicates": 0, "truncated": 0, "over_budget": 0}
+    tokens_in = 0
+    tokens_out = 0
+    for doc in documents:
+        tokens = document_tokens(doc)
+        tokens_in += tokens
+
+        if min_score is not None and _score(doc) is not None and _score(doc) < min_score:
+            stats["low_score"] += 1
+            continue
+
+        doc_shingles = shingles(_content(doc))
+        if doc_shingles and any(
+            len(doc_shingles & kept) >= dedup_threshold * len(doc_shingles) for kept in kept_shingles
+        ):
+            stats["duplicates"] += 1
+            continue
+
+        if token_budget and tokens_out + tokens > token_budget:
+            remaining = token_budget - tokens_out - text_tokens(_title(doc))
+            if remaining < min_document_tokens:
+                stats["over_budget"] += 1
+                continue
+            content = truncate_tokens(_content(doc), remaining)
+            doc = dict(doc, content=content) if isinstance(doc, dict) else content
+            tokens = document_tokens(doc)
+            stats["truncated"] += 1
+
+        packed.append(doc)
+        kept_shingles.append(doc_shingles)
+        tokens_out += tokens
+
+    stats.update(tokens_in=tokens_in, tokens_out=tokens_out, tokens_saved=tokens_in - tokens_out)
+    return packed, stats
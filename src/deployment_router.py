@@ -0,0 +1,278 @@
+# deployment_router.py
+
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Optional
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+from batch_embeddings import retry_after_seconds
+from rate_limiter import get_limiter
+from telemetry import logger
+
+# Azure OpenAI quotas are per minute
+WINDOW_SECONDS = 60.0
+
+# Errors after which call() tries another member, as the client would have retried them
+RETRIABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+
+
+class PoolMember:
+    """
+    One Azure OpenAI deployment in a pool, with its per-minute quota.
+
+    The remaining quota comes from the x-ratelimit-remaining-* headers of the last
+    response, less what was sent since; without a recent response it is the
+    configured `tpm` and `rpm` less what was sent in the last minute (unlimited when
+    not configured).
+    """
+
+    def __init__(self, endpoint: str, deployment: str, api_version: str, tpm: int = None, rpm: int = None):
+        self.endpoint = endpoint
+        self.deployment = deployment
+        self.api_version = api_version
+        self.tpm = tpm
+        self.rpm = rpm
+        self.name = f"{endpoint}#{deployment}"
+        self.sent = deque()
+        self.reported = None
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+
+    def _prune(self, now: float):
+        while self.sent and now - self.sent[0][0] > WINDOW_SECONDS:
+            self.sent.popleft()
+
+    def remaining(self, now: float):
+        """Return the (tokens, requests) this member is estimated to have left this minute."""
+        self._prune(now)
+        if self.reported is not None and now - self.reported[0] < WINDOW_SECONDS:
+            reported_at, tokens, requests = self.reported
+            since = [cost for sent_at, cost in self.sent if sent_at > reported_at]
+            return (
+                None if tokens is None else tokens - sum(since),
+                None if requests is None else requests - len(since),
+            )
+        return (
+            None if self.tpm is None else self.tpm - sum(cost for _, cost in self.sent),
+            None if self.rpm is None else self.rpm - len(self.sent),
+        )
+
+
+def _header_int(headers, name: str) -> Optional[int]:
+    value = headers.get(name) if headers is not None else None
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def rate_limit_error(error: BaseException) -> Optional[RateLimitError]:
+    """The 429 behind an error, also when Prompty wrapped it after its own retries."""
+    if isinstance(error, RateLimitError):
+        return error
+    inner = getattr(error, "_ex", None)
+    return inner if isinstance(inner, RateLimitError) else None
+
+
+def retry_after(error: RateLimitError) -> Optional[float]:
+    """The service's retry-after hint of a 429, if it gave one."""
+    headers = getattr(error.response, "headers", None) or {}
+    if headers.get("retry-after-ms") or headers.get("retry-after"):
+        return retry_after_seconds(error, 0)
+    return None
+
+
+def load_pool(value: Optional[str], endpoint: str, api_version: str, deployment: str) -> List[PoolMember]:
+    """
+    Read a pool from JSON, a list of objects with endpoint, deployment, api_version,
+    tpm and rpm, where the given endpoint, api_version and deployment are the defaults.
+    Without a value the pool is just the given deployment.
+    """
+    entries = json.loads(value) if value else [{}]
+    return [
+        PoolMember(
+            endpoint=entry.get("endpoint", endpoint),
+            deployment=entry.get("deployment", deployment),
+            api_version=entry.get("api_version", api_version),
+            tpm=entry.get("tpm"),
+            rpm=entry.get("rpm"),
+        )
+        for entry in entries
+    ]
+
+
+class DeploymentRouter:
+    """
+    Spreads calls over a pool of deployments by their remaining quota.
+
+    choose() picks, among the members that aren't cooling down after a 429, one
+    whose remaining tokens and requests fit the call, preferring the one with the
+    most tokens left (and then the fewest calls in flight). The call's tokens count
+    against the member right away, so concurrent calls spread out before any
+    response comes back. A 429 cools the member down for its retry-after time. call()
+    retries failed calls on another member, so with more than one member client-side
+    retries should be turned off (see client_options()).
+
+    The members must serve the same model, since callers cache and compare results
+    regardless of the member that produced them.
+    """
+
+    def __init__(self, name: str, members: List[PoolMember], cooldown: float = 10.0):
+        if not members:
+            raise ValueError(f"deployment pool {name} is empty")
+        self.name = name
+        self.members = members
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    def client_options(self) -> dict:
+        """Options for the OpenAI client: no retries of its own when there is another member to go to."""
+        return {"max_retries": 0} if len(self.members) > 1 else {}
+
+    def _pick(self, tokens: int, exclude, now: float) -> PoolMember:
+        candidates = [member for member in self.members if member not in exclude] or self.members
+        available = [member for member in candidates if member.cooldown_until <= now]
+        if not available:
+            # Every member is throttled: go to the one that recovers first
+            return min(candidates, key=lambda member: member.cooldown_until)
+
+        def headroom(member):
+            remaining_tokens, remaining_requests = member.remaining(now)
+            fits = (remaining_tokens is None or remaining_tokens >= tokens) and (
+                remaining_requests is None or remaining_requests >= 1
+            )
+            left = float("inf") if remaining_tokens is None else remaining_tokens
+            return (fits, left, -member.in_flight)
+        return max(available, key=headroom)
+
+    def preferred(self, tokens: int) -> PoolMember:
+        """The member choose() would pick now, without counting a call against it."""
+        with self._lock:
+            return self._pick(tokens, (), time.monotonic())
+
+    def choose(self, tokens: int, exclude=()) -> PoolMember:
+        """Pick a member for a call of about `tokens` tokens and count the call against it."""
+        now = time.monotonic()
+        with self._lock:
+            member = self._pick(tokens, exclude, now)
+            member.sent.append((now, tokens))
+            member.in_flight += 1
+            member.requests += 1
+            return member
+
+    def remaining(self, member: PoolMember):
+        """Return the (tokens, requests) `member` has left this minute, None where unknown."""
+        with self._lock:
+            return member.remaining(time.monotonic())
+
+    def release(self, member: PoolMember, headers=None):
+        """Mark the call done, updating the member's quota from the response headers if any."""
+        remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+        remaining_requests = _header_int(headers, "x-ratelimit-remaining-requests")
+        with self._lock:
+            member.in_flight -= 1
+            if remaining_tokens is not None or remaining_requests is not None:
+                member.reported = (time.monotonic(), remaining_tokens, remaining_requests)
+
+    def throttle(self, member: PoolMember, seconds: Optional[float] = None):
+        """
+        Route away from a member that returned a 429, for `seconds` or the default
+        cooldown, and drain its shared budget for as long, so the other processes
+        drawing from it back off too (see rate_limiter.RateLimiter.backoff()).
+        """
+        seconds = self.cooldown if seconds is None else seconds
+        with self._lock:
+            member.in_flight -= 1
+            member.throttled += 1
+            member.cooldown_until = time.monotonic() + seconds
+        get_limiter(member.endpoint, member.deployment).backoff(seconds)
+        logger.warning("%s deployment %s throttled, cooling down", self.name, member.name)
+
+    @contextmanager
+    def track(self, member: PoolMember):
+        """
+        Release the member after the call in the block, or throttle it after a 429.
+        The block may set the "headers" of the response in the dict it is given.
+        """
+        call = {}
+        try:
+            yield call
+        except BaseException as e:
+            throttled = rate_limit_error(e)
+            if throttled is not None:
+                self.throttle(member, retry_after(throttled))
+            else:
+                self.release(member)
+            raise
+        self.release(member, call.get("headers"))
+
+    def call(self, tokens: int, fn):
+        """
+        Call fn(member), which returns (result, response headers), on a chosen member,
+        and again on another one after each 429, 5xx or connection error until every
+        member was tried.
+        """
+        tried = []
+        while True:
+            member = self.choose(tokens, exclude=tried)
+            tried.append(member)
+            try:
+                result, headers = fn(member)
+            except RETRIABLE_ERRORS as e:
+                if isinstance(e, RateLimitError):
+                    self.throttle(member, retry_after(e))
+                else:
+                    self.release(member)
+                if len(tried) < len(self.members):
+                    continue
+                raise
+            except BaseException:
+                self.release(member)
+                raise
+            self.release(member, headers)
+            return result
+
+    async def call_async(self, tokens: int, fn):
+        """Async variant of call(), for a coroutine function fn."""
+        tried = []
+        while True:
+            member = self.choose(tokens, exclude=tried)
+            tried.append(member)
+            try:
+                result, headers = await fn(member)
+            except RETRIABLE_ERRORS as e:
+                if isinstance(e, RateLimitError):
+                    self.throttle(member, retry_after(e))
+                else:
+                    self.release(member)
+                if len(tried) < len(self.members):
+                    continue
+                raise
+            except BaseException:
+                self.release(member)
+                raise
+            self.release(member, headers)
+            return result
+
+    def stats(self) -> dict:
+        """Return the remaining quota, calls in flight and 429 count of each member."""
+        now = time.monotonic()
+        with self._lock:
+            stats = {}
+            for member in self.members:
+                remaining_tokens, remaining_requests = member.remaining(now)
+                stats[member.name] = {
+                    "remaining_tokens": remaining_tokens,
+                    "remaining_requests": remaining_requests,
+                    "in_flight": member.in_flight,
+                    "requests": member.requests,
+                    "throttled": member.throttled,
+                    "cooling_down": member.cooldown_until > now,
+                }
+            return stats
@@ -0,0 +1,155 @@
+# embedding_cache.py
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional
+
+from compact_embeddings import pack, unpack
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a question so trivially different spellings share a cache entry."""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.casefold().split())
+
+
+class EmbeddingCache:
+    """
+    A two-tier cache for question embeddings.
+
+    The first tier is an in-memory LRU bounded by `max_entries`. The optional second
+    tier is a SQLite file at `path`, shared by every worker process on the host and
+    bounded by `max_disk_entries`, dropping the oldest writes first. Embeddings are
+    held packed in both tiers, as float32 by default or as float16 or int8 with
+    `dtype` to fit more entries in the same memory.
+    """
+
+    # How many writes to the disk tier between size checks
+    DISK_TRIM_INTERVAL = 100
+
+    def __init__(self, max_entries: int = 1024, path: str = None, max_disk_entries: int = 100000, dtype: str = "float32"):
+        self.max_entries = max_entries
+        self.dtype = dtype
+        # Each dtype gets its own table so changing it never misreads older rows
+        self._table = "embeddings" if dtype == "float32" else f"embeddings_{dtype}"
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._local = threading.local()
+        self._disk_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.path:
+            with self._connection() as conn:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self._table} "
+                    "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, written_at REAL NOT NULL)"
+                )
+
+    @staticmethod
+    def key(text: str, model: str, endpoint: str) -> str:
+        """Build the cache key from the normalized text and the embedding deployment."""
+        raw = "\x1f".join([model, endpoint, normalize_text(text)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Return the cached embedding for `key`, or None."""
+        with self._lock:
+            blob = self._memory.get(key)
+            if blob is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return unpack(blob, self.dtype).tolist()
+
+        if self.path:
+            try:
+                row = self._connection().execute(
+                    f"SELECT vector FROM {self._table} WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Embedding cache read failed: {e}")
+                row = None
+            if row is not None:
+                blob = bytes(row[0])
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._put_memory(key, blob)
+                return unpack(blob, self.dtype).tolist()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, embedding: List[float]):
+        """Store an embedding in both tiers."""
+        blob = pack(embedding, self.dtype)
+        with self._lock:
+            self._put_memory(key, blob)
+
+        if self.path:
+            try:
+                with self._connection() as conn:
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO {self._table} (key, vector, written_at) VALUES (?, ?, ?)",
+                        (key, blob, time.time())
+                    )
+                with self._lock:
+                    self._disk_writes += 1
+                    trim = self._disk_writes % self.DISK_TRIM_INTERVAL == 0
+                if trim:
+                    self._trim_disk()
+            except sqlite3.Error as e:
+                print(f"Embedding cache write failed: {e}")
+
+    def _put_memory(self, key: str, blob: bytes):
+        self._memory[key] = blob
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _trim_disk(self):
+        with self._connection() as conn:
+            count = conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+            excess = count - self.max_disk_entries
+            if excess > 0:
+                conn.execute(
+                    f"DELETE FROM {self._table} WHERE key IN "
+                    f"(SELECT key FROM {self._table} ORDER BY written_at LIMIT ?)",
+                    (excess,)
+                )
+                with self._lock:
+                    self.disk_evictions += excess
+
+    def stats(self) -> dict:
+        """Return hit, miss and eviction counters along with the hit ratio."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+                "entries": len(self._memory),
+            }
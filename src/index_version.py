@@ -0,0 +1,61 @@
+# index_version.py
+
+import os
+import threading
+import time
+import uuid
+
+# data/rag-index.version in the repository, wherever the process was started from
+DEFAULT_VERSION_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "rag-index.version"
+)
+
+
+def publish_index_version(path: str = DEFAULT_VERSION_PATH) -> str:
+    """Write a new index version to `path` and return it; indexing scripts call this when they finish."""
+    version = f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+class IndexVersion:
+    """
+    The search index version published by the indexing script.
+
+    The version file at `path` is checked at most every `interval` seconds and re-read
+    only when it changes. Without the file, SEARCH_INDEX_VERSION is used, so
+    deployments that don't share a filesystem with the indexing job can set it instead;
+    SEARCH_INDEX_VERSION_PATH points deployments that do at the published file.
+    """
+
+    def __init__(self, path: str = DEFAULT_VERSION_PATH, interval: float = 5.0):
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._mtime = None
+        self._version = None
+
+    def get(self) -> str:
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._checked_at < self.interval:
+                return self._version
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+                # publish_index_version replaces the file, so a new inode also means a new version
+                mtime = (stat.st_mtime_ns, stat.st_ino)
+                if mtime != self._mtime:
+                    with open(self.path, "r") as f:
+                        self._version = f.read().strip()
+                    self._mtime = mtime
+            except OSError:
+                self._mtime = None
+                self._version = os.getenv("SEARCH_INDEX_VERSION", "")
+            return self._version
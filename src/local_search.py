@@ -0,0 +1,176 @@
+# local_search.py
+
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from compact_embeddings import CompactEmbeddings, rescore, top_k
+from retrieval import RetrievalBackend, reciprocal_rank_fusion
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def build_local_index(documents: List[Dict[str, str]], embeddings: List[List[float]], index_dir: str, quantization: str = None):
+    """
+    Write a local index for LocalSearchBackend to `index_dir`:
+
+        documents.jsonl   id, title, content and url of each document
+        embeddings.f32    row-normalized float32 matrix, one row per document
+        postings.json     term -> [[document row, term frequency], ...]
+        meta.json         document count, embedding dimensions, document lengths and quantization
+
+    With `quantization` set to "float16" or "int8", a compact copy of the matrix is
+    also written to embeddings.<quantization> for the backend to scan.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    # Divide into a new array, so a caller's float32 embeddings are left as they were
+    matrix = matrix / np.where(norms == 0, 1, norms)
+    matrix.tofile(os.path.join(index_dir, "embeddings.f32"))
+    if quantization:
+        CompactEmbeddings.encode(matrix, quantization).save(os.path.join(index_dir, f"embeddings.{quantization}"))
+
+    postings = defaultdict(list)
+    lengths = []
+    with open(os.path.join(index_dir, "documents.jsonl"), "w") as f:
+        for row, document in enumerate(documents):
+            f.write(json.dumps({key: document[key] for key in ["id", "title", "content", "url"]}) + "\n")
+            terms = tokenize(f"{document['title']} {document['content']}")
+            lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                postings[term].append([row, count])
+
+    with open(os.path.join(index_dir, "postings.json"), "w") as f:
+        json.dump(postings, f)
+    with open(os.path.join(index_dir, "meta.json"), "w") as f:
+        json.dump({
+            "count": len(documents),
+            "dimensions": int(matrix.shape[1]),
+            "lengths": lengths,
+            "quantization": quantization
+        }, f)
+
+
+class LocalSearchBackend(RetrievalBackend):
+    """
+    An in-process retrieval backend over an index written by build_local_index.
+
+    The embedding matrix is memory-mapped, so worker processes share its pages. Vector
+    queries are a cosine top-k over the matrix, keyword queries are scored with BM25,
+    and hybrid queries fuse the two rankings by reciprocal rank fusion.
+
+    If the index was built with quantization, vector queries scan the compact matrix
+    instead and rescore its top `top * rescore_factor` rows at full precision, so only
+    those rows of the float32 matrix are read.
+    """
+
+    def __init__(self, index_dir: str, k1: float = 1.2, b: float = 0.75, rescore_factor: int = 4):
+        with open(os.path.join(index_dir, "meta.json"), "r") as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, "documents.jsonl"), "r") as f:
+            self.documents = [json.loads(line) for line in f]
+        with open(os.path.join(index_dir, "postings.json"), "r") as f:
+            postings = json.load(f)
+
+        self.embeddings = np.memmap(
+            os.path.join(index_dir, "embeddings.f32"),
+            dtype=np.float32,
+            mode="r",
+            shape=(meta["count"], meta["dimensions"])
+        )
+        self.compact = None
+        if meta.get("quantization"):
+            self.compact = CompactEmbeddings.load(
+                os.path.join(index_dir, f"embeddings.{meta['quantization']}"),
+                meta["quantization"],
+                meta["dimensions"]
+            )
+        self.rescore_factor = rescore_factor
+        self.k1 = k1
+        self.b = b
+        self.lengths = np.asarray(meta["lengths"], dtype=np.float32)
+        self.average_length = float(self.lengths.mean()) if len(self.lengths) else 0.0
+        self.postings = {
+            term: (np.asarray([row for row, _ in rows]), np.asarray([tf for _, tf in rows], dtype=np.float32))
+            for term, rows in postings.items()
+        }
+
+    def vector_search(self, embedding: List[float], top: int) -> List[int]:
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        if self.compact is not None:
+            candidates = top_k(self.compact.dot(query), top * self.rescore_factor)
+            return rescore(query, candidates, self.embeddings, top).tolist()
+        scores = self.embeddings @ query
+        return self._top_rows(scores, top)
+
+    def keyword_search(self, question: str, top: int) -> List[int]:
+        count = len(self.documents)
+        scores = np.zeros(count, dtype=np.float32)
+        for term in set(tokenize(question)):
+            if term not in self.postings:
+                continue
+            rows, tf = self.postings[term]
+            idf = math.log(1 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[rows] / self.average_length)
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norm)
+        rows = self._top_rows(scores, top)
+        return [row for row in rows if scores[row] > 0]
+
+    @staticmethod
+    def _top_rows(scores: np.ndarray, top: int) -> List[int]:
+        return top_k(scores, top).tolist()
+
+    def retrieve(self, question: str, embedding: List[float], top: int = 3, semantic: bool = True, timeout: Optional[float] = None) -> List[dict]:
+        # Queries run in process, so there is no call for `timeout` to bound
+        result_lists = []
+        # Each leg contributes more candidates than requested so the fusion has overlap to work with
+        if question is not None:
+            result_lists.append([self.documents[row] for row in self.keyword_search(question, top * 5)])
+        if embedding is not None:
+            result_lists.append([self.documents[row] for row in self.vector_search(embedding, top * 5)])
+        return [dict(doc) for doc in reciprocal_rank_fusion(result_lists, top=top)]
+
+
+if __name__ == "__main__":
+    import argparse
+    import pandas as pd
+    from azure_config import AzureConfig
+    from batch_embeddings import embed_texts
+    from clients import get_embedding_client
+    from index_version import DEFAULT_VERSION_PATH, publish_index_version
+
+    parser = argparse.ArgumentParser(description="Build a local retrieval index from a documents CSV.")
+    parser.add_argument("source", nargs="?", default="data/sample-documents.csv", help="CSV with id, name, content and url columns")
+    parser.add_argument("index_dir", nargs="?", default="data/local-index", help="Directory to write the index to")
+    parser.add_argument("--quantization", choices=["float16", "int8"], help="Also write a compact copy of the embeddings to scan")
+    args = parser.parse_args()
+
+    azure_config = AzureConfig()
+    rows = pd.read_csv(args.source).to_dict("records")
+    documents = [
+        {"id": str(row["id"]), "title": row["name"], "content": row["content"], "url": row["url"]}
+        for row in rows
+    ]
+    client = get_embedding_client(azure_config.aoai_endpoint, azure_config.aoai_api_version)
+    embeddings = embed_texts(
+        client,
+        [document["content"] for document in documents],
+        model=os.environ["AZURE_OPENAI_EMBEDDING_MODEL"]
+    )
+    build_local_index(documents, embeddings, args.index_dir, quantization=args.quantization)
+    print(f"local index with {len(documents)} documents written to {args.index_dir}")
+    print(f"published index version {publish_index_version(os.getenv('SEARCH_INDEX_VERSION_PATH', DEFAULT_VERSION_PATH))}")
@@ -0,0 +1,67 @@
+# prompty_cache.py
+
+import json
+import os
+import threading
+
+from promptflow.core import Prompty
+
+
+def _model_key(model) -> str:
+    # Model overrides may hold connection objects, which are shared per process
+    # (see clients.py), so their identity is a stable part of the key.
+    return json.dumps(
+        model,
+        sort_keys=True,
+        default=lambda o: f"{type(o).__name__}:{id(o)}"
+    )
+
+
+class PromptyCache:
+    """
+    A process-wide cache of loaded Prompty objects.
+
+    Entries are keyed by the absolute prompty path and the model override, and are
+    reloaded when the file's modification time changes, so edits to a .prompty file
+    are picked up without restarting the process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path: str, model: dict = None, prompty_cls=Prompty) -> Prompty:
+        """
+        Return the Prompty for `path` and `model`, loading it only when needed.
+        Pass prompty_cls=AsyncPrompty to get an awaitable prompty.
+        """
+        path = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime_ns
+        key = (path, _model_key(model), prompty_cls.__name__)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        prompty_obj = prompty_cls.load(path, model=model)
+
+        with self._lock:
+            self._entries[key] = (mtime, prompty_obj)
+        return prompty_obj
+
+    def stats(self) -> dict:
+        """Return hit and miss counters along with the number of cached entries."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def clear(self):
+        """Drop every cached entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
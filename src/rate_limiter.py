@@ -0,0 +1,273 @@
+# rate_limiter.py
+
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from batch_embeddings import count_tokens
+from telemetry import logger
+
+# Budgets per deployment, as JSON in AZURE_OPENAI_RATE_LIMITS, e.g.
+# {"gpt-35-turbo": {"rpm": 300, "tpm": 50000}}; deployments not listed are unlimited
+rate_limits = json.loads(os.getenv("AZURE_OPENAI_RATE_LIMITS") or "{}")
+
+# SQLite file through which every process on the host shares the budgets; set it
+# to an empty string to keep budgets per process
+state_path = os.getenv(
+    "AZURE_OPENAI_RATE_LIMIT_PATH", os.path.join(tempfile.gettempdir(), "aoai-rate-limits.sqlite")
+)
+
+# Share of each budget that background callers (indexing, evaluations) leave to serving
+serving_reserve = float(os.getenv("AZURE_OPENAI_RATE_LIMIT_RESERVE", "0.2"))
+
+# "serving" or "background"; see set_priority()
+_priority = os.getenv("AZURE_OPENAI_RATE_LIMIT_PRIORITY", "serving")
+
+_lock = threading.Lock()
+_limiters = {}
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised when a call can't fit in the budget within its timeout."""
+
+
+def set_priority(priority: str):
+    """
+    Mark this process's calls as "serving" or "background". Background calls leave
+    AZURE_OPENAI_RATE_LIMIT_RESERVE of each budget to serving. The setting is also
+    exported to the environment, so processes started from here inherit it.
+    """
+    global _priority
+    if priority not in ("serving", "background"):
+        raise ValueError(f"unknown rate limit priority {priority}")
+    _priority = priority
+    os.environ["AZURE_OPENAI_RATE_LIMIT_PRIORITY"] = priority
+
+
+def estimate_tokens(*texts, max_tokens: int = 0) -> int:
+    """
+    Tokens a call counts against the TPM budget: its prompt and the max_tokens it
+    asks for, which Azure OpenAI counts in full when the request is accepted.
+    """
+    return sum(count_tokens(text if isinstance(text, str) else json.dumps(text, default=str)) for text in texts) + max_tokens
+
+
+class RateLimiter:
+    """
+    A client-side token bucket for the requests and tokens per minute of one deployment.
+
+    Each budget refills continuously at its per-minute rate and holds at most
+    `burst_seconds` of it, so calls spread out over the minute instead of bursting
+    into the service's shorter rate-limit windows. acquire() takes one request and
+    the call's estimated tokens, waiting until both buckets hold enough. A call
+    larger than the bucket waits for a full bucket and leaves it in debt. Background
+    calls wait until they'd leave `reserve` of each bucket for serving calls.
+
+    With a `path`, the buckets are rows in a SQLite file updated in one transaction
+    per attempt, so threads, event loops and worker processes on the host all draw
+    from the same budget. Without one they are shared within the process only.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        path: str = None,
+        burst_seconds: float = 10.0,
+        reserve: float = 0.0,
+    ):
+        self.name = name
+        self.path = path
+        self.reserve = reserve
+        # (rate per second, capacity) of the request and token buckets
+        self._budgets = [
+            None if limit is None else (limit / 60.0, max(1.0, limit * burst_seconds / 60.0))
+            for limit in (rpm, tpm)
+        ]
+        self.unlimited = rpm is None and tpm is None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._levels = None
+        self._updated = 0.0
+        self.calls = 0
+        self.delayed = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+        if self.path and not self.unlimited:
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS buckets "
+                    "(name TEXT PRIMARY KEY, requests REAL, tokens REAL, updated REAL NOT NULL)"
+                )
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _refill(self, levels, updated: float, now: float):
+        if levels is None:
+            return [None if budget is None else budget[1] for budget in self._budgets]
+        elapsed = max(0.0, now - updated)
+        return [
+            None if budget is None else min(budget[1], (budget[1] if level is None else level) + budget[0] * elapsed)
+            for budget, level in zip(self._budgets, levels)
+        ]
+
+    def _wait(self, levels, costs, background: bool) -> float:
+        """Seconds until the buckets hold enough for the costs, 0 if they already do."""
+        reserve = self.reserve if background else 0.0
+        wait = 0.0
+        for budget, level, cost in zip(self._budgets, levels, costs):
+            if budget is None:
+                continue
+            rate, capacity = budget
+            needed = min(cost, capacity * (1 - reserve)) + capacity * reserve
+            if level < needed:
+                wait = max(wait, (needed - level) / rate)
+        return wait
+
+    def _update(self, change):
+        """Apply change(levels) -> (levels, result) to the current levels and return the result."""
+        now = time.time()
+        if self.path:
+            try:
+                return self._update_shared(change, now)
+            except sqlite3.Error as e:
+                logger.warning("rate limit state %s unavailable, limiting this process only: %s", self.path, e)
+        with self._lock:
+            levels, result = change(self._refill(self._levels, self._updated, now))
+            self._levels, self._updated = levels, now
+            return result
+
+    def _update_shared(self, change, now: float):
+        conn = self._connection()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the file's write lock, so other processes wait for this update
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT requests, tokens, updated FROM buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                levels = self._refill(None if row is None else row[:2], 0.0 if row is None else row[2], now)
+                levels, result = change(levels)
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, requests, tokens, updated) VALUES (?, ?, ?, ?)",
+                    (self.name, levels[0], levels[1], now)
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def _try_acquire(self, tokens: int, background: bool) -> float:
+        costs = (1, tokens)
+
+        def take(levels):
+            wait = self._wait(levels, costs, background)
+            if wait > 0:
+                return levels, wait
+            return [None if level is None else level - cost for level, cost in zip(levels, costs)], 0.0
+        return self._update(take)
+
+    def _next_wait(self, waited: float, tokens: int, timeout: Optional[float], background: Optional[bool]) -> float:
+        background = _priority == "background" if background is None else background
+        wait = self._try_acquire(tokens, background)
+        if wait > 0 and timeout is not None and waited + wait > timeout:
+            with self._lock:
+                self.timeouts += 1
+            raise RateLimitTimeout(f"{self.name}: no budget for {tokens} tokens within {timeout:.1f}s")
+        if wait == 0:
+            with self._lock:
+                self.calls += 1
+                if waited > 0:
+                    self.delayed += 1
+                    self.wait_seconds += waited
+        return wait
+
+    def acquire(self, tokens: int = 0, timeout: Optional[float] = None, background: Optional[bool] = None) -> float:
+        """
+        Wait until a call of about `tokens` tokens fits in the budget and take it.
+        Returns the seconds waited; raises RateLimitTimeout instead of waiting past
+        `timeout`. `background` defaults to this process's priority (see set_priority()).
+        """
+        if self.unlimited:
+            return 0.0
+        start = time.monotonic()
+        waited = 0.0
+        while True:
+            wait = self._next_wait(waited, tokens, timeout, background)
+            if wait == 0:
+                return waited
+            time.sleep(wait)
+            waited = time.monotonic() - start
+
+    async def acquire_async(self, tokens: int = 0, timeout: Optional[float] = None, background: Optional[bool] = None) -> float:
+        """Async variant of acquire(), which waits without blocking the event loop."""
+        if self.unlimited:
+            return 0.0
+        start = time.monotonic()
+        waited = 0.0
+        while True:
+            wait = self._next_wait(waited, tokens, timeout, background)
+            if wait == 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited = time.monotonic() - start
+
+    def backoff(self, seconds: float):
+        """Empty the buckets for `seconds`, e.g. after a 429, so every caller sharing them backs off."""
+        if self.unlimited:
+            return
+
+        def drain(levels):
+            return [
+                None if level is None else min(level, -budget[0] * seconds)
+                for budget, level in zip(self._budgets, levels)
+            ], None
+        self._update(drain)
+
+    def stats(self) -> dict:
+        """Return how many calls were let through, how many waited and for how long."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "delayed": self.delayed,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "timeouts": self.timeouts,
+            }
+
+
+def get_limiter(endpoint: str, deployment: str) -> RateLimiter:
+    """
+    Return the process-wide limiter of a deployment, with its budget from
+    AZURE_OPENAI_RATE_LIMITS; unlimited when it has none.
+    """
+    name = f"{endpoint}#{deployment}"
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                budget = rate_limits.get(deployment, {})
+                limiter = RateLimiter(
+                    name,
+                    rpm=budget.get("rpm"),
+                    tpm=budget.get("tpm"),
+                    path=state_path or None,
+                    reserve=serving_reserve
+                )
+                _limiters[name] = limiter
+    return limiter
@@ -0,0 +1,342 @@
+# resilience.py
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import numpy as np
+
+from telemetry import logger
+
+# Threads that run calls with a timeout. A call that times out keeps its thread
+# until it returns, so each call should also carry its own client-side timeout.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RESILIENCE_MAX_WORKERS", "64")),
+    thread_name_prefix="resilience"
+)
+
+# Threads that run hedged attempts, kept apart from the ones above so a burst of
+# hedges can't take the threads that completions wait on
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("HEDGE_MAX_WORKERS", "32")),
+    thread_name_prefix="hedge"
+)
+
+_current = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """A request or one of its stages ran out of its time budget."""
+
+
+class Deadline:
+    """
+    The time budget of one request, split across its stages.
+
+    A stage named in `shares` may use at most that share of the whole budget, and
+    never more than what is left, so a slow stage leaves the rest to the stages
+    after it; any other stage, e.g. the completion, gets whatever is left. With
+    `seconds=None` there is no deadline and every timeout is None.
+
+    While entered, the deadline is the current one for stage_timeout(), so the
+    embedding and search calls below the request can find it.
+    """
+
+    def __init__(self, seconds: Optional[float], shares: Dict[str, float] = None):
+        self.seconds = seconds
+        self.shares = shares or {}
+        self.expires = None if seconds is None else time.monotonic() + seconds
+        self._tokens = []
+
+    def __enter__(self):
+        self._tokens.append(_current.set(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current.reset(self._tokens.pop())
+
+    def remaining(self) -> Optional[float]:
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def timeout(self, stage: str) -> Optional[float]:
+        """Seconds `stage` may take, or None without a deadline."""
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        if remaining <= 0:
+            raise DeadlineExceeded(f"request deadline of {self.seconds}s exceeded before {stage}")
+        share = self.shares.get(stage)
+        return remaining if share is None else min(remaining, self.seconds * share)
+
+
+def stage_timeout(stage: str) -> Optional[float]:
+    """The timeout of `stage` under the current deadline, or None outside of one."""
+    deadline = _current.get()
+    return None if deadline is None else deadline.timeout(stage)
+
+
+def call_with_timeout(timeout: Optional[float], fn, /, *args, **kwargs):
+    """Call fn, raising DeadlineExceeded if it hasn't returned after `timeout` seconds."""
+    if timeout is None:
+        return fn(*args, **kwargs)
+    # The copied context keeps the call in the current trace
+    future = _executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+    done, _ = wait([future], timeout=timeout)
+    if not done:
+        raise DeadlineExceeded(f"{getattr(fn, '__name__', 'call')} did not complete within {timeout:.2f}s")
+    return future.result()
+
+
+async def await_with_timeout(timeout: Optional[float], awaitable, what: str = "call"):
+    """Await, raising DeadlineExceeded if it hasn't completed after `timeout` seconds."""
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"{what} did not complete within {timeout:.2f}s") from None
+
+
+class Hedger:
+    """
+    Hedged calls to an idempotent dependency.
+
+    Each call starts one attempt; if it hasn't returned once the `percentile` of
+    recent attempt latencies has passed, a second, identical attempt starts and the
+    first to succeed is returned. The threshold adapts to the dependency, so only
+    the slowest few percent of calls are hedged, and nothing is hedged until
+    `min_samples` latencies have been seen. Both attempts together are bounded by
+    the call's timeout.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float = 95,
+        min_samples: int = 20,
+        window: int = 256,
+        enabled: bool = True
+    ):
+        self.name = name
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+
+    def threshold(self) -> Optional[float]:
+        """Seconds after which a call is hedged, or None while there are too few samples."""
+        with self._lock:
+            if not self.enabled or len(self._latencies) < self.min_samples:
+                return None
+            latencies = list(self._latencies)
+        return float(np.percentile(latencies, self.percentile))
+
+    def _observe(self, start: float):
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+
+    def _attempt(self, fn, args, kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self._observe(start)
+        return result
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _hedge_delay(self, timeout: Optional[float]) -> Optional[float]:
+        self._count("calls")
+        delay = self.threshold()
+        if delay is None or (timeout is not None and delay >= timeout):
+            return None
+        return delay
+
+    def _timed_out(self, timeout):
+        self._count("timeouts")
+        return DeadlineExceeded(f"{self.name} did not complete within {timeout:.2f}s")
+
+    def call(self, timeout: Optional[float], fn, /, *args, **kwargs):
+        """Call fn(*args, **kwargs), hedged, within `timeout` seconds (None for no limit)."""
+        end = None if timeout is None else time.monotonic() + timeout
+        delay = self._hedge_delay(timeout)
+        if delay is None and timeout is None:
+            # Nothing to hedge or time out: call on this thread, leaving the pool to calls that need it
+            return self._attempt(fn, args, kwargs)
+        context = contextvars.copy_context()
+
+        def submit():
+            return _hedge_executor.submit(context.copy().run, self._attempt, fn, args, kwargs)
+
+        attempts = [submit()]
+        if delay is not None and not wait(attempts, timeout=delay).done:
+            attempts.append(submit())
+            self._count("hedges")
+
+        pending = set(attempts)
+        error = None
+        while pending:
+            left = None if end is None else end - time.monotonic()
+            if left is not None and left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    if attempt is not attempts[0]:
+                        self._count("hedge_wins")
+                    return attempt.result()
+                error = attempt.exception()
+        if not pending and error is not None:
+            raise error
+        raise self._timed_out(timeout)
+
+    async def call_async(self, timeout: Optional[float], fn, /, *args, **kwargs):
+        """Async variant of call(), for a coroutine function fn; the losing attempt is cancelled."""
+        end = None if timeout is None else time.monotonic() + timeout
+
+        async def attempt():
+            start = time.perf_counter()
+            result = await fn(*args, **kwargs)
+            self._observe(start)
+            return result
+
+        attempts = [asyncio.ensure_future(attempt())]
+        try:
+            delay = self._hedge_delay(timeout)
+            if delay is not None and not (await asyncio.wait(attempts, timeout=delay))[0]:
+                attempts.append(asyncio.ensure_future(attempt()))
+                self._count("hedges")
+
+            pending = set(attempts)
+            error = None
+            while pending:
+                left = None if end is None else end - time.monotonic()
+                if left is not None and left <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not attempts[0]:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            if not pending and error is not None:
+                raise error
+            raise self._timed_out(timeout)
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        """Return call, hedge and timeout counters along with the current threshold."""
+        threshold = self.threshold()
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "timeouts": self.timeouts,
+                "threshold_ms": None if threshold is None else round(threshold * 1000, 1),
+            }
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker for one dependency.
+
+    After `failure_threshold` consecutive failures the circuit opens and allow()
+    turns calls away for `reset_timeout` seconds, so callers fall back at once
+    instead of waiting on a dependency that is down or throttling. Then one trial
+    call is let through (half-open): its success closes the circuit, its failure
+    opens it again. Calls slower than `slow_call_seconds` count as failures.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        slow_call_seconds: Optional[float] = None
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_started = None
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Whether a call may go to the dependency now."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            # A trial that never reported back, e.g. a cancelled call, is given up on
+            now = time.monotonic()
+            if state == "half_open" and (self._trial_started is None or now - self._trial_started > self.reset_timeout):
+                self._trial_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, seconds: float = 0.0):
+        if self.slow_call_seconds is not None and seconds > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            self._failures = 0
+            self._trial_started = None
+            if self._opened_at is not None:
+                self._opened_at = None
+                logger.warning("circuit %s closed", self.name)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            was_trial = self._trial_started is not None
+            self._trial_started = None
+            if was_trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                if self._opened_at is None:
+                    self.opened += 1
+                    logger.warning("circuit %s opened after %s failures", self.name, self._failures)
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        """Return the state with open and rejection counters."""
+        with self._lock:
+            return {
+                "state": self._state(),
+                "failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,65 @@
+# retrieval.py
+
+from typing import List, Optional, Tuple
+
+
+class RetrievalBackend:
+    """
+    Interface of the document stores behind retrieve_documentation.
+
+    A backend returns up to `top` documents as dicts with id, title, content and url.
+    With both a question and an embedding it runs a hybrid query; either one may be
+    None to run a vector-only or keyword-only query. semantic=False skips semantic
+    ranking of keyword results, for backends that have it. A backend that calls a
+    service bounds the call by `timeout` seconds, when given.
+    """
+
+    def retrieve(self, question: str, embedding: List[float], top: int = 3, semantic: bool = True, timeout: Optional[float] = None) -> List[dict]:
+        raise NotImplementedError
+
+    async def retrieve_async(self, question: str, embedding: List[float], top: int = 3, semantic: bool = True, timeout: Optional[float] = None) -> List[dict]:
+        return self.retrieve(question, embedding, top, semantic, timeout)
+
+
+def retrieval_mode(question: str, embedding: List[float]) -> str:
+    """Name the query mode: "hybrid", "vector" or "keyword"."""
+    if question is not None and embedding is not None:
+        return "hybrid"
+    return "vector" if embedding is not None else "keyword"
+
+
+def is_degraded(mode: str) -> bool:
+    """Whether a served mode, as recorded by telemetry.record_retrieval_mode, gave up ranking quality."""
+    return any(part not in ("hybrid", "keyword", "vector") for part in mode.split("+"))
+
+
+def degraded_modes(question: str, embedding: List[float]) -> List[Tuple[str, str, Optional[str], Optional[List[float]], bool]]:
+    """
+    The queries to try for a question and embedding, best first, as tuples of
+    (mode, dependency, question, embedding, semantic). Each later one gives up some
+    ranking quality to avoid the dependency that failed before it: semantic ranking,
+    then the vector query, then the keyword query.
+    """
+    modes = []
+    if question is not None and embedding is not None:
+        modes.append(("hybrid", "semantic", question, embedding, True))
+    elif question is not None:
+        modes.append(("keyword", "semantic", question, None, True))
+    # A vector query standing in for a hybrid one is named apart from a vector-only query
+    if embedding is not None:
+        modes.append(("vector" if question is None else "vector_fallback", "vector", None, embedding, False))
+    if question is not None:
+        modes.append(("keyword_unranked", "keyword", question, None, False))
+    return modes
+
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], top: int = 3, k: int = 60) -> List[dict]:
+    """Fuse ranked document lists by reciprocal rank, keeping the first copy of each id."""
+    scores = {}
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            scores[doc["id"]] = scores.get(doc["id"], 0.0) + 1.0 / (k + rank + 1)
+            docs.setdefault(doc["id"], doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[doc_id] for doc_id in ranked[:top]]
@@ -0,0 +1,97 @@
+# retrieval_cache.py
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+
+class RetrievalCache:
+    """
+    An exact-match cache of retrieval results.
+
+    Entries are keyed on the question, a hash of the embedding, the number of
+    documents, the retrieval mode and the index name (see key()). They expire after
+    `ttl` seconds, though get_stale() still returns them, and the least recently used
+    entry is dropped once `max_entries` is reached. As in AnswerCache, every call
+    carries the index version and a new version drops the whole cache, so results
+    never outlive a reindex.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(question: str, embedding: List[float], top: int, mode: str, index_name: str) -> str:
+        digest = hashlib.sha256()
+        for part in [index_name, mode, str(top), question or ""]:
+            digest.update(part.encode("utf-8") + b"\x1f")
+        if embedding is not None:
+            digest.update(np.asarray(embedding, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    def _check_version(self, version: str):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key: str, version: str) -> Optional[List[dict]]:
+        """Return a copy of the cached documents for `key`, or None."""
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            # Expired entries stay until evicted, for get_stale()
+            self.misses += 1
+            return None
+
+    def get_stale(self, key: str, version: str) -> Optional[List[dict]]:
+        """Like get(), but ignoring the ttl, for when the search service can't be reached."""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            return None if entry is None else copy.deepcopy(entry[1])
+
+    def put(self, key: str, docs: List[dict], version: str):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.time(), copy.deepcopy(docs))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Return hit, miss, eviction and invalidation counters."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+            }
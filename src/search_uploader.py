@@ -0,0 +1,135 @@
+# search_uploader.py
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+
+# Azure AI Search accepts at most 1000 documents and 16 MB per indexing request
+MAX_BATCH_DOCUMENTS = 1000
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+
+# Batch-level errors worth another attempt: throttling and transient service failures
+RETRIABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, (ServiceRequestError, ServiceResponseError)):
+        return True
+    return isinstance(error, HttpResponseError) and error.status_code in RETRIABLE_STATUS_CODES
+
+
+class SearchUploader:
+    """
+    Uploads documents to a search index in size-capped batches, several at a time.
+
+    Documents are added one by one; a batch is sent once it reaches `max_batch_documents`
+    or `max_batch_bytes` of JSON. At most `max_workers` batches are in flight, and add()
+    blocks while they are, so memory stays bounded however many documents are added.
+    Per-document results are checked and failed keys are collected in `failed`. A
+    batch that fails as a whole is retried with backoff up to `max_attempts` times if
+    the error is transient; after that, or on any other error, every key in it is
+    collected in `failed`.
+
+    Usage:
+        with SearchUploader(search_client) as uploader:
+            for doc in docs:
+                uploader.add(doc)
+        print(uploader.succeeded, uploader.failed)
+    """
+
+    def __init__(
+        self,
+        search_client,
+        action: str = "merge_or_upload",
+        max_batch_documents: int = 500,
+        max_batch_bytes: int = 8 * 1024 * 1024,
+        max_workers: int = 4,
+        max_attempts: int = 5,
+        key_field: str = "id",
+    ):
+        self.search_client = search_client
+        self.action = action
+        self.max_batch_documents = min(max_batch_documents, MAX_BATCH_DOCUMENTS)
+        self.max_batch_bytes = min(max_batch_bytes, MAX_BATCH_BYTES)
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.key_field = key_field
+        self.succeeded = 0
+        self.failed = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = set()
+        self._batch = []
+        self._batch_bytes = 0
+
+    def add(self, document: dict):
+        size = len(json.dumps(document))
+        if self._batch and (
+            len(self._batch) >= self.max_batch_documents
+            or self._batch_bytes + size > self.max_batch_bytes
+        ):
+            self.flush()
+        self._batch.append(document)
+        self._batch_bytes += size
+
+    def flush(self):
+        """Send the current batch, waiting first if too many batches are in flight."""
+        if not self._batch:
+            return
+        while len(self._pending) >= self.max_workers:
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        self._pending.add(self._executor.submit(self._send, self._batch))
+        self._batch = []
+        self._batch_bytes = 0
+
+    def _index(self, batch):
+        for attempt in range(self.max_attempts):
+            try:
+                if self.action == "delete":
+                    return self.search_client.delete_documents(batch)
+                return self.search_client.merge_or_upload_documents(batch)
+            except Exception as e:
+                if not is_transient(e) or attempt == self.max_attempts - 1:
+                    raise
+                wait_seconds = min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+                print(f"Batch of {len(batch)} documents failed ({e}), retrying in {wait_seconds:.1f}s")
+                time.sleep(wait_seconds)
+
+    def _send(self, batch):
+        try:
+            results = self._index(batch)
+        except Exception as e:
+            keys = [str(document[self.key_field]) for document in batch]
+            with self._lock:
+                self.failed.update(keys)
+            print(f"Batch of {len(batch)} documents failed: {e}")
+            return
+        failed = [result.key for result in results if not result.succeeded]
+        with self._lock:
+            self.succeeded += len(batch) - len(failed)
+            self.failed.update(failed)
+            print(f"uploaded batch of {len(batch)} documents ({self.succeeded} succeeded so far)")
+        if failed:
+            print(f"{len(failed)} documents failed in batch: {failed}")
+
+    def close(self):
+        """Send the last batch and wait for every batch to complete."""
+        self.flush()
+        try:
+            for future in self._pending:
+                future.result()
+        finally:
+            self._pending = set()
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,138 @@
+# telemetry.py
+
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from opentelemetry import metrics, trace
+
+# Request-path logging. CHAT_LOG_LEVEL sets the level (default WARNING), and
+# CHAT_LOG_SAMPLE_RATE the share of requests whose payloads (question, documents,
+# answer) are logged at DEBUG. Handlers are left to the host or entry point.
+logger = logging.getLogger("chat_request")
+logger.setLevel(os.getenv("CHAT_LOG_LEVEL", "WARNING").upper())
+log_sample_rate = float(os.getenv("CHAT_LOG_SAMPLE_RATE", "0.01"))
+
+# Instruments are no-ops until the application configures OpenTelemetry providers,
+# e.g. with an Azure Monitor or OTLP exporter.
+_tracer = trace.get_tracer("chat_request")
+_meter = metrics.get_meter("chat_request")
+stage_duration = _meter.create_histogram(
+    "chat_request.stage.duration", unit="ms", description="Duration of each stage of a chat request"
+)
+cache_lookups = _meter.create_counter(
+    "chat_request.cache.lookups", description="Cache lookups by cache and result"
+)
+retrieved_documents = _meter.create_histogram(
+    "chat_request.retrieval.documents", description="Documents retrieved and kept per request"
+)
+retrieval_modes = _meter.create_counter(
+    "chat_request.retrieval.mode", description="Retrievals by the query mode that served them"
+)
+token_usage = _meter.create_counter(
+    "chat_request.tokens", unit="{token}", description="Tokens per request by kind"
+)
+
+_current = ContextVar("request_telemetry", default=None)
+
+
+def log_payload(message: str, *args):
+    """Log request payloads at DEBUG for a sample of requests only."""
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < log_sample_rate:
+        logger.debug(message, *args)
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup, and note it on the current request if there is one."""
+    result = "hit" if hit else "miss"
+    cache_lookups.add(1, {"cache": cache, "result": result})
+    request = _current.get()
+    if request is not None:
+        request.attributes[f"cache.{cache}"] = result
+
+
+def record_retrieval_mode(mode: str):
+    """Count the query mode a retrieval was served with, and note it on the current request."""
+    retrieval_modes.add(1, {"mode": mode})
+    request = _current.get()
+    if request is not None:
+        # Requests that fuse several retrievals report every mode used, e.g. "keyword+vector"
+        modes = request.attributes.get("retrieval_mode", "").split("+")
+        if mode not in modes:
+            request.attributes["retrieval_mode"] = "+".join(sorted(filter(None, modes + [mode])))
+
+
+def current_retrieval_mode() -> Optional[str]:
+    request = _current.get()
+    return None if request is None else request.attributes.get("retrieval_mode")
+
+
+class RequestTelemetry:
+    """
+    Stage timings and attributes of one chat request.
+
+    Each stage() is an OpenTelemetry span, nested in the promptflow trace of the
+    request, and a sample of the stage duration histogram. finish() adds the total
+    and sets every timing and attribute on the request's own span. While the request
+    is active, record_cache() calls from the stages below are attributed to it.
+
+    Usage:
+        with RequestTelemetry() as request:
+            with request.stage("embedding"):
+                ...
+            request.record(documents=3)
+            timings = request.finish()
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.timings = {}
+        self.attributes = {}
+        self._span = trace.get_current_span()
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current.reset(self._token)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        with _tracer.start_as_current_span(f"chat_request.{name}") as span:
+            try:
+                yield span
+            finally:
+                duration = (time.perf_counter() - start) * 1000
+                self.timings[f"{name}_ms"] = round(duration, 1)
+                span.set_attribute("duration_ms", duration)
+                stage_duration.record(duration, {"stage": name})
+
+    def record(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record_tokens(self, **counts):
+        for kind, count in counts.items():
+            if count is not None:
+                self.attributes[f"tokens.{kind}"] = count
+                token_usage.add(count, {"kind": kind})
+
+    def finish(self) -> dict:
+        duration = (time.perf_counter() - self.start) * 1000
+        self.timings["total_ms"] = round(duration, 1)
+        stage_duration.record(duration, {"stage": "total"})
+        if "documents" in self.attributes:
+            retrieved_documents.record(self.attributes["documents"], {"kind": "retrieved"})
+        if "documents_kept" in self.attributes:
+            retrieved_documents.record(self.attributes["documents_kept"], {"kind": "kept"})
+        self._span.set_attributes({f"chat_request.{key}": value for key, value in self.timings.items()})
+        self._span.set_attributes({f"chat_request.{key}": value for key, value in self.attributes.items()})
+        logger.info("request timings %s %s", self.timings, self.attributes)
+        return dict(self.timings, **self.attributes)
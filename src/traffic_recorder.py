@@ -0,0 +1,150 @@
+# traffic_recorder.py
+
+import glob
+import json
+import os
+import random
+import threading
+from typing import Callable, Iterable, List, Optional
+
+from telemetry import logger
+
+REDACTED = "[redacted]"
+
+
+def redact_fields(fields: Iterable[str]) -> Callable[[dict], dict]:
+    """A redact hook for TrafficRecorder that replaces the given record fields, e.g. "answer"."""
+    fields = [field for field in fields if field]
+
+    def redact(record: dict) -> dict:
+        for field in fields:
+            if field in record:
+                record[field] = REDACTED
+        return record
+    return redact
+
+
+class TrafficRecorder:
+    """
+    Records a sample of chat requests to a rotating set of JSONL files.
+
+    Each record holds the question, chat history, start time, the stage timings and
+    attributes from telemetry.RequestTelemetry, the ids of the documents used and,
+    unless streamed, the answer. Once `path` grows past `max_bytes` it is renamed to
+    `path.1`, `path.1` to `path.2` and so on, and the oldest of `max_files` is
+    dropped, so the recording is a ring buffer of the most recent traffic.
+
+    Records hold raw user text. `redact`, if given, is called with each record before
+    it is written and returns the record to write, or None to drop it; see
+    redact_fields().
+
+    Rotation is coordinated within a process only: give each worker process its own
+    file by putting `{pid}` in the path. util/replay_traffic.py replays a recording.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = 0.1,
+        max_bytes: int = 64 * 2**20,
+        max_files: int = 4,
+        redact: Optional[Callable[[dict], Optional[dict]]] = None
+    ):
+        self.path = path.format(pid=os.getpid())
+        self.redact = redact
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.skipped = 0
+        self.rotations = 0
+        self.errors = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def record(
+        self,
+        question: str,
+        chat_history,
+        started_at: float,
+        timings: dict,
+        context: List,
+        answer: Optional[str] = None
+    ):
+        """Append the request to the recording if it is sampled."""
+        if random.random() >= self.sample_rate:
+            with self._lock:
+                self.skipped += 1
+            return
+        record = {
+            "started_at": started_at,
+            "question": question,
+            "chat_history": chat_history,
+            "timings": timings,
+            "doc_ids": [doc.get("id") for doc in context if isinstance(doc, dict)],
+        }
+        if isinstance(answer, str):
+            record["answer"] = answer
+        if self.redact is not None:
+            record = self.redact(record)
+            if record is None:
+                with self._lock:
+                    self.skipped += 1
+                return
+        line = json.dumps(record, default=str) + "\n"
+
+        with self._lock:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                self.recorded += 1
+            except OSError as e:
+                # Recording must never fail the request it records
+                self.errors += 1
+                logger.warning("traffic recording failed: %s", e)
+
+    def _rotate(self):
+        for i in range(self.max_files - 1, 0, -1):
+            source = self.path if i == 1 else f"{self.path}.{i - 1}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i}")
+        if self.max_files <= 1:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def stats(self) -> dict:
+        """Return recorded, skipped, rotation and error counters."""
+        with self._lock:
+            return {
+                "recorded": self.recorded,
+                "skipped": self.skipped,
+                "rotations": self.rotations,
+                "errors": self.errors,
+            }
+
+
+def read_recording(path: str) -> List[dict]:
+    """
+    Read a recording written by TrafficRecorder, with its rotated files, in start
+    time order. `path` may be a glob, e.g. to merge the files of several workers.
+    """
+    files = []
+    for current in sorted(glob.glob(path)) or [path]:
+        files.append(current)
+        files.extend(glob.glob(f"{glob.escape(current)}.[0-9]*"))
+
+    records = []
+    for file in dict.fromkeys(files):
+        if not os.path.exists(file):
+            continue
+        with open(file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A worker may have been stopped in the middle of a write
+                    continue
+    records.sort(key=lambda record: record["started_at"])
+    return records
@@ -0,0 +1,110 @@
+from unittest.mock import MagicMock, patch
+import pytest
+import ai_search
+from ai_search import AzureSearchBackend, build_search_query, retrieve_documentation
+from resilience import CircuitBreaker
+from retrieval import RetrievalBackend, degraded_modes
+from retrieval_cache import RetrievalCache
+from telemetry import RequestTelemetry
+
+DOCS = [{"id": "7", "title": "Telehealth Services", "content": "Covered.", "url": "u7"}]
+
+
+class FlakyBackend(RetrievalBackend):
+    """Fails every query that uses one of `failing` ("semantic", "vector", "keyword")."""
+
+    def __init__(self, failing):
+        self.failing = set(failing)
+        self.calls = []
+
+    def retrieve(self, question, embedding, top=3, semantic=True, timeout=None):
+        self.calls.append((question is not None, embedding is not None, semantic))
+        used = {"semantic"} if question is not None and semantic else set()
+        used |= {"vector"} if embedding is not None else set()
+        used |= {"keyword"} if question is not None else set()
+        if used & self.failing:
+            raise ConnectionError("search unavailable")
+        return DOCS
+
+
+@pytest.fixture
+def search(monkeypatch):
+    """Fresh breakers, cache and last-known-good results for each test."""
+    breakers = {name: CircuitBreaker(name, failure_threshold=1, reset_timeout=60) for name in ["semantic", "vector", "keyword"]}
+    monkeypatch.setattr(ai_search, "retrieval_breakers", breakers)
+    monkeypatch.setattr(ai_search, "retrieval_cache", RetrievalCache())
+    monkeypatch.setattr(ai_search, "last_known_good", RetrievalCache(ttl=0))
+
+    def retrieve(backend, question="is telehealth covered?", embedding=(0.1, 0.2)):
+        with patch("ai_search.get_retrieval_backend", return_value=backend), RequestTelemetry() as request:
+            docs = retrieve_documentation(question, "rag-index", list(embedding) if embedding else None, "endpoint")
+        return docs, request.attributes["retrieval_mode"]
+    return retrieve
+
+
+def test_semantic_ranking_optional():
+    assert "query_type" in build_search_query("q", None)
+    query = build_search_query("q", [0.1], semantic=False)
+    assert "query_type" not in query and query["search_text"] == "q"
+
+
+# The search request itself is bounded by the stage timeout
+def test_search_request_timeout():
+    search_client = MagicMock()
+    search_client.search.return_value = []
+    with patch("ai_search.get_search_client", return_value=search_client):
+        AzureSearchBackend("endpoint", "rag-index").retrieve("q", None, timeout=2.0)
+        AzureSearchBackend("endpoint", "rag-index").retrieve("q", None)
+    first, second = search_client.search.call_args_list
+    assert first.kwargs["timeout"] == 2.0 and first.kwargs["read_timeout"] == 2.0
+    assert "timeout" not in second.kwargs
+
+
+def test_degraded_modes_order():
+    assert [mode[0] for mode in degraded_modes("q", [0.1])] == ["hybrid", "vector_fallback", "keyword_unranked"]
+    assert [mode[0] for mode in degraded_modes("q", None)] == ["keyword", "keyword_unranked"]
+    assert [mode[0] for mode in degraded_modes(None, [0.1])] == ["vector"]
+
+
+# A failing semantic ranker falls back to a vector-only query, then is skipped while open
+def test_falls_back_to_vector(search):
+    backend = FlakyBackend(["semantic"])
+    docs, mode = search(backend)
+    assert docs == DOCS and mode == "vector_fallback"
+    assert ai_search.retrieval_breakers["semantic"].state == "open"
+
+    backend.calls.clear()
+    _, mode = search(backend, question="another question?")
+    assert mode == "vector_fallback"
+    assert backend.calls == [(False, True, False)]
+
+
+# With every query failing, the question's stale cached results are served, if it has any
+def test_falls_back_to_cached_results(search):
+    docs, mode = search(FlakyBackend([]))
+    assert mode == "hybrid"
+
+    ai_search.retrieval_cache.ttl = 0
+    docs, mode = search(FlakyBackend(["vector", "keyword"]))
+    assert docs == DOCS and mode == "stale_cache"
+
+    with pytest.raises(RuntimeError):
+        search(FlakyBackend([]), question="a new question?")
+
+
+# Without the opt-in retrieval cache, a query's last good results are served
+def test_falls_back_to_last_known_good(search, monkeypatch):
+    monkeypatch.setattr(ai_search, "retrieval_cache", None)
+    docs, mode = search(FlakyBackend([]))
+    assert mode == "hybrid"
+
+    docs, mode = search(FlakyBackend(["vector", "keyword"]))
+    assert docs == DOCS and mode == "last_known_good"
+
+    with pytest.raises(RuntimeError):
+        search(FlakyBackend([]), question="a new question?")
+
+
+def test_no_fallback_raises(search):
+    with pytest.raises(ConnectionError):
+        search(FlakyBackend(["vector", "keyword"]))
@@ -0,0 +1,48 @@
+import time
+from unittest.mock import patch
+from answer_cache import AnswerCache
+
+RESPONSE = {"answer": "Yes, telehealth is covered.", "context": [{"id": "7"}]}
+
+
+# Questions whose embeddings are close enough share a cached answer
+def test_lookup_hits_above_threshold():
+    cache = AnswerCache(threshold=0.95)
+    cache.store([1.0, 0.0, 0.0], RESPONSE, "v1")
+
+    assert cache.lookup([0.99, 0.05, 0.0], "v1") == RESPONSE
+    assert cache.lookup([0.0, 1.0, 0.0], "v1") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+# A new version drops every cached answer
+def test_version_change_invalidates():
+    cache = AnswerCache()
+    cache.store([1.0, 0.0], RESPONSE, "v1")
+
+    assert cache.lookup([1.0, 0.0], "v2") is None
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+# Expired entries are never returned
+def test_expired_entries_miss():
+    cache = AnswerCache(ttl=10)
+    cache.store([1.0, 0.0], RESPONSE, "v1")
+
+    with patch('answer_cache.time.time', return_value=time.time() + 60):
+        assert cache.lookup([1.0, 0.0], "v1") is None
+
+
+# A full cache replaces its least recently used entry
+def test_full_cache_evicts_least_recently_used():
+    cache = AnswerCache(max_entries=2)
+    cache.store([1.0, 0.0, 0.0], {"answer": "a"}, "v1")
+    cache.store([0.0, 1.0, 0.0], {"answer": "b"}, "v1")
+    cache.lookup([1.0, 0.0, 0.0], "v1")
+    cache.store([0.0, 0.0, 1.0], {"answer": "c"}, "v1")
+
+    assert cache.lookup([0.0, 1.0, 0.0], "v1") is None
+    assert cache.lookup([1.0, 0.0, 0.0], "v1") == {"answer": "a"}
+    assert cache.stats()["evictions"] == 1
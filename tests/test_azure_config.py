@@ -0,0 +1,91 @@
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+from azure_config import AzureConfig
+
+SCOPE = ["sub-id", "rg-name", "project-name"]
+
+
+@pytest.fixture
+def snapshot_env(monkeypatch, tmp_path):
+    snapshot_path = tmp_path / "azure-config.json"
+    monkeypatch.setenv("AZURE_SUBSCRIPTION_ID", SCOPE[0])
+    monkeypatch.setenv("AZURE_RESOURCE_GROUP", SCOPE[1])
+    monkeypatch.setenv("AZUREAI_PROJECT_NAME", SCOPE[2])
+    monkeypatch.setenv("AZURE_CONFIG_SNAPSHOT", str(snapshot_path))
+    monkeypatch.setenv("AZURE_CONFIG_SNAPSHOT_TTL", "60")
+    return snapshot_path
+
+
+def write_snapshot(path, resolved_at, scope=SCOPE):
+    snapshot = {
+        "location": "eastus2",
+        "aoai_endpoint": "https://aoai-account.openai.azure.com/",
+        "aoai_api_version": "2024-02-01",
+        "search_endpoint": "https://search-account.search.windows.net",
+        "aoai_account_name": "aoai-account",
+        "search_account_name": "search-account",
+        "scope": scope,
+        "resolved_at": resolved_at,
+    }
+    if resolved_at is None:
+        del snapshot["resolved_at"]
+    path.write_text(json.dumps(snapshot))
+
+
+# A fresh snapshot is used as-is, without any ARM call
+@patch.object(AzureConfig, 'resolve')
+def test_fresh_snapshot_skips_arm(mock_resolve, snapshot_env):
+    write_snapshot(snapshot_env, time.time())
+
+    config = AzureConfig()
+
+    mock_resolve.assert_not_called()
+    assert config.aoai_endpoint == "https://aoai-account.openai.azure.com/"
+    assert config.search_account_name == "search-account"
+    assert config._refresh_thread is None
+
+
+# A stale snapshot is still served, and refreshed in the background
+@patch.object(AzureConfig, 'resolve')
+def test_stale_snapshot_refreshes_in_background(mock_resolve, snapshot_env):
+    write_snapshot(snapshot_env, time.time() - 120)
+
+    config = AzureConfig()
+    config._refresh_thread.join(timeout=5)
+
+    assert config.location == "eastus2"
+    mock_resolve.assert_called_once()
+    assert json.loads(snapshot_env.read_text())["resolved_at"] > time.time() - 5
+
+
+# A hand-written snapshot without resolved_at counts as stale
+@patch.object(AzureConfig, 'resolve')
+def test_snapshot_without_resolved_at_refreshes(mock_resolve, snapshot_env):
+    write_snapshot(snapshot_env, None)
+
+    config = AzureConfig()
+    config._refresh_thread.join(timeout=5)
+
+    assert config.aoai_endpoint == "https://aoai-account.openai.azure.com/"
+    mock_resolve.assert_called_once()
+
+
+# A snapshot for another project is ignored and the config is resolved again
+def test_snapshot_scope_mismatch_resolves(snapshot_env):
+    write_snapshot(snapshot_env, time.time(), scope=["other-sub", "rg-name", "project-name"])
+
+    def fake_resolve(self):
+        for field in AzureConfig.SNAPSHOT_FIELDS:
+            setattr(self, field, f"resolved-{field}")
+        self._aoai_api_key = "secret"
+
+    with patch.object(AzureConfig, 'resolve', fake_resolve):
+        config = AzureConfig()
+
+    assert config.aoai_endpoint == "resolved-aoai_endpoint"
+    snapshot = json.loads(snapshot_env.read_text())
+    assert snapshot["scope"] == SCOPE
+    assert "secret" not in snapshot_env.read_text()
@@ -0,0 +1,55 @@
+from unittest.mock import patch, MagicMock
+import httpx
+from openai import RateLimitError
+from batch_embeddings import embed_texts, make_batches
+
+
+def fake_embeddings_response(inputs):
+    # Return the items out of order, as the service is allowed to
+    data = [MagicMock(index=i, embedding=[float(len(text))]) for i, text in enumerate(inputs)]
+    return MagicMock(data=list(reversed(data)))
+
+
+def rate_limit_error(retry_after):
+    request = httpx.Request("POST", "https://aoai.openai.azure.com/embeddings")
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+    return RateLimitError("Too Many Requests", response=response, body=None)
+
+
+# Batches are bounded by input count and by total tokens
+@patch('batch_embeddings.count_tokens', side_effect=lambda text: len(text))
+def test_make_batches_respects_limits(mock_count_tokens):
+    texts = ["a" * 10, "b" * 10, "c" * 10, "d" * 50, "e" * 10]
+    assert make_batches(texts, batch_size=2, max_batch_tokens=100) == [[0, 1], [2, 3], [4]]
+    assert make_batches(texts, batch_size=10, max_batch_tokens=40) == [[0, 1, 2], [3], [4]]
+
+
+# Embeddings come back in input order whatever order batches complete in
+def test_embed_texts_preserves_order():
+    client = MagicMock()
+    client.with_options.return_value = client
+    client.embeddings.create.side_effect = lambda input, model: fake_embeddings_response(input)
+    texts = ["x" * n for n in range(1, 12)]
+
+    embeddings = embed_texts(client, texts, model="ada", batch_size=3, max_workers=3)
+
+    assert embeddings == [[float(n)] for n in range(1, 12)]
+    assert client.embeddings.create.call_count == 4
+
+
+# A 429 is retried after the service's retry-after hint
+@patch('batch_embeddings.time.sleep')
+def test_embed_texts_retries_throttled_batches(mock_sleep):
+    client = MagicMock()
+    client.with_options.return_value = client
+    client.embeddings.create.side_effect = [
+        rate_limit_error("2"),
+        fake_embeddings_response(["ab", "c"]),
+    ]
+
+    embeddings = embed_texts(client, ["ab", "c"], model="ada")
+
+    assert embeddings == [[2.0], [1.0]]
+    mock_sleep.assert_called_once_with(2.0)
+    # The client doesn't retry on its own as well
+    client.with_options.assert_called_with(max_retries=0)
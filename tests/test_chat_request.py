@@ -1,13 +1,25 @@
-from unittest.mock import patch, MagicMock
+import asyncio
+import time
+from unittest.mock import patch, AsyncMock, MagicMock
 import pytest
-from chat_request import get_response
+from answer_cache import AnswerCache
+from chat_request import get_embedding, get_response, get_response_async, prompty_cache, stream_response
+from deployment_router import DeploymentRouter, PoolMember
+from resilience import CircuitBreaker, Hedger
+
+# Start every test with an empty prompty cache so Prompty.load is observed
+@pytest.fixture(autouse=True)
+def clear_prompty_cache():
+    prompty_cache.clear()
+    yield
+    prompty_cache.clear()
 
 # Mock the get_embedding function
 @patch('chat_request.get_embedding')
 # Mock the get_context function
 @patch('chat_request.get_context')
 # Mock the Prompty class and its load method
-@patch('chat_request.Prompty.load')
+@patch('prompty_cache.Prompty.load')
 def test_get_response_valid_question(mock_prompty_load, mock_get_context, mock_get_embedding):
     # Set up the return values for the mocks
     mock_get_embedding.return_value = [0.1, 0.2, 0.3]
@@ -35,7 +47,7 @@ def test_get_response_valid_question(mock_prompty_load, mock_get_context, mock_g
 # Mock the get_context function
 @patch('chat_request.get_context')
 # Mock the Prompty class and its load method
-@patch('chat_request.Prompty.load')
+@patch('prompty_cache.Prompty.load')
 def test_get_response_empty_question(mock_prompty_load, mock_get_context, mock_get_embedding):
     # Set up the return values for the mocks
     mock_get_embedding.return_value = [0.1, 0.2, 0.3]
@@ -57,3 +69,147 @@ def test_get_response_empty_question(mock_prompty_load, mock_get_context, mock_g
     mock_get_embedding.assert_called_once_with("")
     mock_get_context.assert_called_once_with("", [0.1, 0.2, 0.3])
     mock_prompty_load.assert_called_once()
+
+# Mock the get_embedding function
+@patch('chat_request.get_embedding')
+# Mock the get_context function
+@patch('chat_request.get_context')
+# Mock the Prompty class and its load method
+@patch('prompty_cache.Prompty.load')
+def test_get_response_answer_cache(mock_prompty_load, mock_get_context, mock_get_embedding):
+    mock_get_embedding.return_value = [0.1, 0.2, 0.3]
+    mock_get_context.return_value = ["context1"]
+    mock_prompty_instance = MagicMock()
+    mock_prompty_instance.return_value = "Telehealth services are covered."
+    mock_prompty_load.return_value = mock_prompty_instance
+
+    with patch('chat_request.answer_cache', AnswerCache()):
+        first = get_response("Is telehealth covered?", [])
+        second = get_response("Is telehealth covered?", "[]")
+        # Questions with chat history always go to the model
+        get_response("Is telehealth covered?", [{"role": "user", "content": "Hi"}])
+
+    assert first == second == {
+        "answer": "Telehealth services are covered.",
+        "context": ["context1"]
+    }
+    assert mock_get_context.call_count == 2
+    assert mock_prompty_instance.call_count == 2
+
+# Mock the get_embedding function
+@patch('chat_request.get_embedding')
+# Mock the Prompty class and its load method
+@patch('prompty_cache.Prompty.load')
+def test_degraded_answer_not_cached(mock_prompty_load, mock_get_embedding):
+    mock_get_embedding.return_value = [0.1, 0.2, 0.3]
+    mock_prompty_instance = MagicMock()
+    mock_prompty_instance.return_value = "Telehealth services are covered."
+    mock_prompty_load.return_value = mock_prompty_instance
+    backend = MagicMock()
+    backend.retrieve.return_value = [{"id": "1", "title": "t", "content": "c", "url": "u"}]
+
+    # While the semantic ranker's circuit is open the question is answered from a vector query
+    breakers = {name: CircuitBreaker(name, failure_threshold=1) for name in ["semantic", "vector", "keyword"]}
+    breakers["semantic"].record_failure()
+    cache = AnswerCache()
+    with patch('chat_request.answer_cache', cache), \
+            patch('ai_search.retrieval_breakers', breakers), \
+            patch('ai_search.get_retrieval_backend', return_value=backend):
+        first = get_response("Is telehealth covered?", [])
+        second = get_response("Is telehealth covered?", [], include_retrieval_mode=True)
+
+    # Callers that ask for it can tell the answer came from degraded retrieval
+    assert "retrieval_mode" not in first
+    assert second["retrieval_mode"] == "vector_fallback"
+    assert backend.retrieve.call_args.args[:2] == (None, [0.1, 0.2, 0.3])
+    assert mock_prompty_instance.call_count == 2
+    assert cache.stats()["entries"] == 0
+
+# Mock the get_embedding_async function
+@patch('chat_request.get_embedding_async')
+# Mock the get_context_async function
+@patch('chat_request.get_context_async')
+# Mock the Prompty class and its load method
+@patch('prompty_cache.Prompty.load')
+def test_get_response_async_overlaps_keyword_search(mock_prompty_load, mock_get_context_async, mock_get_embedding_async):
+    mock_get_embedding_async.return_value = [0.1, 0.2, 0.3]
+    keyword_docs = [{"id": "1"}, {"id": "2"}]
+    vector_docs = [{"id": "2"}, {"id": "3"}]
+    mock_get_context_async.side_effect = lambda question, embedding: (
+        keyword_docs if embedding is None else vector_docs
+    )
+    mock_prompty_instance = AsyncMock(return_value="Answer")
+    mock_prompty_load.return_value = mock_prompty_instance
+
+    with patch('chat_request.overlap_keyword_search', True):
+        response = asyncio.run(get_response_async("What is the size of the moon?", []))
+
+    # The document found by both legs ranks first
+    assert response == {
+        "answer": "Answer",
+        "context": [{"id": "2"}, {"id": "1"}, {"id": "3"}]
+    }
+    mock_get_context_async.assert_any_call("What is the size of the moon?", None)
+    mock_get_context_async.assert_any_call(None, [0.1, 0.2, 0.3])
+    mock_prompty_instance.assert_awaited_once()
+
+# The budget is taken once before hedging, and again for the hedge that is sent
+def test_embedding_budget_per_attempt():
+    limiter = MagicMock()
+    limiter.acquire.return_value = 0.0
+    response = MagicMock(headers={})
+    response.parse.return_value = MagicMock(data=[MagicMock(embedding=[0.1, 0.2])])
+    delays = iter([0.5, 0.0])
+
+    def create(**kwargs):
+        time.sleep(next(delays))
+        return response
+    client = MagicMock()
+    client.embeddings.with_raw_response.create.side_effect = create
+    router = DeploymentRouter("embedding", [PoolMember("https://aoai/", "ada", "2024-02-01")])
+    hedger = Hedger("embedding", min_samples=1)
+    hedger._observe(time.perf_counter() - 0.01)
+
+    with patch('chat_request.get_router', return_value=router), \
+            patch('chat_request.get_limiter', return_value=limiter), \
+            patch('chat_request.get_embedding_client', return_value=client), \
+            patch('chat_request.embedding_hedger', hedger), \
+            patch('chat_request.embedding_cache') as embedding_cache:
+        embedding_cache.get.return_value = None
+        assert get_embedding("Is telehealth covered?") == [0.1, 0.2]
+
+    assert hedger.stats()["hedges"] == 1
+    assert limiter.acquire.call_count == 2
+
+def make_chunk(content=None, usage=None):
+    choices = [MagicMock(delta=MagicMock(content=content))] if content is not None else []
+    return MagicMock(choices=choices, usage=usage)
+
+# Mock the get_embedding function
+@patch('chat_request.get_embedding')
+# Mock the get_context function
+@patch('chat_request.get_context')
+# Mock the Prompty class and its load method
+@patch('prompty_cache.Prompty.load')
+def test_stream_response_events(mock_prompty_load, mock_get_context, mock_get_embedding):
+    mock_get_embedding.return_value = [0.1, 0.2, 0.3]
+    mock_get_context.return_value = ["context1"]
+    usage = MagicMock()
+    usage.model_dump.return_value = {"prompt_tokens": 50, "completion_tokens": 2, "total_tokens": 52}
+    mock_prompty_instance = MagicMock()
+    mock_prompty_instance.return_value = iter([
+        make_chunk("Yes, "), make_chunk("it is."), make_chunk(usage=usage)
+    ])
+    mock_prompty_load.return_value = mock_prompty_instance
+
+    events = list(stream_response("Is telehealth covered?", []))
+
+    assert events[0] == {"event": "context", "context": ["context1"]}
+    assert [e["content"] for e in events[1:-1]] == ["Yes, ", "it is."]
+    assert events[-1]["event"] == "done"
+    assert events[-1]["usage"]["total_tokens"] == 52
+    assert set(events[-1]["timings"]) == {"retrieval_ms", "first_token_ms", "total_ms"}
+    # The raw streamed response is requested from Prompty
+    model = mock_prompty_load.call_args.kwargs["model"]
+    assert model["response"] == "all"
+    assert model["parameters"]["stream"] is True
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from compact_embeddings import CompactEmbeddings, pack, recall_at_k, unpack
+
+rng = np.random.default_rng(0)
+VECTORS = rng.standard_normal((200, 64)).astype(np.float32)
+VECTORS /= np.linalg.norm(VECTORS, axis=1, keepdims=True)
+
+
+# Each dtype decodes close to the original and shrinks the matrix
+@pytest.mark.parametrize("dtype,ratio", [("float32", 1), ("float16", 2), ("int8", 4)])
+def test_encode_decode(dtype, ratio):
+    compact = CompactEmbeddings.encode(VECTORS, dtype)
+    assert compact.dtype == dtype
+    assert compact.nbytes <= VECTORS.nbytes / ratio + 4 * len(VECTORS)
+    assert np.allclose(compact.decode(), VECTORS, atol=0.01)
+    assert np.allclose(compact.dot(VECTORS[0]), VECTORS @ VECTORS[0], atol=0.02)
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "embeddings.int8")
+    CompactEmbeddings.encode(VECTORS, "int8").save(path)
+    loaded = CompactEmbeddings.load(path, "int8", 64)
+    assert len(loaded) == 200
+    assert np.allclose(loaded.decode([3, 5]), VECTORS[[3, 5]], atol=0.01)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_pack_unpack(dtype):
+    assert np.allclose(unpack(pack(VECTORS[0], dtype), dtype), VECTORS[0], atol=0.01)
+
+
+# Rescoring at full precision recovers the exact top-k
+def test_recall_with_rescoring():
+    compact = CompactEmbeddings.encode(VECTORS, "int8")
+    queries = VECTORS[:20] + 0.1 * rng.standard_normal((20, 64)).astype(np.float32)
+    assert recall_at_k(VECTORS, compact, queries, k=5) >= 0.8
+    assert recall_at_k(VECTORS, compact, queries, k=5, rescore_factor=4) == 1.0
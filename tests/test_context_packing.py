@@ -0,0 +1,45 @@
+from context_packing import document_tokens, pack_documents
+
+
+def make_doc(id, content, score=None):
+    return {"id": id, "title": f"Document {id}", "content": content, "url": f"u{id}", "score": score}
+
+
+LONG = " ".join(f"word{i}" for i in range(400))
+
+
+# Documents that fit the budget pass through unchanged
+def test_documents_within_budget_are_kept():
+    docs = [make_doc("1", "Telehealth visits are covered."), make_doc("2", "Records are in the portal.")]
+    packed, stats = pack_documents(docs)
+    assert packed == docs
+    assert stats["tokens_saved"] == 0
+
+
+# The document that crosses the budget is truncated, later ones are dropped
+def test_budget_truncates_then_drops():
+    docs = [make_doc("1", LONG), make_doc("2", LONG + " again"), make_doc("3", "short tail")]
+    budget = document_tokens(docs[0]) + 100
+    packed, stats = pack_documents(docs, token_budget=budget, dedup_threshold=1.1)
+
+    assert [doc["id"] for doc in packed] == ["1", "2"]
+    assert len(packed[1]["content"]) < len(docs[1]["content"])
+    assert stats["truncated"] == 1 and stats["over_budget"] == 1
+    assert stats["tokens_out"] <= budget + 5
+    assert stats["tokens_saved"] == stats["tokens_in"] - stats["tokens_out"]
+
+
+# Overlapping passages keep only the better-ranked copy
+def test_overlapping_passages_are_deduplicated():
+    docs = [make_doc("1", LONG), make_doc("2", LONG[:2000]), make_doc("3", "Something else entirely.")]
+    packed, stats = pack_documents(docs, token_budget=0)
+    assert [doc["id"] for doc in packed] == ["1", "3"]
+    assert stats["duplicates"] == 1
+
+
+# Documents scoring far below the best one are dropped
+def test_low_score_tail_is_dropped():
+    docs = [make_doc("1", "alpha", 3.1), make_doc("2", "beta", 2.5), make_doc("3", "gamma", 0.4)]
+    packed, stats = pack_documents(docs, min_score_ratio=0.5)
+    assert [doc["id"] for doc in packed] == ["1", "2"]
+    assert stats["low_score"] == 1
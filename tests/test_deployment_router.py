@@ -0,0 +1,106 @@
+import asyncio
+from unittest.mock import patch
+import httpx
+import pytest
+from openai import RateLimitError
+from deployment_router import DeploymentRouter, PoolMember, load_pool
+
+
+def rate_limit_error(retry_after="5"):
+    request = httpx.Request("POST", "https://aoai.openai.azure.com/openai/deployments/chat/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+    return RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def make_router(*tpms):
+    return DeploymentRouter("chat", [
+        PoolMember("https://aoai.openai.azure.com/", f"chat-{i}", "2024-02-01", tpm=tpm, rpm=100)
+        for i, tpm in enumerate(tpms)
+    ])
+
+
+def test_load_pool_defaults():
+    [member] = load_pool(None, "https://aoai/", "2024-02-01", "gpt-35-turbo")
+    assert (member.endpoint, member.deployment, member.tpm) == ("https://aoai/", "gpt-35-turbo", None)
+
+    members = load_pool('[{"deployment": "a", "tpm": 1000}, {"endpoint": "https://other/", "deployment": "b"}]',
+                        "https://aoai/", "2024-02-01", "gpt-35-turbo")
+    assert [(m.endpoint, m.deployment, m.tpm) for m in members] == [("https://aoai/", "a", 1000), ("https://other/", "b", None)]
+
+
+# Calls go where the most quota is left, and count against it right away
+def test_choose_by_remaining_quota():
+    router = make_router(10000, 30000)
+    assert router.choose(5000).deployment == "chat-1"
+    assert router.choose(5000).deployment == "chat-1"
+    # chat-1 has 20000 left, chat-0 10000
+    assert router.choose(15000).deployment == "chat-1"
+    # Now only chat-0 fits
+    assert router.choose(8000).deployment == "chat-0"
+
+
+# preferred() names the member choose() would pick, without counting a call against it
+def test_preferred_does_not_count():
+    router = make_router(10000, 30000)
+    member = router.preferred(25000)
+    assert member.deployment == "chat-1"
+    assert member.in_flight == 0 and router.remaining(member) == (30000, 100)
+    assert router.choose(25000) is member
+
+
+def test_quota_from_response_headers():
+    router = make_router(30000, 30000)
+    member = router.choose(1000)
+    router.release(member, {"x-ratelimit-remaining-tokens": "500", "x-ratelimit-remaining-requests": "10"})
+    assert router.remaining(member) == (500, 10)
+    assert router.choose(1000) is not member
+
+
+# A 429 routes calls away from the member and call() retries on another one
+def test_call_routes_away_from_429():
+    router = make_router(30000, 10000)
+    calls = []
+
+    def create(member):
+        calls.append(member.deployment)
+        if member.deployment == "chat-0":
+            raise rate_limit_error()
+        return "embedding", {}
+
+    with patch("deployment_router.get_limiter") as get_limiter:
+        assert router.call(100, create) == "embedding"
+    assert calls == ["chat-0", "chat-1"]
+    # The shared budget of the throttled member is drained for its retry-after time
+    get_limiter.assert_called_once_with("https://aoai.openai.azure.com/", "chat-0")
+    get_limiter.return_value.backoff.assert_called_once_with(5.0)
+    assert router.choose(100).deployment == "chat-1"
+    stats = router.stats()
+    assert stats["https://aoai.openai.azure.com/#chat-0"]["cooling_down"]
+    assert stats["https://aoai.openai.azure.com/#chat-0"]["throttled"] == 1
+
+
+def test_call_raises_when_every_member_throttled():
+    router = make_router(30000, 30000)
+
+    async def create(member):
+        raise rate_limit_error()
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(router.call_async(100, create))
+    assert all(member.in_flight == 0 for member in router.members)
+
+
+def test_track_releases_and_throttles():
+    router = make_router(30000)
+    member = router.choose(100)
+    with router.track(member) as call:
+        call["headers"] = {"x-ratelimit-remaining-tokens": "1234"}
+    assert member.in_flight == 0
+    assert router.remaining(member)[0] == 1234
+
+    member = router.choose(100)
+    with pytest.raises(RateLimitError):
+        with router.track(member):
+            raise rate_limit_error("0")
+    assert member.in_flight == 0
+    assert member.throttled == 1
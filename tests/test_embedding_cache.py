@@ -0,0 +1,60 @@
+import pytest
+from embedding_cache import EmbeddingCache
+
+
+# Keys ignore case and whitespace differences but not the deployment
+def test_key_normalizes_question():
+    key = EmbeddingCache.key("How can I access my  medical records?", "ada", "https://aoai")
+    assert key == EmbeddingCache.key("  how can i access my medical RECORDS? ", "ada", "https://aoai")
+    assert key != EmbeddingCache.key("How can I access my medical records?", "ada", "https://other")
+
+
+# The memory tier is an LRU bounded by max_entries
+def test_memory_tier_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put("a", [0.1, 0.2])
+    cache.put("b", [0.3, 0.4])
+    cache.get("a")
+    cache.put("c", [0.5, 0.6])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == pytest.approx([0.1, 0.2])
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    assert stats["hit_ratio"] == pytest.approx(2 / 3)
+
+
+# The disk tier is shared between cache instances, e.g. worker processes
+def test_disk_tier_is_shared(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    EmbeddingCache(path=path).put("a", [0.25, 0.5])
+
+    cache = EmbeddingCache(path=path)
+    assert cache.get("a") == [0.25, 0.5]
+    assert cache.stats()["disk_hits"] == 1
+    # The disk hit is promoted to the memory tier
+    assert cache.stats()["entries"] == 1
+
+
+# The disk tier drops its oldest writes past max_disk_entries
+def test_disk_tier_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(EmbeddingCache, "DISK_TRIM_INTERVAL", 1)
+    cache = EmbeddingCache(max_entries=1, path=str(tmp_path / "embeddings.sqlite"), max_disk_entries=2)
+    for key in ["a", "b", "c"]:
+        cache.put(key, [1.0])
+
+    assert cache.stats()["disk_evictions"] == 1
+    assert cache.get("a") is None
+    assert cache.get("b") == [1.0]
+
+
+# Compact dtypes round-trip through both tiers within their precision
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compact_dtype(tmp_path, dtype):
+    path = str(tmp_path / "embeddings.sqlite")
+    EmbeddingCache(path=path, dtype=dtype).put("a", [0.25, -0.5, 0.125])
+
+    assert EmbeddingCache(path=path, dtype=dtype).get("a") == pytest.approx([0.25, -0.5, 0.125], abs=0.01)
+    # Rows of another dtype are never read back
+    assert EmbeddingCache(path=path).get("a") is None
@@ -0,0 +1,82 @@
+import math
+import os
+import sys
+import threading
+import time
+import pytest
+
+pytest.importorskip("promptflow.evals")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "evaluations"))
+from eval_runner import CachedEvaluator, JudgeCache, RateLimiter
+
+
+class FakeEvaluator:
+    """Scores an answer by its length, counting calls and the most calls in flight at once."""
+
+    def __init__(self, score=None, delay=0.0):
+        self.score = score
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *, question, answer):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return {"gpt_score": float(len(answer)) if self.score is None else self.score}
+
+
+def cached(evaluator, tmp_path, name="score", model="gpt-4", max_concurrency=8):
+    cache = JudgeCache(str(tmp_path / "judge.sqlite"))
+    return CachedEvaluator(name, evaluator, cache, RateLimiter(max_concurrency), model)
+
+
+# Keys cover the evaluator name, the judge model and the inputs
+def test_judge_cache_keys(tmp_path):
+    evaluator = cached(FakeEvaluator(), tmp_path)
+    key = evaluator.key({"question": "q", "answer": "a"})
+    assert key == evaluator.key({"answer": "a", "question": "q"})
+    assert key != evaluator.key({"question": "q", "answer": "b"})
+    assert key != cached(FakeEvaluator(), tmp_path, name="other").key({"question": "q", "answer": "a"})
+    assert key != cached(FakeEvaluator(), tmp_path, model="gpt-4o").key({"question": "q", "answer": "a"})
+
+
+# A row is judged once; the cache on disk serves later runs
+def test_cached_evaluator_judges_once(tmp_path):
+    fake = FakeEvaluator()
+    assert cached(fake, tmp_path)(question="q", answer="abc") == {"gpt_score": 3.0}
+    assert cached(fake, tmp_path)(question="q", answer="abc") == {"gpt_score": 3.0}
+    assert fake.calls == 1
+
+
+# Results with NaN scores, i.e. judge outputs that couldn't be parsed, aren't cached
+def test_nan_results_not_cached(tmp_path):
+    fake = FakeEvaluator(score=math.nan)
+    evaluator = cached(fake, tmp_path)
+    evaluator(question="q", answer="abc")
+    evaluator(question="q", answer="abc")
+    assert fake.calls == 2
+    assert evaluator.cache.hits == 0
+
+
+# Concurrent rows are judged at most max_concurrency at a time
+def test_cached_evaluator_concurrency(tmp_path):
+    fake = FakeEvaluator(delay=0.05)
+    evaluator = cached(fake, tmp_path, max_concurrency=2)
+    threads = [
+        threading.Thread(target=evaluator, kwargs={"question": "q", "answer": "a" * i})
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake.calls == 8
+    assert fake.max_in_flight == 2
@@ -0,0 +1,59 @@
+import asyncio
+import numpy as np
+import pytest
+from local_search import LocalSearchBackend, build_local_index
+
+DOCUMENTS = [
+    {"id": "1", "title": "Appointment Scheduling", "content": "Reschedule or cancel appointments online.", "url": "u1"},
+    {"id": "2", "title": "Telehealth Services", "content": "Telehealth visits are covered by most insurance plans.", "url": "u2"},
+    {"id": "3", "title": "Medical Records", "content": "Access your medical records in the patient portal.", "url": "u3"},
+]
+EMBEDDINGS = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    build_local_index(DOCUMENTS, EMBEDDINGS, str(tmp_path))
+    return LocalSearchBackend(str(tmp_path))
+
+
+# Keyword-only queries are ranked by BM25
+def test_keyword_search(backend):
+    docs = backend.retrieve("is telehealth covered by insurance?", None)
+    assert [doc["id"] for doc in docs] == ["2"]
+    assert docs[0] == DOCUMENTS[1]
+
+
+# Vector-only queries are ranked by cosine similarity
+def test_vector_search(backend):
+    docs = backend.retrieve(None, [0.1, 0.2, 2.0], top=2)
+    assert [doc["id"] for doc in docs] == ["3", "2"]
+
+
+# The caller's embedding arrays are not normalized in place
+def test_vector_search_leaves_query_unchanged(backend):
+    query = np.asarray([0.1, 0.2, 2.0], dtype=np.float32)
+    backend.vector_search(query, top=1)
+    assert query.tolist() == pytest.approx([0.1, 0.2, 2.0])
+
+
+# Hybrid queries fuse both rankings
+def test_hybrid_search(backend):
+    docs = backend.retrieve("medical records portal", [0.0, 0.0, 1.0])
+    assert docs[0]["id"] == "3"
+    assert len(docs) == 3
+
+
+def test_retrieve_async(backend):
+    docs = asyncio.run(backend.retrieve_async("reschedule appointments", [1.0, 0.0, 0.0], top=1))
+    assert [doc["id"] for doc in docs] == ["1"]
+
+
+# A quantized index scans the compact copy and rescores at full precision
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_vector_search(tmp_path, quantization):
+    build_local_index(DOCUMENTS, EMBEDDINGS, str(tmp_path), quantization=quantization)
+    backend = LocalSearchBackend(str(tmp_path))
+    assert backend.compact.dtype == quantization
+    docs = backend.retrieve(None, [0.1, 0.2, 2.0], top=2)
+    assert [doc["id"] for doc in docs] == ["3", "2"]
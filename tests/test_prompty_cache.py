@@ -0,0 +1,54 @@
+import os
+from unittest.mock import patch, MagicMock
+import pytest
+from prompty_cache import PromptyCache
+
+
+@pytest.fixture
+def prompty_file(tmp_path):
+    path = tmp_path / "chat.prompty"
+    path.write_text("---\nname: test\n---\nsystem:\n{{question}}\n")
+    return path
+
+
+# Repeated loads of an unchanged file are served from the cache
+@patch('prompty_cache.Prompty.load')
+def test_load_is_cached(mock_prompty_load, prompty_file):
+    mock_prompty_load.return_value = MagicMock()
+    cache = PromptyCache()
+    model = {"parameters": {"max_tokens": 512}}
+
+    first = cache.load(str(prompty_file), model=model)
+    second = cache.load(str(prompty_file), model=model)
+
+    assert first is second
+    mock_prompty_load.assert_called_once()
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+# A different model override is a different cache entry
+@patch('prompty_cache.Prompty.load')
+def test_model_override_is_part_of_key(mock_prompty_load, prompty_file):
+    mock_prompty_load.side_effect = lambda *args, **kwargs: MagicMock()
+    cache = PromptyCache()
+
+    cache.load(str(prompty_file), model={"parameters": {"max_tokens": 512}})
+    cache.load(str(prompty_file), model={"parameters": {"max_tokens": 128}})
+
+    assert mock_prompty_load.call_count == 2
+    assert cache.stats()["entries"] == 2
+
+
+# Touching the prompty file reloads it
+@patch('prompty_cache.Prompty.load')
+def test_changed_file_is_reloaded(mock_prompty_load, prompty_file):
+    mock_prompty_load.side_effect = lambda *args, **kwargs: MagicMock()
+    cache = PromptyCache()
+
+    first = cache.load(str(prompty_file))
+    stat = os.stat(prompty_file)
+    os.utime(prompty_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    second = cache.load(str(prompty_file))
+
+    assert first is not second
+    assert cache.stats() == {"hits": 0, "misses": 2, "entries": 1}
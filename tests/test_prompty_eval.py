@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, patch
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "evaluations"))
+import prompty_eval
+
+EVAL_PROMPTY = os.path.join(os.path.dirname(__file__), "..", "evaluations", "prompty-answer-score-eval.prompty")
+
+
+# Each call waits for the budget of the deployment named in the prompty's front matter
+def test_within_budget():
+    prompty = MagicMock(return_value='{"score": 5}')
+    limiter = MagicMock()
+    with patch("prompty_eval.get_limiter", return_value=limiter) as get_limiter:
+        call = prompty_eval.within_budget(prompty, EVAL_PROMPTY, "https://aoai/")
+        assert call(question="q", answer="a", ground_truth="g") == '{"score": 5}'
+
+    get_limiter.assert_called_once_with("https://aoai/", "gpt-4")
+    [tokens] = limiter.acquire.call_args.args
+    # The template and the answer's max_tokens of 200 are counted
+    assert tokens > 200
+    prompty.assert_called_once_with(question="q", answer="a", ground_truth="g")
+
+
+def test_read_prompty_resolves_env(monkeypatch):
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://aoai/")
+    _, configuration, parameters = prompty_eval.read_prompty(EVAL_PROMPTY)
+    assert configuration["azure_endpoint"] == "https://aoai/"
+    assert parameters["max_tokens"] == 200
+
+
+# Answers are scored as they are produced, each score matched to its own line
+def test_main_pipelined_scores_as_answers_arrive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # main_pipelined sets these, so they are restored after the test
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://aoai/")
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "key")
+    os.makedirs("evaluations")
+    with open("evaluations/test-dataset.jsonl", "w") as f:
+        for i in range(4):
+            f.write(json.dumps({"question": f"q{i}", "documents": [], "ground_truth": f"g{i}"}) + "\n")
+
+    events = []
+    lock = threading.Lock()
+
+    def chat(question, documents):
+        time.sleep(0.05)
+        with lock:
+            events.append(("answered", question))
+        return f"answer to {question}"
+
+    def score(question, answer, ground_truth):
+        with lock:
+            events.append(("scored", question))
+        return json.dumps({"score": int(question[1:]), "answer": answer})
+
+    prompties = {"./src/chat.prompty": chat, "./evaluations/prompty-answer-score-eval.prompty": score}
+    azure_config = MagicMock(aoai_endpoint="https://aoai/", aoai_api_key="key")
+    with patch("prompty_eval.AzureConfig", return_value=azure_config), \
+            patch("prompty_eval.Prompty.load", side_effect=lambda source: prompties[source]), \
+            patch("prompty_eval.within_budget", side_effect=lambda prompty, path, endpoint: prompty), \
+            patch.object(pd.DataFrame, "to_excel"):
+        prompty_eval.main_pipelined(answer_concurrency=1, score_concurrency=1, output="scores.jsonl")
+
+    # The first answer is scored before the last question is answered
+    assert events.index(("scored", "q0")) < events.index(("answered", "q3"))
+    records = sorted(pd.read_json("scores.jsonl", lines=True).to_dict("records"), key=lambda r: r["line_number"])
+    assert [record["outputs.score"] for record in records] == [0, 1, 2, 3]
+    assert all(record["outputs.answer"] == f"answer to {record['inputs.question']}" for record in records)
@@ -0,0 +1,83 @@
+import asyncio
+import time
+import pytest
+from rate_limiter import RateLimiter, RateLimitTimeout, estimate_tokens, get_limiter
+
+
+# 600 rpm with a one-second burst: 10 requests at once, then one every 0.1s
+def test_requests_budget():
+    limiter = RateLimiter("chat", rpm=600, burst_seconds=1)
+    for _ in range(10):
+        assert limiter.acquire() == 0.0
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(timeout=0.01)
+    assert limiter.acquire(timeout=1.0) > 0.0
+
+    stats = limiter.stats()
+    assert (stats["calls"], stats["delayed"], stats["timeouts"]) == (11, 1, 1)
+
+
+def test_tokens_budget():
+    # 1000 tokens at once, refilled at 100 tokens/s
+    limiter = RateLimiter("chat", tpm=6000, burst_seconds=10)
+    limiter.acquire(800)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(800, timeout=1.0)
+    # A call larger than the bucket waits for a full bucket, not forever
+    limiter = RateLimiter("chat", tpm=6000, burst_seconds=1)
+    limiter.acquire(5000, timeout=0)
+
+
+# Limiters on the same SQLite file draw from one budget, as worker processes do
+def test_budget_shared_through_path(tmp_path):
+    path = str(tmp_path / "rate-limits.sqlite")
+    first = RateLimiter("chat", rpm=300, burst_seconds=1, path=path)
+    second = RateLimiter("chat", rpm=300, burst_seconds=1, path=path)
+    for limiter in [first, second, first, second, first]:
+        limiter.acquire(timeout=0)
+    with pytest.raises(RateLimitTimeout):
+        second.acquire(timeout=0)
+    # Other deployments have their own buckets
+    RateLimiter("embedding", rpm=300, burst_seconds=1, path=path).acquire(timeout=0)
+
+
+# Background callers leave the reserve to serving
+def test_background_reserve():
+    limiter = RateLimiter("chat", rpm=600, burst_seconds=1, reserve=0.5)
+    for _ in range(5):
+        limiter.acquire(background=True, timeout=0)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(background=True, timeout=0)
+    for _ in range(5):
+        limiter.acquire(timeout=0)
+
+
+def test_backoff_drains_budget():
+    limiter = RateLimiter("chat", rpm=600, burst_seconds=1)
+    limiter.backoff(1.0)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(timeout=0.5)
+
+
+def test_acquire_async():
+    limiter = RateLimiter("chat", rpm=600, burst_seconds=1)
+
+    async def calls():
+        return await asyncio.gather(*[limiter.acquire_async() for _ in range(12)])
+
+    start = time.monotonic()
+    waits = asyncio.run(calls())
+    assert waits.count(0.0) == 10
+    assert time.monotonic() - start >= 0.15
+
+
+def test_unconfigured_deployment_is_unlimited():
+    limiter = get_limiter("https://aoai/", "no-budget")
+    assert limiter.unlimited
+    assert limiter is get_limiter("https://aoai/", "no-budget")
+    assert limiter.acquire(10**6, timeout=0) == 0.0
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("", max_tokens=100) > 100
+    assert estimate_tokens({"question": "hi"}) > 0
@@ -0,0 +1,132 @@
+import asyncio
+import itertools
+import threading
+import time
+from unittest.mock import patch
+import pytest
+from resilience import CircuitBreaker, Deadline, DeadlineExceeded, Hedger, await_with_timeout, call_with_timeout, stage_timeout
+
+
+# Shared stages get at most their share, the others whatever is left
+def test_deadline_shares():
+    with Deadline(10, {"embedding": 0.1}) as deadline:
+        assert stage_timeout("embedding") == pytest.approx(1.0, abs=0.01)
+        assert deadline.timeout("completion") == pytest.approx(10.0, abs=0.01)
+    assert stage_timeout("embedding") is None
+
+    assert Deadline(None).timeout("completion") is None
+
+
+def test_deadline_exceeded():
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout("completion")
+
+
+def test_call_with_timeout():
+    assert call_with_timeout(1.0, lambda x: x + 1, 1) == 2
+    with pytest.raises(DeadlineExceeded):
+        call_with_timeout(0.05, time.sleep, 1)
+
+
+def test_await_with_timeout():
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(await_with_timeout(0.05, asyncio.sleep(1), "sleep"))
+
+
+def slow_then_fast():
+    # The first attempt is slow, every later one fast
+    delays = itertools.chain([1.0], itertools.repeat(0.0))
+
+    def call(value):
+        time.sleep(next(delays))
+        return value
+    return call
+
+
+def warmed_hedger(latency: float = 0.01) -> Hedger:
+    hedger = Hedger("test", min_samples=5)
+    for _ in range(5):
+        hedger._observe(time.perf_counter() - latency)
+    return hedger
+
+
+# A call slower than the threshold is hedged, and the second attempt wins
+def test_hedged_call():
+    hedger = warmed_hedger()
+    start = time.perf_counter()
+    assert hedger.call(2.0, slow_then_fast(), "docs") == "docs"
+
+    assert time.perf_counter() - start < 0.5
+    assert hedger.stats()["hedges"] == 1
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+# Nothing is hedged until enough latencies have been seen
+def test_no_hedge_without_samples():
+    hedger = Hedger("test", min_samples=5)
+    assert hedger.call(None, lambda: "docs") == "docs"
+    assert hedger.threshold() is None
+    assert hedger.stats()["hedges"] == 0
+
+
+# Without a hedge or a timeout to wait on, the call runs on the calling thread
+def test_unhedged_call_runs_inline():
+    hedger = Hedger("test", min_samples=5)
+    assert hedger.call(None, threading.get_ident) == threading.get_ident()
+    assert hedger.call(1.0, threading.get_ident) != threading.get_ident()
+    assert hedger.stats()["calls"] == 2
+
+
+def test_hedged_call_timeout_and_error():
+    hedger = warmed_hedger()
+    with pytest.raises(DeadlineExceeded):
+        hedger.call(0.1, time.sleep, 1)
+    assert hedger.stats()["timeouts"] == 1
+
+    def fail():
+        raise ValueError("bad request")
+    with pytest.raises(ValueError):
+        hedger.call(1.0, fail)
+
+
+def test_hedged_call_async():
+    hedger = warmed_hedger()
+    delays = itertools.chain([1.0], itertools.repeat(0.0))
+
+    async def search(value):
+        await asyncio.sleep(next(delays))
+        return value
+
+    start = time.perf_counter()
+    assert asyncio.run(hedger.call_async(2.0, search, "docs")) == "docs"
+    assert time.perf_counter() - start < 0.5
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker("search", failure_threshold=2, reset_timeout=60, slow_call_seconds=1.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    # Slow calls count as failures
+    breaker.record_success(2.0)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    # After the reset timeout one trial call is let through
+    with patch("resilience.time.monotonic", return_value=time.monotonic() + 61):
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success(0.1)
+    assert breaker.state == "closed"
+    assert breaker.stats()["opened"] == 1
+
+
+def test_circuit_breaker_failed_trial():
+    breaker = CircuitBreaker("search", failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    with patch("resilience.time.monotonic", return_value=time.monotonic() + 61):
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
@@ -0,0 +1,61 @@
+import time
+from unittest.mock import patch
+from index_version import IndexVersion, publish_index_version
+from retrieval_cache import RetrievalCache
+
+DOCS = [{"id": "7", "title": "Telehealth Services", "content": "Covered.", "url": "u7"}]
+
+
+# Keys differ by every part of the query
+def test_key_covers_query():
+    key = RetrievalCache.key("telehealth?", [0.1, 0.2], 3, "hybrid", "rag-index")
+    assert key == RetrievalCache.key("telehealth?", [0.1, 0.2], 3, "hybrid", "rag-index")
+    assert key != RetrievalCache.key("telehealth?", [0.1, 0.3], 3, "hybrid", "rag-index")
+    assert key != RetrievalCache.key("telehealth?", [0.1, 0.2], 5, "hybrid", "rag-index")
+    assert key != RetrievalCache.key("telehealth?", [0.1, 0.2], 3, "vector", "rag-index")
+    assert key != RetrievalCache.key("telehealth?", [0.1, 0.2], 3, "hybrid", "other-index")
+
+
+# Hits return copies, so callers can't modify cached results
+def test_get_returns_copy():
+    cache = RetrievalCache()
+    cache.put("k", DOCS, "v1")
+    docs = cache.get("k", "v1")
+    docs[0]["content"] = "changed"
+
+    assert cache.get("k", "v1") == DOCS
+    assert cache.stats()["hits"] == 2
+
+
+def test_lru_and_ttl():
+    cache = RetrievalCache(max_entries=2, ttl=60)
+    cache.put("a", DOCS, "v1")
+    cache.put("b", DOCS, "v1")
+    cache.get("a", "v1")
+    cache.put("c", DOCS, "v1")
+    assert cache.get("b", "v1") is None
+    assert cache.stats()["evictions"] == 1
+
+    with patch("retrieval_cache.time.time", return_value=time.time() + 120):
+        assert cache.get("a", "v1") is None
+
+
+# Publishing a new index version drops every cached result
+def test_published_version_invalidates(tmp_path):
+    path = str(tmp_path / "rag-index.version")
+    index_version = IndexVersion(path, interval=0)
+    cache = RetrievalCache()
+
+    publish_index_version(path)
+    cache.put("k", DOCS, index_version.get())
+    assert cache.get("k", index_version.get()) == DOCS
+
+    publish_index_version(path)
+    assert cache.get("k", index_version.get()) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+# Without a version file the SEARCH_INDEX_VERSION variable is used
+def test_version_falls_back_to_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("SEARCH_INDEX_VERSION", "42")
+    assert IndexVersion(str(tmp_path / "missing"), interval=0).get() == "42"
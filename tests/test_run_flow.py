@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+from unittest.mock import MagicMock, patch
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "util"))
+import run_flow
+
+
+def write_jsonl(path, records):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def read_jsonl(path):
+    return list(run_flow.read_jsonl(path))
+
+
+# Ids default to the line number, and chat history to an empty one
+def test_read_questions(tmp_path):
+    path = str(tmp_path / "questions.jsonl")
+    write_jsonl(path, [{"question": "a?"}, {"id": 7, "question": "b?"}])
+    rows = list(run_flow.read_questions(path))
+    assert [(row["id"], row["chat_history"]) for row in rows] == [("0", "[]"), ("7", "[]")]
+
+    path = str(tmp_path / "questions.csv")
+    pd.DataFrame({"question": ["a?", "b?"]}).to_csv(path, index=False)
+    assert [row["id"] for row in run_flow.read_questions(path)] == ["0", "1"]
+
+
+# Answered ids are kept once each; error records and a cut-short last line are dropped
+def test_load_completed(tmp_path):
+    path = str(tmp_path / "answers.jsonl")
+    write_jsonl(path, [
+        {"id": "0", "answer": "yes"},
+        {"id": "1", "error": "TimeoutError: "},
+        {"id": "0", "answer": "yes again"},
+    ])
+    with open(path, "a") as f:
+        f.write('{"id": "2", "ans')
+
+    assert run_flow.load_completed(path) == {"0"}
+    assert read_jsonl(path) == [{"id": "0", "answer": "yes"}]
+    assert run_flow.load_completed(str(tmp_path / "missing.jsonl")) == set()
+
+
+# A resumed batch only answers the questions that failed, and leaves one record per id
+def test_batch_resume(tmp_path):
+    input_path = str(tmp_path / "questions.jsonl")
+    output_path = str(tmp_path / "answers.jsonl")
+    write_jsonl(input_path, [{"question": f"question {i}?"} for i in range(5)])
+
+    def flaky(question, chat_history):
+        if question == "question 3?":
+            raise TimeoutError("search timed out")
+        return {"answer": f"answer to {question}", "context": []}
+
+    with patch("chat_request.get_response", side_effect=flaky):
+        report = run_flow.batch(input_path, output_path, concurrency=2)
+    assert report["questions"] == 5 and report["errors"] == 1
+    assert "p50_ms" in report
+
+    answer = MagicMock(return_value={"answer": "answer to question 3?", "context": []})
+    with patch("chat_request.get_response", answer):
+        report = run_flow.batch(input_path, output_path, concurrency=2, resume=True)
+    assert report["questions"] == 1 and report["errors"] == 0
+    answer.assert_called_once_with("question 3?", "[]")
+
+    records = read_jsonl(output_path)
+    assert sorted(record["id"] for record in records) == ["0", "1", "2", "3", "4"]
+    assert not any("error" in record for record in records)
+
+
+# PF results are matched to their ids by line number, not by the order PF reports them in
+def test_run_with_pf_joins_on_line_number(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rows = [{"id": id, "question": f"question {id}?", "chat_history": "[]"} for id in ["a", "b", "c"]]
+    details = pd.DataFrame({
+        "inputs.line_number": [2, 0, 1],
+        "inputs.question": ["question c?", "question a?", "question b?"],
+        "outputs.answer": ["answer c", "answer a", None],
+        "outputs.context": [[], [], None],
+    })
+    pf_client = MagicMock()
+    pf_client.get_details.return_value = details
+
+    with open("answers.jsonl", "w") as output, \
+            patch("run_flow.PFClient", return_value=pf_client), \
+            patch("run_flow.pf_line_latencies", return_value={0: 120.0, 1: 80.0, 2: 100.0}):
+        latencies, errors = run_flow.run_with_pf(rows, output, concurrency=2, include_context=False)
+
+    records = {record["id"]: record for record in read_jsonl("answers.jsonl")}
+    assert records["a"]["answer"] == "answer a"
+    assert records["c"]["answer"] == "answer c"
+    assert "error" in records["b"]
+    assert errors == 1
+    assert sorted(latencies) == [80.0, 100.0, 120.0]
+    assert not os.path.exists("temp-batch-dataset.jsonl")
@@ -0,0 +1,49 @@
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, patch
+import pytest
+
+pytest.importorskip("promptflow.evals")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "evaluations"))
+import safety_eval
+
+
+def conversation(i):
+    return {"messages": [{"role": "user", "content": f"question {i}"}], "template_parameters": {}}
+
+
+# At most the semaphore's worth of conversations are answered at once
+def test_callback_concurrency_bound():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def answer(query, chat_history):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"answer": f"answer to {query}"}
+
+    async def run():
+        with patch("safety_eval.callback_semaphore", asyncio.Semaphore(2)), \
+                patch("safety_eval.get_response_async", side_effect=answer):
+            return await asyncio.gather(*(safety_eval.callback(conversation(i)) for i in range(8)))
+
+    results = asyncio.run(run())
+
+    assert max_in_flight == 2
+    assert results[3]["messages"][-1]["content"] == "answer to question 3"
+    assert len(safety_eval.callback_latencies) == 8
+    safety_eval.report_latencies("test")
+
+
+# The event loop's async clients are closed even when the evaluation fails
+def test_main_closes_async_clients():
+    close = AsyncMock()
+    with patch("safety_eval.run_safety_evaluation", AsyncMock(side_effect=RuntimeError("simulator failed"))), \
+            patch("safety_eval.close_async_clients", close):
+        with pytest.raises(RuntimeError):
+            asyncio.run(safety_eval.main())
+    close.assert_awaited_once()
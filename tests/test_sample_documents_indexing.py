@@ -0,0 +1,56 @@
+import importlib.util
+import json
+import os
+from unittest.mock import MagicMock
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+
+# The indexing script's file name isn't a module name, so it is loaded from its path
+spec = importlib.util.spec_from_file_location(
+    "sample_documents_indexing",
+    os.path.join(os.path.dirname(__file__), "..", "data", "sample-documents-indexing.py")
+)
+indexing = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(indexing)
+
+
+@pytest.fixture
+def index():
+    return indexing.create_index_definition("rag-index")
+
+
+# The manifest of a recreated index is emptied on disk before any document is uploaded
+def test_recreate_saves_empty_manifest(tmp_path, index):
+    path = str(tmp_path / "manifest.json")
+    indexing.save_manifest(path, {"index_definition": "old", "documents": {"1": "hash"}})
+    search_index_client = MagicMock()
+
+    manifest, recreated = indexing.prepare_index(search_index_client, index, path, incremental=True)
+
+    assert recreated
+    search_index_client.create_or_update_index.assert_called_once_with(index)
+    with open(path) as f:
+        saved = json.load(f)
+    assert saved == manifest == {"index_definition": indexing.index_definition_hash(index), "documents": {}}
+
+
+# A run that crashes after recreating the index leaves every document to the next incremental run
+def test_incremental_after_crash_reindexes_everything(tmp_path, index):
+    path = str(tmp_path / "manifest.json")
+    indexing.save_manifest(path, {
+        "index_definition": indexing.index_definition_hash(index),
+        "documents": {"1": "hash"}
+    })
+    search_index_client = MagicMock()
+    search_index_client.get_index.side_effect = ResourceNotFoundError("not found")
+
+    # The full run recreates the index, then fails before uploading anything
+    indexing.prepare_index(search_index_client, index, path, incremental=False)
+
+    search_index_client.get_index.side_effect = None
+    search_index_client.create_or_update_index.reset_mock()
+    manifest, recreated = indexing.prepare_index(search_index_client, index, path, incremental=True)
+
+    assert not recreated
+    search_index_client.create_or_update_index.assert_not_called()
+    assert manifest["documents"] == {}
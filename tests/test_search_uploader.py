@@ -0,0 +1,73 @@
+from unittest.mock import MagicMock, patch
+from azure.core.exceptions import HttpResponseError
+from search_uploader import SearchUploader
+
+
+def fake_results(batch, failing=()):
+    return [MagicMock(key=doc["id"], succeeded=doc["id"] not in failing) for doc in batch]
+
+
+# Batches are capped by document count
+def test_batches_are_capped_by_count():
+    search_client = MagicMock()
+    search_client.merge_or_upload_documents.side_effect = fake_results
+
+    with SearchUploader(search_client, max_batch_documents=3, max_workers=2) as uploader:
+        for i in range(7):
+            uploader.add({"id": str(i)})
+
+    sizes = sorted(len(call.args[0]) for call in search_client.merge_or_upload_documents.call_args_list)
+    assert sizes == [1, 3, 3]
+    assert uploader.succeeded == 7
+    assert uploader.failed == set()
+
+
+# Batches are capped by payload size
+def test_batches_are_capped_by_bytes():
+    search_client = MagicMock()
+    search_client.merge_or_upload_documents.side_effect = fake_results
+
+    with SearchUploader(search_client, max_batch_bytes=300) as uploader:
+        for i in range(4):
+            uploader.add({"id": str(i), "content": "x" * 100})
+
+    assert search_client.merge_or_upload_documents.call_count == 2
+
+
+# Failed keys are collected per document
+def test_failed_documents_are_collected():
+    search_client = MagicMock()
+    search_client.delete_documents.side_effect = lambda batch: fake_results(batch, failing={"2"})
+
+    with SearchUploader(search_client, action="delete") as uploader:
+        for i in range(4):
+            uploader.add({"id": str(i)})
+
+    assert uploader.succeeded == 3
+    assert uploader.failed == {"2"}
+    search_client.merge_or_upload_documents.assert_not_called()
+
+
+def http_error(status_code):
+    error = HttpResponseError(message=f"status {status_code}")
+    error.status_code = status_code
+    return error
+
+
+# Throttled batches are retried; batches that keep failing count as failed documents
+@patch("search_uploader.time.sleep")
+def test_failed_batches_are_retried(mock_sleep):
+    search_client = MagicMock()
+    search_client.merge_or_upload_documents.side_effect = [http_error(503), fake_results([{"id": "0"}, {"id": "1"}])]
+
+    with SearchUploader(search_client) as uploader:
+        uploader.add({"id": "0"})
+        uploader.add({"id": "1"})
+
+    assert uploader.succeeded == 2
+    assert mock_sleep.call_count == 1
+
+    search_client.merge_or_upload_documents.side_effect = http_error(400)
+    with SearchUploader(search_client) as uploader:
+        uploader.add({"id": "2"})
+    assert uploader.failed == {"2"}
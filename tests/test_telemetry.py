@@ -0,0 +1,72 @@
+import logging
+from unittest.mock import MagicMock, patch
+import telemetry
+from chat_request import get_response, prompty_cache
+from telemetry import RequestTelemetry, log_payload, record_cache
+
+
+# Stages are timed, and finish() merges the timings with the recorded attributes
+def test_stages_and_finish():
+    with RequestTelemetry() as request:
+        with request.stage("embedding"):
+            pass
+        request.record(documents=3)
+        request.record_tokens(context=120, completion=None)
+        result = request.finish()
+
+    assert set(result) == {"embedding_ms", "total_ms", "documents", "tokens.context"}
+    assert result["total_ms"] >= result["embedding_ms"] >= 0
+
+
+# Cache lookups are attributed to the active request only
+def test_record_cache_attribution():
+    with RequestTelemetry() as request:
+        record_cache("embedding", True)
+        record_cache("answer", False)
+    record_cache("retrieval", True)
+
+    assert request.attributes == {"cache.embedding": "hit", "cache.answer": "miss"}
+
+
+# A failing stage is still timed
+def test_stage_timed_on_error():
+    request = RequestTelemetry()
+    try:
+        with request.stage("search"):
+            raise RuntimeError("search unavailable")
+    except RuntimeError:
+        pass
+
+    assert "search_ms" in request.timings
+
+
+# Payloads are logged at DEBUG for the sampled share of requests
+def test_log_payload_sampling(caplog):
+    with caplog.at_level(logging.DEBUG, logger="chat_request"):
+        with patch.object(telemetry, "log_sample_rate", 0.0):
+            log_payload("inputs: %s", "secret question")
+        assert not caplog.records
+
+        with patch.object(telemetry, "log_sample_rate", 1.0):
+            log_payload("inputs: %s", "secret question")
+        assert caplog.records[0].getMessage() == "inputs: secret question"
+
+
+# get_response logs one timings line per request at INFO
+@patch('chat_request.get_embedding')
+@patch('chat_request.get_context')
+@patch('prompty_cache.Prompty.load')
+def test_get_response_timings(mock_prompty_load, mock_get_context, mock_get_embedding, caplog):
+    prompty_cache.clear()
+    mock_get_embedding.return_value = [0.1, 0.2, 0.3]
+    mock_get_context.return_value = ["context1", "context2"]
+    mock_prompty_load.return_value = MagicMock(return_value="About 3,474 km.")
+
+    with caplog.at_level(logging.INFO, logger="chat_request"):
+        get_response("What is the size of the moon?", [])
+    prompty_cache.clear()
+
+    timings, attributes = caplog.records[-1].args
+    assert {"embedding_ms", "search_ms", "packing_ms", "config_ms", "completion_ms", "total_ms"} <= set(timings)
+    assert attributes["documents"] == 2
+    assert attributes["tokens.completion_estimated"] > 0
@@ -0,0 +1,72 @@
+from unittest.mock import MagicMock, patch
+import chat_request
+from chat_request import get_response, prompty_cache
+from traffic_recorder import REDACTED, TrafficRecorder, read_recording, redact_fields
+
+DOCS = [{"id": "7", "title": "Telehealth Services", "content": "Covered.", "url": "u7"}]
+
+
+def test_record_and_read(tmp_path):
+    recorder = TrafficRecorder(str(tmp_path / "traffic.jsonl"), sample_rate=1.0)
+    recorder.record("second?", [], 20.0, {"total_ms": 5.0}, DOCS, "Yes.")
+    recorder.record("first?", [], 10.0, {"total_ms": 7.0}, DOCS, None)
+
+    records = read_recording(str(tmp_path / "traffic.jsonl"))
+    assert [record["question"] for record in records] == ["first?", "second?"]
+    assert records[1]["doc_ids"] == ["7"]
+    assert records[1]["answer"] == "Yes."
+    assert "answer" not in records[0]
+
+
+def test_sampling(tmp_path):
+    recorder = TrafficRecorder(str(tmp_path / "traffic.jsonl"), sample_rate=0.0)
+    recorder.record("q?", [], 1.0, {}, DOCS)
+
+    assert recorder.stats()["skipped"] == 1
+    assert read_recording(str(tmp_path / "traffic.jsonl")) == []
+
+
+def test_redaction(tmp_path):
+    recorder = TrafficRecorder(
+        str(tmp_path / "traffic.jsonl"), sample_rate=1.0, redact=redact_fields(["chat_history", "answer"])
+    )
+    recorder.record("q?", [{"inputs": {"question": "earlier?"}}], 1.0, {}, DOCS, "Yes.")
+
+    [record] = read_recording(str(tmp_path / "traffic.jsonl"))
+    assert record["question"] == "q?"
+    assert record["chat_history"] == REDACTED and record["answer"] == REDACTED
+
+
+# Old records rotate out once max_files files are full
+def test_rotation(tmp_path):
+    path = str(tmp_path / "traffic-{pid}.jsonl")
+    recorder = TrafficRecorder(path, sample_rate=1.0, max_bytes=200, max_files=2)
+    for i in range(10):
+        recorder.record(f"question {i}?", [], float(i), {}, DOCS)
+
+    records = read_recording(str(tmp_path / "traffic-*.jsonl"))
+    assert recorder.stats()["rotations"] > 0
+    assert 0 < len(records) < 10
+    assert records[-1]["question"] == "question 9?"
+    assert [record["started_at"] for record in records] == sorted(record["started_at"] for record in records)
+
+
+@patch('chat_request.get_embedding')
+@patch('chat_request.get_context')
+@patch('prompty_cache.Prompty.load')
+def test_get_response_recorded(mock_prompty_load, mock_get_context, mock_get_embedding, tmp_path):
+    prompty_cache.clear()
+    mock_get_embedding.return_value = [0.1, 0.2, 0.3]
+    mock_get_context.return_value = DOCS
+    mock_prompty_load.return_value = MagicMock(return_value="Yes, telehealth is covered.")
+
+    recorder = TrafficRecorder(str(tmp_path / "traffic.jsonl"), sample_rate=1.0)
+    with patch.object(chat_request, "traffic_recorder", recorder):
+        get_response("Is telehealth covered?", [])
+    prompty_cache.clear()
+
+    [record] = read_recording(str(tmp_path / "traffic.jsonl"))
+    assert record["question"] == "Is telehealth covered?"
+    assert record["answer"] == "Yes, telehealth is covered."
+    assert record["doc_ids"] == ["7"]
+    assert {"embedding_ms", "search_ms", "completion_ms", "total_ms"} <= set(record["timings"])
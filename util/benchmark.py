@@ -0,0 +1,294 @@
+import os
+import sys
+import json
+import time
+import base64
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+EMBEDDING_DIMENSIONS = 1536
+
+STANDIN_DOCUMENTS = [
+    {"id": str(i), "title": f"Document {i}", "content": " ".join(["Lamna Healthcare policy text."] * 40), "url": f"https://example.com/{i}"}
+    for i in range(10)
+]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Answers the Azure OpenAI embeddings and chat completions APIs and the Azure AI
+    Search query API with canned responses, after `latency_ms` +/- `jitter_ms`.
+    A share `error_rate` of requests fails with 429 or 500 instead.
+    """
+
+    # One request per connection: with HTTP/1.1 keep-alive, async runs intermittently
+    # timed out against this simple server
+    protocol_version = "HTTP/1.0"
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+        if random.random() < self.error_rate:
+            status = random.choice([429, 500])
+            self.send_json({"error": {"code": str(status), "message": "injected error"}}, status, {"Retry-After": "0"})
+        elif "/embeddings" in self.path:
+            self.send_json(self.embeddings(body))
+        elif "/chat/completions" in self.path:
+            if body.get("stream"):
+                self.send_stream(body)
+            else:
+                self.send_json(self.completion(body))
+        elif "/docs/search" in self.path:
+            top = body.get("top", 3)
+            self.send_json({"value": [
+                dict(doc, **{"@search.score": 1.0 / (rank + 1), "@search.rerankerScore": 3.0 - rank * 0.5})
+                for rank, doc in enumerate(STANDIN_DOCUMENTS[:top])
+            ]})
+        else:
+            self.send_json({"error": {"code": "404", "message": self.path}}, 404)
+
+    def send_json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def embeddings(self, body):
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for i, text in enumerate(inputs):
+            vector = np.random.default_rng(abs(hash(str(text))) % 2**32).standard_normal(EMBEDDING_DIMENSIONS).astype(np.float32)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        return {"object": "list", "data": data, "model": body.get("model", ""), "usage": {"prompt_tokens": 8, "total_tokens": 8}}
+
+    def completion(self, body):
+        return {
+            "id": "chatcmpl-standin",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-35-turbo"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "Yes, telehealth services are covered."}}],
+            "usage": {"prompt_tokens": 900, "completion_tokens": 8, "total_tokens": 908},
+        }
+
+    def send_stream(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for word in "Yes, telehealth services are covered.".split(" "):
+            chunk = {
+                "id": "chatcmpl-standin", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "gpt-35-turbo"),
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def serve_standins(port, latency_ms, jitter_ms, error_rate):
+    """Run the stand-in services until the process is terminated."""
+    handler = type("ConfiguredHandler", (StandInHandler,), {
+        "latency_ms": latency_ms, "jitter_ms": jitter_ms, "error_rate": error_rate
+    })
+    # The default listen backlog of 5 drops connections under concurrent load
+    server_cls = type("StandInServer", (ThreadingHTTPServer,), {"request_queue_size": 256, "daemon_threads": True})
+    server_cls(("127.0.0.1", port), handler).serve_forever()
+
+
+def start_standins(latency_ms, jitter_ms, error_rate):
+    """Start the stand-in services in their own process, so their CPU isn't counted, and return the base URL."""
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = multiprocessing.Process(target=serve_standins, args=(port, latency_ms, jitter_ms, error_rate), daemon=True)
+    process.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return process, f"http://127.0.0.1:{port}/"
+
+
+def configure_environment(base_url, enable_caches):
+    """Point the app at the stand-ins through a config snapshot and key-based auth."""
+    snapshot = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+    os.environ.setdefault("AZURE_SUBSCRIPTION_ID", "benchmark")
+    os.environ.setdefault("AZURE_RESOURCE_GROUP", "benchmark")
+    os.environ.setdefault("AZUREAI_PROJECT_NAME", "benchmark")
+    json.dump({
+        "location": "local",
+        "aoai_endpoint": base_url,
+        "aoai_api_version": "2024-02-01",
+        "search_endpoint": base_url.rstrip("/"),
+        "aoai_account_name": "standin",
+        "search_account_name": "standin",
+        "scope": [os.environ["AZURE_SUBSCRIPTION_ID"], os.environ["AZURE_RESOURCE_GROUP"], os.environ["AZUREAI_PROJECT_NAME"]],
+        "resolved_at": time.time() + 10**8,
+    }, snapshot)
+    snapshot.close()
+    os.environ.update({
+        "AZURE_CONFIG_SNAPSHOT": snapshot.name,
+        "AZURE_OPENAI_CLIENT_KEY": "standin",
+        "AZURE_SEARCH_CLIENT_KEY": "standin",
+        "AZURE_OPENAI_CHAT_DEPLOYMENT": "gpt-35-turbo",
+        "AZURE_OPENAI_EMBEDDING_MODEL": "text-embedding-ada-002",
+        "RETRIEVAL_BACKEND": "azure",
+    })
+    # The retrieval and answer caches are opt-in, so they are switched on explicitly
+    if enable_caches:
+        os.environ.update({
+            "RETRIEVAL_CACHE_ENABLED": "true",
+            "ANSWER_CACHE_ENABLED": "true",
+        })
+    else:
+        os.environ.update({
+            "EMBEDDING_CACHE_SIZE": "0",
+            "RETRIEVAL_CACHE_ENABLED": "false",
+            "ANSWER_CACHE_ENABLED": "false",
+        })
+
+
+def rss_kb():
+    """Current resident set size in KB."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def run_sync(get_response, questions, requests, concurrency):
+    def one(i):
+        start = time.perf_counter()
+        try:
+            get_response(questions[i % len(questions)], [])
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(one, range(requests)))
+
+
+def run_async(get_response_async, questions, requests, concurrency):
+    async def drive():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await get_response_async(questions[i % len(questions)], [])
+                    return time.perf_counter() - start, None
+                except Exception as e:
+                    return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+        try:
+            return await asyncio.gather(*[one(i) for i in range(requests)])
+        finally:
+            from clients import close_async_clients
+            await close_async_clients()
+
+    return asyncio.run(drive())
+
+
+def benchmark(requests=200, concurrency=8, warmup=10, latency_ms=50.0, jitter_ms=20.0, error_rate=0.0,
+              mode="sync", enable_caches=False, questions_path="./evaluations/test-dataset.jsonl"):
+    """
+    Drive chat_request against the stand-in services and return a report of latency
+    percentiles, throughput, CPU time per request and memory.
+    """
+    process, base_url = start_standins(latency_ms, jitter_ms, error_rate)
+    try:
+        configure_environment(base_url, enable_caches)
+        import chat_request
+
+        with open(questions_path, "r") as f:
+            questions = [json.loads(line)["question"] for line in f if line.strip()]
+
+        run = run_async if mode == "async" else run_sync
+        target = chat_request.get_response_async if mode == "async" else chat_request.get_response
+        # Warm up clients, caches of parsed prompts and lazy imports
+        run(target, questions, warmup, min(concurrency, warmup))
+
+        rss_before = rss_kb()
+        cpu_before = time.process_time()
+        start = time.perf_counter()
+        results = run(target, questions, requests, concurrency)
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_before
+        rss_after = rss_kb()
+    finally:
+        process.terminate()
+
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    errors = [error for _, error in results if error]
+    return {
+        "config": {
+            "requests": requests, "concurrency": concurrency, "mode": mode, "caches": enable_caches,
+            "latency_ms": latency_ms, "jitter_ms": jitter_ms, "error_rate": error_rate,
+        },
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 1),
+            "p95": round(float(np.percentile(latencies, 95)), 1),
+            "p99": round(float(np.percentile(latencies, 99)), 1),
+            "mean": round(float(latencies.mean()), 1),
+            "max": round(float(latencies.max()), 1),
+        },
+        "cpu_ms_per_request": round(cpu * 1000 / requests, 2),
+        "rss_mb": round(rss_after / 1024, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "rss_growth_kb_per_request": round((rss_after - rss_before) / requests, 2),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the chat_request pipeline against local stand-ins for Azure OpenAI and Azure AI Search.')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests')
+    parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at once')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests sent first')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Stand-in service latency')
+    parser.add_argument('--jitter-ms', type=float, default=20.0, help='Uniform jitter added to the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of stand-in responses that fail with 429 or 500')
+    parser.add_argument('--mode', choices=['sync', 'async'], default='sync', help='Drive get_response on threads or get_response_async on an event loop')
+    parser.add_argument('--caches', action='store_true', help='Keep the embedding, retrieval and answer caches enabled')
+    parser.add_argument('--questions', type=str, default='./evaluations/test-dataset.jsonl', help='JSONL with a question field')
+    parser.add_argument('--output', type=str, help='Also write the JSON report to this file')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+    report = benchmark(
+        requests=args.requests, concurrency=args.concurrency, warmup=args.warmup,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        mode=args.mode, enable_caches=args.caches, questions_path=args.questions,
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -97,6 +97,8 @@ def deploy_flow(endpoint_name, deployment_name):
                     "path": "/health",
                     "port": 8080,
                 },
+                # POST {"question": ..., "stream": true} with "Accept: text/event-stream"
+                # to receive the context first and then the answer as it is generated
                 "scoring_route":{
                     "path": "/score",
                     "port": 8080,
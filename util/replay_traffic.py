@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import time
+import difflib
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from traffic_recorder import read_recording
+
+
+def score_endpoint_caller(url, api_key=None, deployment=None, timeout=120):
+    """Return a function posting a question to a deployed /score endpoint."""
+    headers = {'Content-Type': 'application/json'}
+    if api_key:
+        headers['Authorization'] = f'Bearer {api_key}'
+    if deployment:
+        headers['azureml-model-deployment'] = deployment
+
+    def call(question, chat_history):
+        body = json.dumps({'question': question, 'chat_history': chat_history}).encode('utf-8')
+        request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    return call
+
+
+def local_caller():
+    """Return get_response from this tree, without recording the replayed traffic again."""
+    os.environ.pop('TRAFFIC_RECORDING_PATH', None)
+    # Imported here since it reads the Azure configuration on import
+    from chat_request import get_response
+    return get_response
+
+
+def replay_one(call, record, scheduled_at):
+    issued_at = time.perf_counter()
+    result = {'question': record['question'], 'lag_ms': round((issued_at - scheduled_at) * 1000, 1)}
+    try:
+        response = call(record['question'], record.get('chat_history', []))
+        result['answer'] = response['answer']
+        result['doc_ids'] = [doc.get('id') for doc in response.get('context') or [] if isinstance(doc, dict)]
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['latency_ms'] = round((time.perf_counter() - issued_at) * 1000, 1)
+    return result
+
+
+def replay(records, call, speed=1.0, concurrency=64, output=None):
+    """
+    Re-issue recorded requests with their original inter-arrival times divided by
+    `speed`. Requests are sent on schedule whether or not earlier ones have
+    returned, up to `concurrency` in flight; `lag_ms` is how late each was sent.
+    """
+    results = [None] * len(records)
+    lock = threading.Lock()
+
+    def run(i, record, scheduled_at):
+        result = replay_one(call, record, scheduled_at)
+        results[i] = result
+        if output is not None:
+            with lock:
+                output.write(json.dumps(dict(result, index=i)) + '\n')
+                output.flush()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        first = records[0]['started_at'] if records else 0.0
+        for i, record in enumerate(records):
+            scheduled_at = start + (record['started_at'] - first) / speed
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(run, i, record, scheduled_at)
+    return results
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    report = {f'p{p}': round(float(np.percentile(values, p)), 1) for p in [50, 95, 99]}
+    report['mean'] = round(float(np.mean(values)), 1)
+    return report
+
+
+def compare(records, results, changed_below=0.9):
+    """Compare the latency distributions and answers of a replay with its recording."""
+    recorded_latencies = [record['timings']['total_ms'] for record in records if 'total_ms' in record.get('timings', {})]
+    replayed = [result for result in results if 'error' not in result]
+    similarities = []
+    same_documents = 0
+    for record, result in zip(records, results):
+        if 'error' in result:
+            continue
+        if isinstance(record.get('answer'), str) and isinstance(result['answer'], str):
+            similarities.append(difflib.SequenceMatcher(None, record['answer'], result['answer']).ratio())
+        same_documents += record.get('doc_ids') == result['doc_ids']
+
+    report = {
+        'requests': len(results),
+        'errors': len(results) - len(replayed),
+        'recorded_latency_ms': percentiles(recorded_latencies),
+        'replayed_latency_ms': percentiles([result['latency_ms'] for result in replayed]),
+        'max_lag_ms': max((result['lag_ms'] for result in results), default=0.0),
+        'same_documents': same_documents,
+    }
+    if similarities:
+        report['answers'] = {
+            'compared': len(similarities),
+            'identical': sum(similarity == 1.0 for similarity in similarities),
+            'changed': sum(similarity < changed_below for similarity in similarities),
+            'mean_similarity': round(float(np.mean(similarities)), 3),
+        }
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay traffic recorded with TRAFFIC_RECORDING_PATH against this tree or a deployed endpoint.')
+    parser.add_argument('recording', type=str, help='Recording file, or a glob matching the files of several workers')
+    parser.add_argument('--target', type=str, default='local', help="'local' to call get_response in this process, or the URL of a /score endpoint")
+    parser.add_argument('--api-key', type=str, default=os.getenv('SCORE_API_KEY'), help='Endpoint key (default: SCORE_API_KEY)')
+    parser.add_argument('--deployment', type=str, help='Route to this endpoint deployment')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay N times faster than recorded')
+    parser.add_argument('--concurrency', type=int, default=64, help='Most requests in flight at once')
+    parser.add_argument('--limit', type=int, help='Replay only the first N recorded requests')
+    parser.add_argument('--output', type=str, default='replay-results.jsonl', help='JSONL the replayed answers are written to')
+    args = parser.parse_args()
+
+    records = read_recording(args.recording)[:args.limit]
+    if not records:
+        sys.exit(f"no recorded requests in {args.recording}")
+    recorded_seconds = records[-1]['started_at'] - records[0]['started_at']
+    print(f"replaying {len(records)} requests recorded over {recorded_seconds:.0f}s at {args.speed}x")
+
+    call = local_caller() if args.target == 'local' else score_endpoint_caller(args.target, args.api_key, args.deployment)
+    with open(args.output, 'w') as output:
+        results = replay(records, call, args.speed, args.concurrency, output)
+    print(json.dumps(compare(records, results), indent=2))
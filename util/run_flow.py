@@ -1,7 +1,11 @@
 import os
 import json
+import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+import numpy as np
+import pandas as pd
 import promptflow as pf
 
 from promptflow.client import PFClient
@@ -50,8 +54,207 @@ def main(question):
     if os.path.exists(data):
         os.remove(data)
 
+def read_jsonl(path):
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def read_questions(path):
+    """Yield question records from a JSONL or CSV file, each with an id (the line number unless given)."""
+    if path.endswith('.csv'):
+        rows = (row for chunk in pd.read_csv(path, chunksize=1000) for row in chunk.to_dict('records'))
+    else:
+        rows = read_jsonl(path)
+    for i, row in enumerate(rows):
+        row.setdefault('id', i)
+        row['id'] = str(row['id'])
+        row.setdefault('chat_history', '[]')
+        yield row
+
+def load_completed(path):
+    """
+    Ids already answered in an earlier, possibly interrupted, run writing to `path`.
+    The file is rewritten with only those answers, so the questions that errored
+    are answered again without their earlier error records staying behind.
+    """
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(path, 'r') as f, open(tmp_path, 'w') as out:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of an interrupted run may be cut short
+                continue
+            if 'error' not in record and record['id'] not in completed:
+                completed.add(record['id'])
+                out.write(json.dumps(record) + '\n')
+    os.replace(tmp_path, path)
+    return completed
+
+def answer_in_process(get_response, row, include_context):
+    start = time.perf_counter()
+    record = {'id': row['id'], 'question': row['question']}
+    try:
+        response = get_response(row['question'], row['chat_history'])
+        record['answer'] = response['answer']
+        if include_context:
+            record['context'] = response['context']
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+def run_in_process(rows, output, concurrency, include_context):
+    """Answer questions on a thread pool, appending each answer to `output` as it completes."""
+    # Imported here since it reads the Azure configuration on import
+    from chat_request import get_response
+
+    latencies = []
+    errors = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = set()
+
+        def write_done(done):
+            nonlocal errors
+            for future in done:
+                record = future.result()
+                output.write(json.dumps(record) + '\n')
+                output.flush()
+                latencies.append(record['latency_ms'])
+                errors += 'error' in record
+
+        for row in rows:
+            # Keep a bounded number of questions in flight, however long the input is
+            while len(pending) >= concurrency * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write_done(done)
+            pending.add(executor.submit(answer_in_process, get_response, row, include_context))
+        write_done(wait(pending).done)
+    return latencies, errors
+
+def pf_line_latencies(run):
+    """
+    Milliseconds each line of a local PF run took, by line number. PF keeps them only
+    in its local run storage, which has no public API; promptflow is pinned in
+    src/requirements.txt. Returns an empty dict if they can't be read.
+    """
+    try:
+        from promptflow._sdk.operations._local_storage_operations import LocalStorageOperations
+        flow_runs = LocalStorageOperations(run=run).load_detail()['flow_runs']
+    except Exception as e:
+        print(f"line latencies of run {run.name} unavailable: {e}")
+        return {}
+    latencies = {}
+    for info in flow_runs:
+        if info.get('index') is not None and info.get('start_time') and info.get('end_time'):
+            elapsed = pd.Timestamp(info['end_time']) - pd.Timestamp(info['start_time'])
+            latencies[int(info['index'])] = round(elapsed.total_seconds() * 1000, 1)
+    return latencies
+
+def run_with_pf(rows, output, concurrency, include_context):
+    """Answer questions in a single PF batch run; answers are written when the run completes."""
+    data = './temp-batch-dataset.jsonl'
+    ids = []
+    with open(data, 'w') as f:
+        for row in rows:
+            ids.append(row['id'])
+            f.write(json.dumps({'question': row['question'], 'chat_history': row['chat_history']}) + '\n')
+    if not ids:
+        os.remove(data)
+        return [], 0
+
+    pf_client = PFClient()
+    try:
+        base_run = pf_client.run(
+            flow='./src',
+            data=data,
+            column_mapping={
+                'question': '${data.question}',
+                'chat_history': '${data.chat_history}'
+            },
+            environment_variables={'PF_WORKER_COUNT': str(concurrency)},
+            stream=True,
+        )
+        details = pf_client.get_details(base_run, all_results=True)
+    finally:
+        os.remove(data)
+
+    line_latencies = pf_line_latencies(base_run)
+    latencies = []
+    errors = 0
+    # Lines are matched to their ids by line number, whatever order PF reports them in
+    for _, detail in details.sort_values('inputs.line_number').iterrows():
+        line = int(detail['inputs.line_number'])
+        record = {'id': ids[line], 'question': detail['inputs.question']}
+        if pd.isna(detail.get('outputs.answer')):
+            record['error'] = 'flow run failed for this line'
+            errors += 1
+        else:
+            record['answer'] = detail['outputs.answer']
+            if include_context:
+                record['context'] = detail['outputs.context']
+        if line in line_latencies:
+            record['latency_ms'] = line_latencies[line]
+            latencies.append(line_latencies[line])
+        output.write(json.dumps(record) + '\n')
+    return latencies, errors
+
+def batch(input_path, output_path, concurrency=8, mode='inprocess', resume=False, include_context=False):
+    """
+    Answer every question in `input_path` (JSONL or CSV with a question column) and
+    write one JSON line per answer to `output_path`. With resume, questions answered
+    without error by an earlier run are skipped, the earlier run's error records are
+    dropped, and new answers are appended.
+    """
+    if mode == 'pf':
+        # Set the environment variables the PF run expects, as in main()
+        azure_config = AzureConfig()
+        os.environ['AZURE_OPENAI_ENDPOINT'] = azure_config.aoai_endpoint
+        os.environ['AZURE_OPENAI_API_KEY'] = azure_config.aoai_api_key
+
+    completed = load_completed(output_path) if resume else set()
+    if completed:
+        print(f"resuming: {len(completed)} questions already answered")
+    rows = (row for row in read_questions(input_path) if row['id'] not in completed)
+
+    start = time.perf_counter()
+    with open(output_path, 'a' if resume else 'w') as output:
+        if mode == 'pf':
+            rows = list(rows)
+            latencies, errors = run_with_pf(rows, output, concurrency, include_context)
+            count = len(rows)
+        else:
+            latencies, errors = run_in_process(rows, output, concurrency, include_context)
+            count = len(latencies)
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'questions': count,
+        'errors': errors,
+        'seconds': round(elapsed, 1),
+        'questions_per_second': round(count / elapsed, 2) if elapsed else 0.0,
+    }
+    if latencies:
+        for p in [50, 90, 95, 99]:
+            report[f'p{p}_ms'] = round(float(np.percentile(latencies, p)), 1)
+    print(json.dumps(report, indent=2))
+    return report
+
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Run PromptFlow with a specific question.')
+    parser = argparse.ArgumentParser(description='Run PromptFlow with a specific question, or a batch of questions.')
     parser.add_argument('question', type=str, nargs='?', default='Are telehealth services covered by insurance at Lamna Healthcare?', help='The question to be processed by PromptFlow')
+    parser.add_argument('--input', type=str, help='JSONL or CSV of questions to answer in batch mode')
+    parser.add_argument('--output', type=str, default='batch-answers.jsonl', help='JSONL the batch answers are written to')
+    parser.add_argument('--concurrency', type=int, default=8, help='Questions answered at once')
+    parser.add_argument('--mode', choices=['inprocess', 'pf'], default='inprocess', help='Call the flow in this process, or submit one PF batch run')
+    parser.add_argument('--resume', action='store_true', help='Skip questions already answered in --output')
+    parser.add_argument('--include-context', action='store_true', help='Also write the retrieved documents of each answer')
     args = parser.parse_args()
-    main(args.question)
\ No newline at end of file
+    if args.input:
+        batch(args.input, args.output, args.concurrency, args.mode, args.resume, args.include_context)
+    else:
+        main(args.question)
\ No newline at end of file